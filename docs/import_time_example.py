@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+"""
+Created on Wed Oct 21 15:30:12 2026
+
+@author: chentir
+@organization: santec holdings corp.
+"""
+
+# Basic imports
+import os
+import sys
+import subprocess
+
+# Startup budget of "import santec" (ms)
+IMPORT_TIME_LIMIT_MS = 100
+
+# Modules that must only be imported on first use
+LAZY_MODULES = ("clr", "pyvisa", "nidaqmx", "numpy", "santec.get_address", "santec.sts_process")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure_import_time(statement: str = "import santec"):
+    """
+    Runs the statement in a fresh interpreter with -X importtime.
+
+    Returns:
+        tuple: (cumulative import time of santec in ms, list of the lazy modules that were imported)
+    """
+    check = "import sys; {}; print(','.join(m for m in {!r} if m in sys.modules))".format(statement, LAZY_MODULES)
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", check],
+                            cwd=ROOT, capture_output=True, text=True, check=True)
+
+    cumulative_us = 0
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        fields = [field.strip() for field in line.split("|")]
+        if len(fields) == 3 and fields[2] == "santec":
+            cumulative_us = int(fields[1])
+
+    imported = [module for module in result.stdout.strip().split(",") if module]
+    return cumulative_us / 1000, imported
+
+
+def main():
+    """ Main method of this example """
+    import_time_ms, imported = measure_import_time()
+
+    print("import santec: {:.1f} ms (limit {} ms)".format(import_time_ms, IMPORT_TIME_LIMIT_MS))
+    print("Eagerly imported modules: {}".format(", ".join(imported) if imported else "none"))
+
+    if import_time_ms > IMPORT_TIME_LIMIT_MS or imported:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
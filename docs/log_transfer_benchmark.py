@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+
+"""
+Created on Wed Oct 28 14:20:48 2026
+
+@author: chentir
+@organization: santec holdings corp.
+
+Compares the transfer time of the MPM logging data through InstrumentDLL (MPM.Get_Each_Channel_Logdata)
+and through the binary block transfer over PyVISA (MpmVisaLogTransport).
+Log data must be present on the MPM: run a sweep first (main.py) without switching the MPM off.
+
+Run with --simulated to time the PyVISA path on a simulated MPM (no instruments, DLLs or PyVISA needed).
+"""
+
+# Basic imports
+import sys
+import time
+
+# Importing high level santec package and its modules
+from santec import MpmDevice, GetAddress
+from santec.get_address import split_resource
+
+REPEAT = 5
+SLOT = 0
+CHANNEL = 1
+SIMULATED_POINTS = 1000001
+
+
+def time_transfer(mpm, repeat: int = REPEAT):
+    """
+    Times get_each_channel_log_data of an MpmDevice or of a log transport (MpmVisaLogTransport).
+
+    Returns:
+        tuple: (best time in s, number of points)
+    """
+    best = None
+    points = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        points = len(mpm.get_each_channel_log_data(SLOT, CHANNEL))
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, points
+
+
+def main():
+    """ Main method of this benchmark """
+    if "--simulated" in sys.argv:
+        import numpy
+        from santec.mpm_log_transport import MpmVisaLogTransport
+        from santec.simulated_devices import SimulatedMpmResource, SimulatedResourceManager
+
+        resource_name = "GPIB0::16::INSTR"
+        log_data = {(SLOT, CHANNEL): numpy.random.uniform(-60, 0, SIMULATED_POINTS)}
+        resource_manager = SimulatedResourceManager({resource_name: SimulatedMpmResource(resource_name, log_data)})
+
+        # The transport alone: an MpmDevice would load the InstrumentDLL
+        transport = MpmVisaLogTransport(resource_name, resource_manager)
+        elapsed, points = time_transfer(transport)
+        transport.close()
+        print("PyVISA binary block (simulated): {} points in {:.1f} ms".format(points, elapsed * 1000))
+        return None
+
+    device_address = GetAddress()
+    device_address.Initialize_Device_Addresses()
+    mpm = MpmDevice(*split_resource(device_address.Get_Mpm_Address()))
+    mpm.connect_mpm()
+
+    elapsed, points = time_transfer(mpm)
+    print("InstrumentDLL: {} points in {:.1f} ms".format(points, elapsed * 1000))
+
+    mpm.use_visa_log_transport()
+    elapsed, points = time_transfer(mpm)
+    print("PyVISA binary block: {} points in {:.1f} ms".format(points, elapsed * 1000))
+
+    mpm.Disconnect()
+    return None
+
+
+if __name__ == '__main__':
+    main()
@@ -9,6 +9,7 @@ Created on Wed 05 17:17:26 2024
 
 # Importing high level santec package and its modules
 from santec import TslDevice, MpmDevice, GetAddress
+from santec.get_address import split_resource
 
 # Initializing get instrument address class
 device_address = GetAddress()
@@ -23,17 +24,16 @@ def main():
     device_address.Initialize_Device_Addresses()
     tsl_address = device_address.Get_Tsl_Address()
     mpm_address = device_address.Get_Mpm_Address()
-    interface = 'GPIB'
 
     # Only connect to the devices that the user wants to connect
     if tsl_address is not None:
-        tsl = TslDevice(interface, tsl_address)
+        tsl = TslDevice(*split_resource(tsl_address))
         tsl.ConnectTSL()
     else:
         raise Exception("There must be a TSL connected")
 
     if mpm_address is not None:
-        mpm = MpmDevice(interface, mpm_address)
+        mpm = MpmDevice(*split_resource(mpm_address))
         mpm.connect_mpm()
 
     # TSL Query / Write example
@@ -56,6 +56,13 @@ def main():
     print(status)  # Prints status 0 if query was successful
     print(response)  # Prints query response
 
+    # Batch example: the commands are sent in as few transactions as possible
+    responses = tsl.BatchTSL(['POW 5', 'POW?', 'WAV?'])     # Sets the power, then gets the power and wavelength
+    print(responses)          # Prints [None, power, wavelength], None for each write
+
+    responses = mpm.BatchMPM(['AVG 5', 'AVG?'])     # Sets then gets the MPM averaging time
+    print(responses)
+
 
 if __name__ == '__main__':
     main()
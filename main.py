@@ -12,13 +12,9 @@ import os
 import json
 import time
 
-from matplotlib.pyplot import plot, show
-
 # Importing high level santec package and its modules
 from santec import TslDevice, MpmDevice, SpuDevice, GetAddress, file_logging, STS
-
-# Initializing get instrument address class
-device_address = GetAddress()
+from santec.get_address import split_resource
 
 
 def setting_tsl_sweep_params(connected_tsl: TslDevice, previous_param_data):
@@ -135,113 +131,174 @@ def prompt_and_get_previous_reference_data():
     return previous_reference
 
 
-def main():
-    """ Main method of this project """
+def connect_instruments():
+    """
+    Gets the instrument addresses and connects the TSL, MPM and DAQ board.
+    The LAN instruments are searched on the hosts of the "lan_hosts" entry of the inventory file
+    (ex: "lan_hosts": ["192.168.1.0/24"] in instrument_inventory.json).
 
+    Returns:
+        tuple: (TslDevice, MpmDevice, SpuDevice). MpmDevice and SpuDevice might be None.
+    """
     tsl = None
     mpm = None
     dev = None
-    ilsts = None
 
+    # Initializing get instrument address class
+    device_address = GetAddress()
     device_address.Initialize_Device_Addresses('SME')
     tsl_address = device_address.Get_Tsl_Address()
     mpm_address = device_address.Get_Mpm_Address()
     dev_address = device_address.Get_Dev_Address()
-    interface = 'GPIB'
 
     # Only connect to the devices that the user wants to connect
     if tsl_address is not None:
-        tsl = TslDevice(interface, tsl_address)
+        tsl = TslDevice(*split_resource(tsl_address))
         tsl.ConnectTSL()
     else:
         raise Exception("There must be a TSL connected")
 
     if mpm_address is not None:
-        mpm = MpmDevice(interface, mpm_address)
+        mpm = MpmDevice(*split_resource(mpm_address))
         mpm.connect_mpm()
 
     if dev_address is not None:
         dev = SpuDevice(dev_address)
         dev.ConnectSPU()
 
-    # Set the TSL properties
-    previous_param_data = prompt_and_get_previous_param_data(
-        file_logging.file_last_scan_params)             # might be empty, if there is no data, or if the user chose to not load it.
-    setting_tsl_sweep_params(tsl, previous_param_data)  # previous_param_data might be none
+    return tsl, mpm, dev
+
+
+def load_or_take_reference(ilsts: STS.StsProcess, previous_param_data):
+    """
+    Loads the previous reference data if the user wants to, otherwise takes the reference of each channel.
+    """
+    previous_ref_data_array = None
+    if previous_param_data is not None:
+        # Determine if we should load reference data
+        previous_ref_data_array = prompt_and_get_previous_reference_data()  # trigger, monitor, and log_data. Might be null if the user said no, or the file didn't exist.
+    if previous_ref_data_array is not None:
+        ilsts._reference_data_array = previous_ref_data_array  # ensures that we always have an array, empty or otherwise.
 
-    # If there is an MPM, then create instance of ILSTS
-    if mpm.address is not None:
-        ilsts = STS.StsProcess(tsl, mpm, dev)
+    if len(ilsts._reference_data_array) == 0:
 
-        ilsts.set_selected_channels(previous_param_data)
-        ilsts.set_selected_ranges(previous_param_data)
+        print("\nConnect for Reference measurement and press ENTER")
+        print("Reference process:")
+        ilsts.sts_reference()
+
+    else:
+        # Load the reference data from file.
+        print("Loading reference data...")
+        ilsts.sts_reference_from_saved_file()  # loads from the cached array reference_data_array which is a property of ilsts
 
-        ilsts.set_data_struct()  # will automatically use either newly-input data, or saved data from the previous_param_data.
-        ilsts.set_parameters()  # will automatically use either newly-input data, or saved data from the previous_param_data.
+    return None
 
-        previous_ref_data_array = None
-        if previous_param_data is not None:
-            # Determine if we should load reference data
-            previous_ref_data_array = prompt_and_get_previous_reference_data()  # trigger, monitor, and log_data. Might be null if the user said no, or the file didn't exist.
-        if previous_ref_data_array is not None:
-            ilsts._reference_data_array = previous_ref_data_array  # ensures that we always have an array, empty or otherwise.
 
-        if len(ilsts._reference_data_array) == 0:
+def main():
+    """ Main method of this project """
 
-            print("\nConnect for Reference measurement and press ENTER")
-            print("Reference process:")
-            ilsts.sts_reference()
+    ilsts = None
 
-        else:
-            # Load the reference data from file.
-            print("Loading reference data...")
-            ilsts.sts_reference_from_saved_file()  # loads from the cached array reference_data_array which is a property of ilsts
-
-        # Perform the sweeps
-        ans = "y"
-        while ans in "yY":
-            print("\nDUT measurement")
-            reps = ""
-
-            while not reps.isnumeric():
-                reps = input("Input repeat count, and connect the DUT and press ENTER: ")
-                if not reps.isnumeric():
-                    print("Invalid repeat count, enter a number.\n")
-
-            for _ in range(int(reps)):
-                print("\nScan {} of {}...".format(str(_ + 1), reps))
-                ilsts.sts_measurement()
-                user_map_display = input("\nDo you want to view the graph ?? (y/n): ")
-                if user_map_display == "y":
-                    plot(ilsts.wavelength_table, ilsts.il)
-                    show()
-                time.sleep(2)
-
-            # Get and store dut scan data of each channel, each range
-            ilsts.get_dut_data()
-
-            ans = input("\nRedo Scan ? (y/n): ")
-
-        # Save IL measurement data
-        print("\nSaving measurement data to file " + file_logging.file_measurement_data_results + "...")
-        file_logging.save_meas_data(ilsts, file_logging.file_measurement_data_results)
-
-        # Save reference data
-        print("Saving reference csv data to file " + file_logging.file_reference_data_results + "...")
-        file_logging.save_reference_result_data(ilsts, file_logging.file_reference_data_results)
-
-        # Save dut data
-        print("Saving reference csv data to file " + file_logging.file_dut_data_results + "...")
-        file_logging.save_dut_result_data(ilsts, file_logging.file_dut_data_results)
-
-        # Save reference data into json file
-        print("Saving reference json to file " + file_logging.file_last_scan_reference_json + "...")
-        file_logging.save_reference_json_data(ilsts, file_logging.file_last_scan_reference_json)
-
-    # Save the parameters, whether we have an MPM or not. But only if there is no save file, or the user just set new settings.
-    if previous_param_data is None:
-        print("Saving parameters to file " + file_logging.file_last_scan_params + "...")
-        file_logging.sts_save_param_data(tsl, ilsts, file_logging.file_last_scan_params)  # ilsts might be None
+    # Compress the superseded result and reference files in the background
+    file_logging.enable_archive()
+
+    try:
+        tsl, mpm, dev = connect_instruments()
+
+        # Set the TSL properties
+        previous_param_data = prompt_and_get_previous_param_data(
+            file_logging.file_last_scan_params)             # might be empty, if there is no data, or if the user chose to not load it.
+        setting_tsl_sweep_params(tsl, previous_param_data)  # previous_param_data might be none
+
+        # If there is an MPM, then create instance of ILSTS
+        if mpm.address is not None:
+            ilsts = STS.StsProcess(tsl, mpm, dev)
+
+            ilsts.set_selected_channels(previous_param_data)
+            ilsts.set_selected_ranges(previous_param_data)
+
+            ilsts.set_data_struct()  # will automatically use either newly-input data, or saved data from the previous_param_data.
+            ilsts.set_parameters()  # will automatically use either newly-input data, or saved data from the previous_param_data.
+
+            # Stream the dut data of each scan to file, so that long sessions keep a flat memory footprint.
+            print("Streaming dut data to file " + file_logging.file_dut_data_results + "...")
+            dut_stream = file_logging.DutDataStreamWriter(file_logging.file_dut_data_results)
+            ilsts.enable_dut_streaming(dut_stream)
+
+            load_or_take_reference(ilsts, previous_param_data)
+
+            # Live view of the IL of all the channels, in its own window process
+            live_plot = None
+            user_map_display = input("\nDo you want to view the graph ?? (y/n): ")
+            if user_map_display == "y":
+                from santec.live_plot import LivePlot
+
+                live_plot = LivePlot([file_logging.channel_name(item.MPMnumber, item.SlotNumber, item.ChannelNumber)
+                                      for item in ilsts.merge_data])
+
+            # Perform the sweeps, the failed range sweeps are saved with the measurement data
+            sweep_failures = []
+            ans = "y"
+            while ans in "yY":
+                print("\nDUT measurement")
+                reps = ""
+
+                while not reps.isnumeric():
+                    reps = input("Input repeat count, and connect the DUT and press ENTER: ")
+                    if not reps.isnumeric():
+                        print("Invalid repeat count, enter a number.\n")
+
+                for _ in range(int(reps)):
+                    print("\nScan {} of {}...".format(str(_ + 1), reps))
+                    try:
+                        ilsts.sts_measurement(more_scans=_ < int(reps) - 1)
+                    except RuntimeError as scan_exception:
+                        # The range sweeps were already retried, move on to the next scan
+                        print("Scan {} failed: {}".format(str(_ + 1), scan_exception))
+                        sweep_failures += [dict(failure, scan=_ + 1) for failure in ilsts.sweep_failures]
+                        continue
+                    sweep_failures += [dict(failure, scan=_ + 1) for failure in ilsts.sweep_failures]
+
+                    # Get and store the dut data of each channel, each range, of every successful scan:
+                    # a failed scan only loses itself
+                    ilsts.get_dut_data()
+
+                    if len(ilsts.sweep_failures) > 0:
+                        print("Recovered from {} failed sweep(s)".format(len(ilsts.sweep_failures)))
+                    if live_plot is not None:
+                        live_plot.update(ilsts.wavelength_table, ilsts.il_data_array)
+                    # The two-way sweep measures the next scan on the return leg of this one
+                    if not ilsts.two_way_sweep:
+                        time.sleep(2)
+
+                ans = input("\nRedo Scan ? (y/n): ")
+
+            if live_plot is not None:
+                live_plot.close()
+
+            # Save IL measurement data
+            print("\nSaving measurement data to file " + file_logging.file_measurement_data_results + "...")
+            file_logging.save_meas_data(ilsts, file_logging.file_measurement_data_results, sweep_failures)
+
+            # Save reference data
+            print("Saving reference csv data to file " + file_logging.file_reference_data_results + "...")
+            file_logging.save_reference_result_data(ilsts, file_logging.file_reference_data_results)
+
+            # Dut data was already streamed scan by scan
+            print("Closing dut data file " + file_logging.file_dut_data_results + "...")
+            dut_stream.close()
+
+            # Save reference data into json file
+            print("Saving reference json to file " + file_logging.file_last_scan_reference_json + "...")
+            file_logging.save_reference_json_data(ilsts, file_logging.file_last_scan_reference_json)
+
+        # Save the parameters, whether we have an MPM or not. But only if there is no save file, or the user just set new settings.
+        if previous_param_data is None:
+            print("Saving parameters to file " + file_logging.file_last_scan_params + "...")
+            file_logging.sts_save_param_data(tsl, ilsts, file_logging.file_last_scan_params)  # ilsts might be None
+    finally:
+        # Also on errors and Ctrl+C: the archiving thread is a daemon thread, and would be killed with the queued files
+        file_logging.disable_archive()
 
 
 if __name__ == "__main__":
@@ -1,11 +1,24 @@
 import datetime
-import santec.sts_process as STS
-from santec.get_address import GetAddress
-import santec.file_logging as file_logging
-from santec.daq_device_class import SpuDevice
-from santec.mpm_instrument_class import MpmDevice
-from santec.tsl_instrument_class import TslDevice
-from santec.error_handing_class import instrument_error_strings, sts_process_error_strings
+import importlib
+
+# The modules are only imported on first use (PEP 562), so that "import santec" does not scan the
+# instrument buses or load the DLLs. Names are mapped to (module, attribute); None imports the module itself.
+_LAZY_ATTRIBUTES = {
+    "STS": ("santec.sts_process", None),
+    "TslDevice": ("santec.tsl_instrument_class", "TslDevice"),
+    "MpmDevice": ("santec.mpm_instrument_class", "MpmDevice"),
+    "SpuDevice": ("santec.daq_device_class", "SpuDevice"),
+    "GetAddress": ("santec.get_address", "GetAddress"),
+    "file_logging": ("santec.file_logging", None),
+    "StsDataset": ("santec.sts_dataset", "StsDataset"),
+    "SweepPlan": ("santec.segmented_sweep", "SweepPlan"),
+    "SegmentedMeasurement": ("santec.segmented_sweep", "SegmentedMeasurement"),
+    "AdaptiveMeasurement": ("santec.adaptive_sweep", "AdaptiveMeasurement"),
+    "ChunkedMeasurement": ("santec.chunked_sweep", "ChunkedMeasurement"),
+    "SwitchedMeasurement": ("santec.switch_scheduler", "SwitchedMeasurement"),
+    "instrument_error_strings": ("santec.error_handing_class", "instrument_error_strings"),
+    "sts_process_error_strings": ("santec.error_handing_class", "sts_process_error_strings"),
+}
 
 
 # About
@@ -26,6 +39,29 @@ __all__ = [
     "SpuDevice",
     "GetAddress",
     "file_logging",
+    "StsDataset",
+    "SweepPlan",
+    "SegmentedMeasurement",
+    "AdaptiveMeasurement",
+    "ChunkedMeasurement",
+    "SwitchedMeasurement",
     "instrument_error_strings",
     "sts_process_error_strings"
 ]
+
+
+def __getattr__(name: str):
+    if name not in _LAZY_ATTRIBUTES:
+        raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+    module_name, attribute = _LAZY_ATTRIBUTES[name]
+    value = importlib.import_module(module_name)
+    if attribute is not None:
+        value = getattr(value, attribute)
+
+    globals()[name] = value  # Only imported once
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY_ATTRIBUTES))
@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+
+"""
+Created on Thu Oct 29 15:32:48 2026
+
+@author: chentir
+@organization: santec holdings corp.
+
+Adaptive coarse-then-fine acquisition.
+A fast coarse sweep covers the whole span. The regions where the IL slope or curvature is above a threshold are
+then swept again at the fine step, and the fine points replace the coarse points of these regions.
+The fine sweeps use fixed tiles of the span. Their references are cut from one fine reference of the whole span,
+taken with the coarse one.
+The coarse step must stay below the width of the narrowest feature to be found.
+"""
+
+# Basic imports
+import numpy
+
+# Importing the segmented sweep classes
+from santec.segmented_sweep import SweepSegment, SweepPlan, SegmentedMeasurement, STITCH_TOLERANCE
+from santec.chunked_sweep import MAX_LOGGING_POINTS, MAX_SPU_SAMPLES, max_sweep_steps
+
+# Default feature detection thresholds
+SLOPE_THRESHOLD = 1.0           # dB/nm
+CURVATURE_THRESHOLD = 50.0      # dB/nm²
+WINDOW_MARGIN = 0.05            # nm, added on both sides of a detected region
+
+
+def find_feature_windows(wavelengths, il_data_array, slope_threshold: float = SLOPE_THRESHOLD,
+                         curvature_threshold: float = CURVATURE_THRESHOLD, margin: float = WINDOW_MARGIN) -> list:
+    """
+    Finds the wavelength regions where |dIL/dλ| or |d²IL/dλ²| is above its threshold on any channel.
+
+    Args:
+        wavelengths (list): Wavelength table (nm), ascending.
+        il_data_array (list): IL data of each channel (dB).
+        slope_threshold (float): Slope threshold (dB/nm). None to ignore the slope.
+        curvature_threshold (float): Curvature threshold (dB/nm²). None to ignore the curvature.
+        margin (float): Added on both sides of each region (nm).
+
+    Returns:
+        list: Merged (start, stop) windows (nm), ascending.
+    """
+    wavelengths = numpy.asarray(wavelengths, dtype=numpy.float64)
+    il = numpy.atleast_2d(numpy.asarray(il_data_array, dtype=numpy.float64))
+    if len(wavelengths) < 3:
+        return []
+
+    slope = numpy.gradient(il, wavelengths, axis=1)
+    curvature = numpy.gradient(slope, wavelengths, axis=1)
+
+    feature = numpy.zeros(len(wavelengths), dtype=bool)
+    if slope_threshold is not None:
+        feature |= numpy.any(numpy.abs(slope) > slope_threshold, axis=0)
+    if curvature_threshold is not None:
+        feature |= numpy.any(numpy.abs(curvature) > curvature_threshold, axis=0)
+
+    if not numpy.any(feature):
+        return []
+
+    # Runs of consecutive feature points
+    edges = numpy.diff(feature.astype(numpy.int8), prepend=0, append=0)
+    run_starts = numpy.flatnonzero(edges == 1)
+    run_stops = numpy.flatnonzero(edges == -1) - 1
+
+    windows = []
+    for start, stop in zip(wavelengths[run_starts] - margin, wavelengths[run_stops] + margin):
+        start = float(max(start, wavelengths[0]))
+        stop = float(min(stop, wavelengths[-1]))
+        if windows and start <= windows[-1][1]:
+            windows[-1] = (windows[-1][0], max(windows[-1][1], stop))
+        else:
+            windows.append((start, stop))
+
+    return windows
+
+
+def make_tiles(start_wavelength: float, stop_wavelength: float, tile_width: float, sweep_step: float,
+               sweep_speed: float) -> SweepPlan:
+    """
+    Splits a span into adjacent fine sweep tiles.
+    The tile width is rounded to a whole number of steps.
+
+    Returns:
+        SweepPlan: The tiles.
+    """
+    steps_per_tile = max(1, int(round(tile_width / sweep_step)))
+    tile_width = steps_per_tile * sweep_step
+
+    tiles = []
+    start = start_wavelength
+    while start < stop_wavelength - STITCH_TOLERANCE:
+        stop = min(start + tile_width, stop_wavelength)
+        tiles.append(SweepSegment(start, stop, sweep_step, sweep_speed))
+        start = stop
+
+    return SweepPlan(tiles)
+
+
+def plan_reference_sweeps(tiles: SweepPlan, averaging_time: float = None, max_points: int = MAX_LOGGING_POINTS,
+                          max_samples: int = MAX_SPU_SAMPLES):
+    """
+    Groups the adjacent fine tiles into as few reference sweeps as the MPM logging memory and the SPU sampling
+    memory allow (see chunked_sweep.max_sweep_steps).
+
+    Returns:
+        tuple: (SweepPlan of the reference sweeps,
+                (reference sweep index, first point, last point) of each tile in its reference sweep)
+    """
+    sweep_step = tiles.segments[0].sweep_step
+    sweep_speed = tiles.segments[0].sweep_speed
+    max_steps = max_sweep_steps(sweep_step, sweep_speed, max_points, averaging_time, max_samples)
+
+    sweeps = []
+    tile_points = []
+    steps = 0
+    for tile in tiles.segments:
+        tile_steps = tile.point_count - 1
+        if len(sweeps) == 0 or steps + tile_steps > max_steps:
+            sweeps.append([tile.start_wavelength, tile.stop_wavelength])
+            steps = 0
+        sweeps[-1][1] = tile.stop_wavelength
+        tile_points.append((len(sweeps) - 1, steps, steps + tile_steps))
+        steps += tile_steps
+
+    return SweepPlan([SweepSegment(start, stop, sweep_step, sweep_speed) for start, stop in sweeps]), tile_points
+
+
+def cut_reference(ref_object: dict, first_point: int, last_point: int) -> dict:
+    """
+    Cuts the reference of a tile out of the reference of a longer sweep on the same wavelength grid.
+    The logging data is cut at the points, and the SPU samples half a trigger interval around the trigger pulses
+    of the first and last points (rising edges of the trigger samples, at mid level).
+
+    Args:
+        ref_object (dict): Reference of one channel (see StsProcess.get_reference_data).
+        first_point (int): First point of the tile in the reference sweep.
+        last_point (int): Last point of the tile in the reference sweep.
+
+    Raises:
+        Exception: If the trigger samples have fewer pulses than the reference has points.
+
+    Returns:
+        dict: The reference of the tile, in the same format.
+    """
+    trigger = numpy.asarray(ref_object["trigger"], dtype=numpy.float64)
+    level = (numpy.min(trigger) + numpy.max(trigger)) / 2
+    pulses = numpy.flatnonzero((trigger[1:] >= level) & (trigger[:-1] < level)) + 1
+    if len(pulses) < len(ref_object["log_data"]):
+        raise Exception("The reference has {} trigger pulses for {} points.".format(len(pulses),
+                                                                                   len(ref_object["log_data"])))
+
+    half_interval = int(numpy.median(numpy.diff(pulses))) // 2 if len(pulses) > 1 else 0
+    first_sample = max(0, int(pulses[first_point]) - half_interval)
+    last_sample = min(len(trigger), int(pulses[last_point]) + half_interval + 1)
+
+    tile_reference = dict(ref_object)
+    for key in ("trigger", "monitor"):
+        tile_reference[key] = ref_object[key][first_sample:last_sample]
+    for key in ("log_data", "rescaled_monitor", "rescaled_wavelength", "rescaled_reference_power"):
+        if key in ref_object:
+            tile_reference[key] = ref_object[key][first_point:last_point + 1]
+
+    return tile_reference
+
+
+def merge_refined(coarse_wavelengths, coarse_il_data_array, fine_results: list):
+    """
+    Replaces the coarse points that are inside the fine sweeps by the fine points.
+
+    Args:
+        coarse_wavelengths (list): Coarse wavelength table (nm).
+        coarse_il_data_array (list): Coarse IL data of each channel.
+        fine_results (list): (wavelength_table, il_data_array) of each fine sweep.
+
+    Returns:
+        tuple: (wavelength_table, il_data_array) numpy arrays of the merged spectrum, ascending.
+    """
+    wavelengths = numpy.asarray(coarse_wavelengths, dtype=numpy.float64)
+    il = numpy.atleast_2d(numpy.asarray(coarse_il_data_array, dtype=numpy.float64))
+
+    keep = numpy.ones(len(wavelengths), dtype=bool)
+    for fine_wavelengths, _ in fine_results:
+        keep &= (wavelengths < fine_wavelengths[0] - STITCH_TOLERANCE) | \
+                (wavelengths > fine_wavelengths[-1] + STITCH_TOLERANCE)
+
+    merged_wavelengths = [wavelengths[keep]]
+    merged_il = [il[:, keep]]
+    for fine_wavelengths, fine_il_data_array in fine_results:
+        merged_wavelengths.append(numpy.asarray(fine_wavelengths, dtype=numpy.float64))
+        merged_il.append(numpy.atleast_2d(numpy.asarray(fine_il_data_array, dtype=numpy.float64)))
+
+    merged_wavelengths = numpy.concatenate(merged_wavelengths)
+    merged_il = numpy.concatenate(merged_il, axis=1)
+
+    # Adjacent tiles share their boundary point
+    order = numpy.argsort(merged_wavelengths, kind="stable")
+    merged_wavelengths = merged_wavelengths[order]
+    merged_il = merged_il[:, order]
+    unique = numpy.concatenate(([True], numpy.diff(merged_wavelengths) > STITCH_TOLERANCE))
+
+    return merged_wavelengths[unique], merged_il[:, unique]
+
+
+class AdaptiveMeasurement:
+    """
+    Coarse sweep of the whole span, then fine sweeps of the tiles where features were found.
+
+    Example:
+        adaptive = AdaptiveMeasurement(ilsts, SweepSegment(1500, 1600, 0.01, 100), 0.001, 20, tile_width=1.0)
+        adaptive.take_references()
+        wavelengths, il_data_array = adaptive.measure()
+    """
+
+    def __init__(self, ilsts, coarse_segment: SweepSegment, fine_step: float, fine_speed: float,
+                 tile_width: float = 1.0, slope_threshold: float = SLOPE_THRESHOLD,
+                 curvature_threshold: float = CURVATURE_THRESHOLD, margin: float = WINDOW_MARGIN):
+        """
+        Args:
+            ilsts (StsProcess): STS process, with its channels, ranges and data structures already set.
+            coarse_segment (SweepSegment): Coarse sweep of the whole span.
+            fine_step (float): Fine sweep step (nm).
+            fine_speed (float): Fine sweep speed (nm/s).
+            tile_width (float): Width of the fine sweep tiles (nm).
+            slope_threshold, curvature_threshold, margin: see find_feature_windows.
+        """
+        self.ilsts = ilsts
+        self.slope_threshold = slope_threshold
+        self.curvature_threshold = curvature_threshold
+        self.margin = margin
+
+        self.coarse = SegmentedMeasurement(ilsts, SweepPlan([coarse_segment]))
+        self.fine = SegmentedMeasurement(ilsts, make_tiles(coarse_segment.start_wavelength,
+                                                           coarse_segment.stop_wavelength,
+                                                           tile_width,
+                                                           fine_step,
+                                                           fine_speed))
+
+        # Fine reference of the whole span, cut into the reference of each tile
+        self.reference_plan, self.tile_points = plan_reference_sweeps(self.fine.plan,
+                                                                      ilsts._mpm.get_averaging_time())
+
+        self.windows = []
+        self.refined_tiles = []
+        self.wavelength_table = None
+        self.il_data_array = None
+        self.il = None
+
+    def take_references(self):
+        """
+        Takes the reference of each channel for the coarse sweep, and at the fine step over the whole span
+        (see plan_reference_sweeps). The reference of each fine tile is cut from the fine reference.
+        """
+        fine_reference = SegmentedMeasurement(self.ilsts, self.reference_plan)
+        for data_struct_item in self.ilsts.ref_data:
+            input("\nConnect Slot{} Ch{}, then press ENTER".format(data_struct_item.SlotNumber,
+                                                                   data_struct_item.ChannelNumber))
+            self.coarse.take_channel_references(data_struct_item)
+            fine_reference.take_channel_references(data_struct_item)
+
+        self.fine.load_references([[cut_reference(ref_object, first_point, last_point)
+                                    for ref_object in fine_reference.references[sweep]]
+                                   for sweep, first_point, last_point in self.tile_points])
+        return None
+
+    def load_references(self, coarse_references: list, fine_references: list):
+        """ Uses previously taken references (see the references attribute of coarse and fine) """
+        self.coarse.load_references(coarse_references)
+        self.fine.load_references(fine_references)
+        return None
+
+    def measure(self):
+        """
+        Measures the coarse sweep, then the tiles that contain a feature.
+
+        Returns:
+            tuple: (wavelength_table, il_data_array) of the merged spectrum.
+        """
+        coarse_wavelengths, coarse_il_data_array = self.coarse.measure_segment(0)
+
+        self.windows = find_feature_windows(coarse_wavelengths,
+                                            coarse_il_data_array,
+                                            self.slope_threshold,
+                                            self.curvature_threshold,
+                                            self.margin)
+
+        tiles = self.fine.plan.segments
+        self.refined_tiles = [index for index, tile in enumerate(tiles)
+                              if any(tile.start_wavelength < stop and start < tile.stop_wavelength
+                                     for start, stop in self.windows)]
+
+        fine_results = [self.fine.measure_segment(index) for index in self.refined_tiles]
+
+        self.wavelength_table, self.il_data_array = merge_refined(coarse_wavelengths,
+                                                                  coarse_il_data_array,
+                                                                  fine_results)
+        self.il = self.il_data_array[0]
+
+        return self.wavelength_table, self.il_data_array
@@ -0,0 +1,356 @@
+# -*- coding: utf-8 -*-
+
+"""
+Created on Tue Oct 20 09:41:18 2026
+
+@author: chentir
+@organization: santec holdings corp.
+
+Compressed long-term archive of the result and reference files.
+
+Each numeric column of the results CSV files is quantized to a fixed resolution r: q = round(x / r), stored as the smallest
+of int16 / int32 / int64 that holds it, and decoded as x' = q * r. The error is bounded by
+|x - x'| <= r / 2 (plus the float64 rounding of x itself).
+Monotonic columns (wavelengths, triggers) are delta-encoded on top of the quantization. Deltas of
+integers are exact, so the same bound applies. Non-finite values are kept as they are.
+The quantized columns are then compressed with lzma or zlib.
+The reference JSON files, and files of any other format, are only compressed: they are restored as they were.
+
+The bound is checked column by column when a file is archived. When it is restored, the CRC32 of
+the payload and the CRC32 of the quantized values of each column are verified.
+"""
+
+# Basic imports
+import os
+import csv
+import json
+import lzma
+import math
+import zlib
+import queue
+import struct
+import fnmatch
+import threading
+
+import numpy
+
+
+ARCHIVE_EXTENSION = ".stsz"
+ARCHIVE_MAGIC = b"STSZ"
+ARCHIVE_VERSION = 1
+
+# Quantization resolution of each column, matched on the column name (first match wins).
+# Wavelengths in nm, monitor (TSL power) in V, powers and IL in dB / dBm.
+DEFAULT_RESOLUTIONS = [
+    ("Wavelength(nm)", 1e-6),
+    ("rescaled_wavelength", 1e-6),
+    ("trigger", 1e-6),
+    ("*TSLPower", 1e-6),
+    ("*monitor", 1e-6),
+    ("*", 1e-3),
+]
+
+# Monotonic columns that are delta-encoded
+DELTA_COLUMNS = ("Wavelength(nm)", "rescaled_wavelength", "trigger")
+
+COMPRESSIONS = {
+    "lzma": (lambda data: lzma.compress(data, preset=6), lzma.decompress),
+    "zlib": (lambda data: zlib.compress(data, 9), zlib.decompress),
+}
+
+
+def get_resolution(column_name: str, resolutions: list = None) -> float:
+    """ Returns the quantization resolution of a column """
+    for pattern, resolution in (resolutions or DEFAULT_RESOLUTIONS):
+        if fnmatch.fnmatchcase(column_name, pattern):
+            return float(resolution)
+    raise Exception("No archive resolution is defined for column '{}'.".format(column_name))
+
+
+def _smallest_int_dtype(values: numpy.ndarray):
+    """ Returns the smallest signed integer dtype that holds all the values """
+    if values.size == 0:
+        return numpy.dtype("<i2")
+    low, high = int(values.min()), int(values.max())
+    for dtype in ("<i2", "<i4", "<i8"):
+        info = numpy.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return numpy.dtype(dtype)
+    raise Exception("The quantized values do not fit in 64 bits, use a coarser resolution.")
+
+
+def encode_column(values, resolution: float, delta: bool = False):
+    """
+    Quantizes (and optionally delta-encodes) a column.
+
+    Args:
+        values (list): Column values.
+        resolution (float): Quantization step. The decoding error is at most resolution / 2.
+        delta (bool): True to delta-encode the quantized values (monotonic columns).
+
+    Raises:
+        Exception: If the decoded values are off by more than resolution / 2.
+
+    Returns:
+        tuple: (encoded bytes, column information for decode_column)
+    """
+    values = numpy.asarray(values, dtype=numpy.float64)
+    finite = numpy.isfinite(values)
+
+    scaled = numpy.where(finite, values, 0.0) / resolution
+    if scaled.size and numpy.max(numpy.abs(scaled)) >= 2 ** 62:
+        raise Exception("The values do not fit in 64 bits at a resolution of {}.".format(resolution))
+    quantized = numpy.rint(scaled).astype(numpy.int64)
+
+    first = 0
+    stored = quantized
+    if delta and quantized.size:
+        first = int(quantized[0])
+        stored = numpy.diff(quantized)
+
+    dtype = _smallest_int_dtype(stored)
+    info = {
+        "length": int(values.size),
+        "resolution": resolution,
+        "delta": bool(delta),
+        "first": first,
+        "dtype": dtype.str,
+        "non_finite": {str(int(i)): repr(float(values[i])) for i in numpy.flatnonzero(~finite)},
+    }
+
+    # Verify the error bound before anything is thrown away
+    decoded = quantized * resolution
+    max_error = float(numpy.max(numpy.abs(decoded[finite] - values[finite]))) if finite.any() else 0.0
+    if max_error > _error_bound(resolution, values[finite]):
+        raise Exception("The archive error {} exceeds the bound of {}.".format(max_error, resolution / 2))
+    info["max_error"] = max_error
+    info["crc32"] = _quantized_crc32(quantized)
+
+    return stored.astype(dtype).tobytes(), info
+
+
+def decode_column(data: bytes, info: dict) -> numpy.ndarray:
+    """
+    Decodes a column encoded by encode_column.
+
+    Raises:
+        Exception: If the decoded quantized values don't match the CRC32 of the archived ones.
+    """
+    stored = numpy.frombuffer(data, dtype=numpy.dtype(info["dtype"])).astype(numpy.int64)
+
+    if info["delta"] and info["length"]:
+        quantized = numpy.empty(info["length"], dtype=numpy.int64)
+        quantized[0] = info["first"]
+        numpy.cumsum(stored, out=quantized[1:])
+        quantized[1:] += info["first"]
+    else:
+        quantized = stored
+
+    if len(quantized) != info["length"]:
+        raise Exception("The archived column has {} values instead of {}.".format(len(quantized), info["length"]))
+
+    if _quantized_crc32(quantized) != info["crc32"]:
+        raise Exception("The archived column '{}' is corrupted (CRC mismatch).".format(info.get("name")))
+
+    values = quantized * info["resolution"]
+    for index, value in info["non_finite"].items():
+        values[int(index)] = float(value)
+
+    return values
+
+
+def _quantized_crc32(quantized: numpy.ndarray) -> int:
+    """ CRC32 of the quantized values, before the delta encoding, as little-endian int64 """
+    return zlib.crc32(quantized.astype("<i8").tobytes())
+
+
+def _error_bound(resolution: float, values: numpy.ndarray) -> float:
+    """ resolution / 2, plus the float64 rounding of the largest value """
+    largest = float(numpy.max(numpy.abs(values))) if values.size else 0.0
+    return resolution / 2 + 4 * numpy.finfo(numpy.float64).eps * largest
+
+
+def _decimals(resolution: float) -> int:
+    """ Number of decimals needed to print a value at the given resolution """
+    return max(0, int(math.ceil(-math.log10(resolution) - 1e-9)))
+
+
+def _encode_csv(filename: str, resolutions: list):
+    """ Returns (header, columns) of a results CSV file, or None if it is not all numeric """
+    with open(filename, 'r', encoding='UTF8', newline='') as f:
+        rows = list(csv.reader(f))
+
+    if len(rows) < 2:
+        return None
+
+    header = rows[0]
+    try:
+        table = numpy.array([[float(value) for value in row] for row in rows[1:]], dtype=numpy.float64)
+    except ValueError:
+        return None
+
+    if table.ndim != 2 or table.shape[1] != len(header):
+        return None
+
+    columns = []
+    for i, name in enumerate(header):
+        columns.append((name, table[:, i]))
+
+    return {"kind": "csv", "header": header}, columns
+
+
+def archive_file(filename: str, archive_filename: str = None, compression: str = "lzma",
+                 resolutions: list = None, remove_original: bool = True) -> str:
+    """
+    Archives a results CSV file, quantized to the column resolutions.
+    Reference JSON files and files of any other format are only compressed, without any loss.
+
+    Args:
+        filename (str): File to archive.
+        archive_filename (str): Archive file. Defaults to filename + ARCHIVE_EXTENSION.
+        compression (str): "lzma" or "zlib".
+        resolutions (list): (column name pattern, resolution) pairs. Defaults to DEFAULT_RESOLUTIONS.
+        remove_original (bool): Deletes the original file once it is archived.
+
+    Returns:
+        str: The archive file name.
+    """
+    if compression not in COMPRESSIONS:
+        raise Exception("Unsupported archive compression '{}'.".format(compression))
+
+    archive_filename = archive_filename or filename + ARCHIVE_EXTENSION
+
+    encoded = None
+    if filename.lower().endswith(".csv"):
+        encoded = _encode_csv(filename, resolutions)
+
+    if encoded is None:
+        with open(filename, 'rb') as f:
+            payload = f.read()
+        description = {"kind": "raw"}
+    else:
+        description, columns = encoded
+        description["columns"] = []
+        chunks = []
+        for name, values in columns:
+            data, info = encode_column(values,
+                                       get_resolution(name, resolutions),
+                                       delta=name in DELTA_COLUMNS)
+            info["name"] = name
+            info["nbytes"] = len(data)
+            description["columns"].append(info)
+            chunks.append(data)
+        payload = b"".join(chunks)
+
+    description["filename"] = os.path.basename(filename)
+    description["compression"] = compression
+    description["payload_crc32"] = zlib.crc32(payload)
+
+    header = json.dumps(description).encode("utf-8")
+    compressed = COMPRESSIONS[compression][0](payload)
+
+    with open(archive_filename, 'wb') as f:
+        f.write(ARCHIVE_MAGIC + struct.pack("<BI", ARCHIVE_VERSION, len(header)))
+        f.write(header)
+        f.write(compressed)
+
+    if remove_original:
+        os.remove(filename)
+
+    return archive_filename
+
+
+def restore_file(archive_filename: str, filename: str = None) -> str:
+    """
+    Restores an archived file, and verifies its checksum and error bounds.
+
+    Args:
+        archive_filename (str): Archive file.
+        filename (str): Restored file. Defaults to the archive file name without ARCHIVE_EXTENSION.
+
+    Returns:
+        str: The restored file name.
+    """
+    with open(archive_filename, 'rb') as f:
+        magic = f.read(len(ARCHIVE_MAGIC))
+        if magic != ARCHIVE_MAGIC:
+            raise Exception("'{}' is not an archive file.".format(archive_filename))
+        version, header_length = struct.unpack("<BI", f.read(5))
+        if version != ARCHIVE_VERSION:
+            raise Exception("Unsupported archive version {}.".format(version))
+        description = json.loads(f.read(header_length).decode("utf-8"))
+        payload = COMPRESSIONS[description["compression"]][1](f.read())
+
+    if zlib.crc32(payload) != description["payload_crc32"]:
+        raise Exception("The archive '{}' is corrupted (CRC mismatch).".format(archive_filename))
+
+    if filename is None:
+        filename = archive_filename[:-len(ARCHIVE_EXTENSION)] if archive_filename.endswith(ARCHIVE_EXTENSION) \
+            else archive_filename + ".restored"
+
+    if description["kind"] == "raw":
+        with open(filename, 'wb') as f:
+            f.write(payload)
+        return filename
+
+    columns = []
+    offset = 0
+    for info in description["columns"]:
+        values = decode_column(payload[offset:offset + info["nbytes"]], info)
+        columns.append((info, values))
+        offset += info["nbytes"]
+
+    # Results CSV file
+    formats = ["{:." + str(_decimals(info["resolution"])) + "f}" for info, _ in columns]
+    with open(filename, 'w', encoding='UTF8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(description["header"])
+        for row in zip(*[values for _, values in columns]):
+            writer.writerow([fmt.format(value) for fmt, value in zip(formats, row)])
+
+    return filename
+
+
+class ArchiveRotator:
+    """
+    Archives superseded files in a background thread, so that archiving never delays saving.
+    """
+
+    def __init__(self, compression: str = "lzma", resolutions: list = None):
+        self.compression = compression
+        self.resolutions = resolutions
+        self.archived = []
+        self.failed = []
+
+        self.__queue = queue.Queue()
+        self.__thread = threading.Thread(target=self.__run, name="ArchiveRotator", daemon=True)
+        self.__thread.start()
+
+    def submit(self, filename: str):
+        """ Queues a file to be archived """
+        self.__queue.put(filename)
+
+    def stop(self, wait: bool = True):
+        """
+        Stops the background thread.
+
+        Args:
+            wait (bool): Waits until all the queued files are archived.
+        """
+        self.__queue.put(None)
+        if wait:
+            self.__thread.join()
+
+    def __run(self):
+        while True:
+            filename = self.__queue.get()
+            if filename is None:
+                break
+            try:
+                self.archived.append(archive_file(filename,
+                                                  compression=self.compression,
+                                                  resolutions=self.resolutions))
+            except Exception as ex:
+                print("Failed to archive file '{}'.".format(filename))
+                print(str(ex))
+                self.failed.append(filename)
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+
+"""
+Created on Fri Oct 30 09:18:26 2026
+
+@author: chentir
+@organization: santec holdings corp.
+
+Chunked acquisition of the sweeps with more points than the MPM logging memory or more samples than the SPU
+sampling memory.
+The span is split into overlapping sub-sweeps (chunks) on the same wavelength grid. They are measured back to back,
+and their IL data is stitched in the middle of each overlap, after checking that both chunks agree there.
+The reference of each chunk is saved to a file, and only the chunk being measured and the overlap of the previous
+chunk are held in memory when the result is streamed to a file.
+"""
+
+# Basic imports
+import tempfile
+
+import numpy
+
+# Importing the segmented sweep classes
+from santec.segmented_sweep import SweepSegment, SweepPlan, SegmentedMeasurement, STITCH_TOLERANCE
+
+MAX_LOGGING_POINTS = 1000000    # MPM logging memory (points per channel)
+MAX_SPU_SAMPLES = 1000000       # SPU sampling memory (samples per channel), one sample per averaging time
+OVERLAP_POINTS = 100            # Points measured by both neighbouring chunks
+OVERLAP_TOLERANCE = 0.05        # dB, largest IL difference between two chunks in their overlap
+
+
+def max_sweep_steps(sweep_step: float, sweep_speed: float, max_points: int = MAX_LOGGING_POINTS,
+                    averaging_time: float = None, max_samples: int = MAX_SPU_SAMPLES) -> int:
+    """
+    Returns the largest number of steps of one sweep: at most max_points points, and, with an averaging time,
+    at most max_samples SPU samples.
+
+    Args:
+        averaging_time (float, optional): MPM averaging time (ms), the SPU sampling interval.
+    """
+    steps = max_points - 1
+    if averaging_time:
+        # Span swept while the SPU takes max_samples samples
+        steps = min(steps, int(max_samples * averaging_time / 1000 * sweep_speed / sweep_step))
+    return steps
+
+
+def plan_chunks(start_wavelength: float, stop_wavelength: float, sweep_step: float, sweep_speed: float,
+                max_points: int = MAX_LOGGING_POINTS, overlap_points: int = OVERLAP_POINTS,
+                averaging_time: float = None, max_samples: int = MAX_SPU_SAMPLES) -> SweepPlan:
+    """
+    Splits a sweep into chunks of at most max_points, overlapping by overlap_points.
+    With an averaging time, the chunks are also short enough for the SPU to take at most max_samples samples.
+    The chunk boundaries are on the wavelength grid of the whole sweep.
+
+    Args:
+        averaging_time (float, optional): MPM averaging time (ms), the SPU sampling interval.
+        max_samples (int): Largest number of SPU samples of a chunk.
+
+    Returns:
+        SweepPlan: The chunks (a single one if the sweep fits the limits).
+
+    Raises:
+        Exception: If the overlap does not leave any new point in each chunk.
+    """
+    total_steps = int(round((stop_wavelength - start_wavelength) / sweep_step))
+    chunk_steps = max_sweep_steps(sweep_step, sweep_speed, max_points, averaging_time, max_samples)
+    advance = chunk_steps - overlap_points
+    if advance <= 0:
+        raise Exception("The chunk overlap ({} points) must be smaller than the chunk size ({} points)."
+                        .format(overlap_points, chunk_steps + 1))
+
+    chunks = []
+    first_step = 0
+    while True:
+        last_step = min(first_step + chunk_steps, total_steps)
+        chunks.append(SweepSegment(start_wavelength + first_step * sweep_step,
+                                   start_wavelength + last_step * sweep_step,
+                                   sweep_step,
+                                   sweep_speed))
+        if last_step >= total_steps:
+            break
+        first_step += advance
+
+    return SweepPlan(chunks, allow_overlap=True)
+
+
+def check_overlap(previous_wavelengths, previous_il, wavelengths, il) -> numpy.ndarray:
+    """
+    Compares two chunks in their overlap.
+
+    Args:
+        previous_wavelengths, previous_il: Wavelengths (n) and IL (channels x n) of the previous chunk.
+        wavelengths, il: Wavelengths and IL of the next chunk.
+
+    Returns:
+        numpy.ndarray: Largest IL difference of each channel in the overlap (dB), 0 without overlap.
+    """
+    in_overlap = previous_wavelengths >= wavelengths[0] - STITCH_TOLERANCE
+    if not numpy.any(in_overlap):
+        return numpy.zeros(len(previous_il))
+
+    overlap_wavelengths = previous_wavelengths[in_overlap]
+    deviations = [numpy.max(numpy.abs(previous_channel[in_overlap] - numpy.interp(overlap_wavelengths,
+                                                                                    wavelengths,
+                                                                                    channel)))
+                  for previous_channel, channel in zip(previous_il, il)]
+    return numpy.asarray(deviations)
+
+
+class ChunkedMeasurement:
+    """
+    Measures a sweep larger than the MPM logging memory or the SPU sampling memory in chunks.
+
+    Example:
+        with ChunkedMeasurement(ilsts, 1500, 1600, 0.0001, 10) as chunked:
+            chunked.take_references()
+            chunked.measure("data_measurement.csv")
+    """
+
+    def __init__(self, ilsts, start_wavelength: float, stop_wavelength: float, sweep_step: float,
+                 sweep_speed: float, max_points: int = MAX_LOGGING_POINTS, overlap_points: int = OVERLAP_POINTS,
+                 overlap_tolerance: float = OVERLAP_TOLERANCE, max_samples: int = MAX_SPU_SAMPLES,
+                 reference_folder: str = None):
+        """
+        Args:
+            ilsts (StsProcess): STS process, with its channels, ranges and data structures already set.
+            start_wavelength, stop_wavelength, sweep_step, sweep_speed: Whole sweep.
+            max_points (int): Largest number of points of a chunk.
+            overlap_points (int): Points measured by both neighbouring chunks.
+            overlap_tolerance (float): Largest IL difference (dB) between two chunks in their overlap.
+            max_samples (int): Largest number of SPU samples of a chunk, at the MPM averaging time.
+            reference_folder (str, optional): Folder of the chunk reference files, kept after the measurement.
+                Defaults to a temporary folder, deleted by close().
+        """
+        self.ilsts = ilsts
+        self.overlap_tolerance = overlap_tolerance
+        self.plan = plan_chunks(start_wavelength, stop_wavelength, sweep_step, sweep_speed, max_points,
+                                overlap_points, ilsts._mpm.get_averaging_time(), max_samples)
+        self.__temporary_folder = None
+        if reference_folder is None:
+            self.__temporary_folder = tempfile.TemporaryDirectory(prefix="sts_chunks_")
+            reference_folder = self.__temporary_folder.name
+        self.reference_folder = reference_folder
+        self.segments = SegmentedMeasurement(ilsts, self.plan, self.reference_folder)
+
+        # Largest IL difference of each channel in each overlap, and the overlaps above the tolerance
+        self.overlap_deviations = []
+        self.inconsistent_overlaps = []
+
+        self.wavelength_table = None
+        self.il_data_array = None
+
+    def close(self):
+        """ Deletes the temporary reference folder, if the references were not saved to a given folder """
+        if self.__temporary_folder is not None:
+            self.__temporary_folder.cleanup()
+            self.__temporary_folder = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def take_references(self):
+        """ Takes the reference of each channel on every chunk """
+        return self.segments.take_references()
+
+    def load_references(self, references: list):
+        """ Uses previously taken references (see SegmentedMeasurement.load_references) """
+        return self.segments.load_references(references)
+
+    def measure(self, output_file: str = None):
+        """
+        Measures the chunks back to back and stitches them.
+
+        Args:
+            output_file (str, optional): CSV file the stitched IL data is streamed to (see
+                file_logging.MeasDataStreamWriter). The data is then not kept in memory.
+
+        Returns:
+            tuple: (wavelength_table, il_data_array) of the whole sweep, (None, None) with an output file.
+        """
+        writer = None
+        parts = []
+        if output_file is not None:
+            from santec.file_logging import MeasDataStreamWriter
+
+            writer = MeasDataStreamWriter(output_file, self.ilsts.merge_data)
+
+        def emit(wavelengths, il):
+            if writer is not None:
+                writer.write_rows(wavelengths, il)
+            else:
+                parts.append((wavelengths, il))
+
+        self.overlap_deviations = []
+        self.inconsistent_overlaps = []
+        pending = None
+
+        try:
+            for index in range(len(self.plan)):
+                wavelength_table, il_data_array = self.segments.measure_segment(index)
+                wavelengths = numpy.asarray(wavelength_table, dtype=numpy.float64)
+                il = numpy.asarray(il_data_array, dtype=numpy.float64)
+
+                if pending is None:
+                    pending = (wavelengths, il)
+                    continue
+
+                previous_wavelengths, previous_il = pending
+                deviations = check_overlap(previous_wavelengths, previous_il, wavelengths, il)
+                self.overlap_deviations.append(deviations.tolist())
+                if numpy.any(deviations > self.overlap_tolerance):
+                    self.inconsistent_overlaps.append(index)
+                    print("Chunks {} and {} differ by up to {:.3f} dB in their overlap.".format(
+                        index, index + 1, float(numpy.max(deviations))))
+
+                # Stitched in the middle of the overlap, away from the chunk edges
+                first = numpy.searchsorted(wavelengths, (wavelengths[0] + previous_wavelengths[-1]) / 2
+                                           - STITCH_TOLERANCE)
+                keep = previous_wavelengths < wavelengths[first] - STITCH_TOLERANCE
+                emit(previous_wavelengths[keep], previous_il[:, keep])
+
+                pending = (wavelengths[first:], il[:, first:])
+
+            emit(*pending)
+        finally:
+            if writer is not None:
+                writer.close()
+
+        if writer is not None:
+            return None, None
+
+        self.wavelength_table = numpy.concatenate([wavelengths for wavelengths, _ in parts])
+        self.il_data_array = numpy.concatenate([il for _, il in parts], axis=1)
+        return self.wavelength_table, self.il_data_array
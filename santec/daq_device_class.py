@@ -7,33 +7,41 @@ Created on Thu Mar 24 20:04:16 2022
 @organization: santec holdings corp.
 """
 
-# Basic imports
-import os
-import clr
-
 # Importing instrument error strings
 from santec.error_handing_class import instrument_error_strings
-
-# Adding Instrument DLL to the reference
-ROOT = str(os.path.dirname(__file__)) + '\\DLL\\'
-# print(ROOT)    """ <-- uncomment in to check if the root was selected properly """
+from santec.dll_reference import add_dll_reference
+from santec.instrument_state import InstrumentState
 
 PATH1 = 'InstrumentDLL'
-ans = clr.AddReference(ROOT + PATH1)
-# print(ans) #<-- comment in to check if the DLL was added properly
 
+# SPU class, imported from InstrumentDLL on first use (see load_dll)
+SPU = None
+
+
+def load_dll():
+    """ Adds InstrumentDLL to the references and imports the SPU class, on first use """
+    global SPU
 
-# Importing SPU class from the DLL
-from Santec import SPU
+    if SPU is None:
+        add_dll_reference(PATH1)
+
+        # Importing SPU class from the DLL
+        from Santec import SPU
+
+    return None
 
 
 class SpuDevice:
     """ DAQ board device class """
 
     def __init__(self, device_name: str):
+        load_dll()
         self.__spu = SPU()
         self.__deviceName = device_name
 
+        # Last applied settings, to skip redundant commands
+        self.state = InstrumentState()
+
     def ConnectSPU(self):
         """
         Connects the DAQ board (SPU Connect).
@@ -54,6 +62,9 @@ class SpuDevice:
             DESCRIPTION.
 
         """
+        # Nothing is known about the settings of a newly connected SPU
+        self.state.invalidate()
+
         self.__spu.DeviceName = str(self.__deviceName)
 
         errorcode, device_answer = self.__spu.Connect("")
@@ -79,7 +90,12 @@ class SpuDevice:
         Raises:
             Exception
         """
+        # Nothing to do if the SPU is already set to these parameters
+        sampling_parameters = (start_wavelength, stop_wavelength, sweep_speed, tsl_actual_step)
+        if self.state.is_applied("sampling_parameters", sampling_parameters):
+            return instrument_error_strings(0)
 
+        self.state.invalidate("sampling_parameters")
         errorcode = self.__spu.Set_Sampling_Parameter(start_wavelength,
                                                       stop_wavelength,
                                                       sweep_speed,
@@ -88,6 +104,7 @@ class SpuDevice:
         if errorcode != 0:
             raise Exception(str(errorcode) + ": " + instrument_error_strings(errorcode))
 
+        self.state.set_applied("sampling_parameters", sampling_parameters)
         return instrument_error_strings(errorcode)
 
     def sampling_start(self):
@@ -119,4 +136,5 @@ class SpuDevice:
         """
         Disconnects the spu device
         """
+        self.state.invalidate()
         self.__spu.DisConnect()
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+
+"""
+Created on Wed Oct 21 14:02:51 2026
+
+@author: chentir
+@organization: santec holdings corp.
+"""
+
+# Basic imports
+import os
+
+# Folder of the Santec DLLs
+ROOT = str(os.path.dirname(__file__)) + '\\DLL\\'
+# print(ROOT)    """ <-- uncomment in to check if the root was selected properly """
+
+# DLLs that were already added to the references
+_added_references = {}
+
+
+def add_dll_reference(dll_name: str):
+    """
+    Adds a DLL of the DLL folder to the pythonnet references.
+    Importing pythonnet and loading the DLL are only done on first use, so that importing santec stays fast.
+
+    Args:
+        dll_name (str): 'InstrumentDLL' or 'STSProcess'.
+
+    Returns:
+        The loaded assembly.
+    """
+    if dll_name not in _added_references:
+        import clr  # python for .net
+
+        _added_references[dll_name] = clr.AddReference(ROOT + dll_name)
+        # print(_added_references[dll_name]) #<-- comment in to check if the DLL was added properly
+
+    return _added_references[dll_name]
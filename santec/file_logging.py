@@ -33,6 +33,46 @@ file_measurement_data_results = f"data_measurement_{formatted_datetime}.csv"
 file_reference_data_results = f"data_reference_{formatted_datetime}.csv"
 file_dut_data_results = f"data_dut_{formatted_datetime}.csv"
 
+# Compresses the files moved to the previous folder, see enable_archive
+archive_rotator = None
+
+
+def channel_name(mpm_number, slot_number, channel_number) -> str:
+    """
+    Column name of an MPM channel, e.g. Slot1Ch2.
+    The channels of the additional MPMs are prefixed with their MPM number, e.g. MPM1Slot1Ch2.
+    """
+    name = "Slot{}Ch{}".format(str(slot_number), str(channel_number))
+    if int(mpm_number) != 0:
+        name = "MPM{}".format(str(mpm_number)) + name
+    return name
+
+
+def enable_archive(compression: str = "lzma", resolutions: list = None):
+    """
+    Archives the superseded files that rename_old_file moves to the previous folder.
+    The archiving runs in a background thread (see santec.archive).
+
+    Args:
+        compression (str): "lzma" or "zlib".
+        resolutions (list): (column name pattern, resolution) pairs. Defaults to archive.DEFAULT_RESOLUTIONS.
+    """
+    global archive_rotator
+    if archive_rotator is None:
+        from santec.archive import ArchiveRotator
+
+        archive_rotator = ArchiveRotator(compression, resolutions)
+    return None
+
+
+def disable_archive():
+    """ Waits for the queued files to be archived and stops archiving """
+    global archive_rotator
+    if archive_rotator is not None:
+        archive_rotator.stop(wait=True)
+        archive_rotator = None
+    return None
+
 
 def sts_save_param_data(tsl: TslDevice, ilsts: sts.StsProcess, str_filename: str):
     rename_old_file(str_filename)
@@ -66,7 +106,8 @@ def save_reference_json_data(ilsts: sts.StsProcess, str_filename: str):
     with open(str_filename, 'w') as export_file:
         json.dump(
             ilsts._reference_data_array,
-            export_file)     # No indents or newlines for this large file. If needed, then look at the CSV instead.
+            export_file,     # No indents or newlines for this large file. If needed, then look at the CSV instead.
+            default=list)    # The data arrays and the views of the reference dataset are written as lists.
 
     return None
 
@@ -91,6 +132,9 @@ def rename_old_file(filename: str):
             input()
             os.rename(filename, str_new_filename_and_path)
 
+        if archive_rotator is not None:
+            archive_rotator.submit(str_new_filename_and_path)
+
     return None
 
 
@@ -106,8 +150,9 @@ def save_reference_result_data(ilsts: sts.StsProcess, str_filename: str):
     # Header wavelength is static. There could be any number of slots and channels.
     header = ["Wavelength(nm)"]
     for item in ref_data_array:
-        header.append("Slot{}Ch{}_TSLPower".format(str(item["SlotNumber"]), str(item["ChannelNumber"])))
-        header.append("Slot{}Ch{}_MPMPower".format(str(item["SlotNumber"]), str(item["ChannelNumber"])))
+        name = channel_name(item["MPMNumber"], item["SlotNumber"], item["ChannelNumber"])
+        header.append(name + "_TSLPower")
+        header.append(name + "_MPMPower")
 
     all_rows = []  # our row array will contain one array for each line.
 
@@ -148,8 +193,9 @@ def save_dut_result_data(ilsts: sts.StsProcess, str_filename: str):
     # Header wavelength is static. There could be any number of slots and channels.
     header = ["Wavelength(nm)"]
     for item in dut_data_array:
-        header.append("Slot{}Ch{}R{}_TSLPower".format(str(item["SlotNumber"]), str(item["ChannelNumber"]), str(item["RangeNumber"])))
-        header.append("Slot{}Ch{}R{}_MPMPower".format(str(item["SlotNumber"]), str(item["ChannelNumber"]), str(item["RangeNumber"])))
+        name = channel_name(item["MPMNumber"], item["SlotNumber"], item["ChannelNumber"]) + "R" + str(item["RangeNumber"])
+        header.append(name + "_TSLPower")
+        header.append(name + "_MPMPower")
 
     all_rows = []  # our row array will contain one array for each line.
 
@@ -178,8 +224,118 @@ def save_dut_result_data(ilsts: sts.StsProcess, str_filename: str):
     return None
 
 
+class DutDataStreamWriter:
+    """
+    Writes the dut data of each scan to a CSV file as soon as the scan is done.
+    The file has the same columns as save_dut_result_data, preceded by a Scan column. The ranges skipped by the
+    adaptive ranges of a scan are written as nan.
+    """
+
+    def __init__(self, str_filename: str):
+        rename_old_file(str_filename)
+
+        self.filename = str_filename
+        self.scan_count = 0
+        self.__header = None
+        self.__file = open(str_filename, 'w', encoding='UTF8', newline='')
+        self.__writer = csv.writer(self.__file)
+
+    def write_scan(self, dut_data_array):
+        """
+        Appends the dut data of one scan to the file.
+
+        Args:
+            dut_data_array (list): dut objects of the scan, one for each channel and range.
+
+        Raises:
+            Exception: If the channels or ranges of the scan differ from the previous scans.
+        """
+        header = ["Scan", "Wavelength(nm)"]
+        for item in dut_data_array:
+            name = channel_name(item["MPMNumber"], item["SlotNumber"], item["ChannelNumber"]) + "R" + str(item["RangeNumber"])
+            header.append(name + "_TSLPower")
+            header.append(name + "_MPMPower")
+
+        if self.__header is None:
+            self.__header = header
+            self.__writer.writerow(header)
+        elif header != self.__header:
+            raise Exception("The channels and ranges of the scan do not match the columns of '{}'.".format(self.filename))
+
+        self.scan_count += 1
+
+        # All the wavelengths are all the same for any slot and channel. So just get the first one.
+        wavelength_table = dut_data_array[0]["rescaled_wavelength"]
+
+        # Rows are written one by one, so only the scan itself is held in memory.
+        for i, this_wavelength in enumerate(wavelength_table):
+            this_row_array = [self.scan_count, this_wavelength]
+            for this_dutdata in dut_data_array:
+                this_row_array.append(str(this_dutdata["rescaled_dut_monitor"][i]))  # TSL DUT power
+                this_row_array.append(str(this_dutdata["rescaled_dut_power"][i]))  # MPM DUT power
+            self.__writer.writerow(this_row_array)
+
+        self.__file.flush()
+
+        return None
+
+    def close(self):
+        """ Closes the file """
+        self.__file.close()
+
+
+class MeasDataStreamWriter:
+    """
+    Writes IL data to a CSV file part by part, in the same format as save_meas_data.
+    Used for the measurements too large to be held in memory at once (see chunked_sweep).
+    """
+
+    def __init__(self, str_filename: str, merge_data):
+        """
+        Args:
+            str_filename (str): CSV file.
+            merge_data (list): Merge data structures of the channels (see StsProcess.merge_data).
+        """
+        rename_old_file(str_filename)
+
+        self.filename = str_filename
+        self.__file = open(str_filename, 'w', encoding='UTF8', newline='')
+        self.__writer = csv.writer(self.__file)
+
+        header = ["Wavelength(nm)"]
+        for item in merge_data:
+            header.append(channel_name(item.MPMnumber, item.SlotNumber, item.ChannelNumber))
+        self.__writer.writerow(header)
+
+    def write_rows(self, wavelength_table, il_data_array):
+        """ Appends the IL data of consecutive wavelengths to the file """
+        for counter, wave in enumerate(wavelength_table):
+            self.__writer.writerow([str(wave)] + [item[counter] for item in il_data_array])
+        self.__file.flush()
+        return None
+
+    def close(self):
+        """ Closes the file """
+        self.__file.close()
+
+
+def meas_metadata_file(filepath: str) -> str:
+    """ Metadata file of a measurement data file, e.g. data_measurement_metadata.json for data_measurement.csv """
+    return os.path.splitext(filepath)[0] + "_metadata.json"
+
+
 # save measurement data
-def save_meas_data(ilsts: sts.StsProcess, filepath: str):
+def save_meas_data(ilsts: sts.StsProcess, filepath: str, sweep_failures: list = None):
+    """
+    Saves the merged IL data to a CSV file, and the sweep failures and the ranges skipped by the adaptive ranges
+    to its metadata file (see meas_metadata_file).
+
+    Args:
+        ilsts (StsProcess): Measured STS process.
+        filepath (str): CSV file.
+        sweep_failures (list, optional): Sweep failures of the measurements saved in the file. Defaults to the
+            failures of the last measurement (StsProcess.sweep_failures).
+    """
     rename_old_file(filepath)
     wavelength_table = []
     ilsts.il_data = []
@@ -208,7 +364,7 @@ def save_meas_data(ilsts: sts.StsProcess, filepath: str):
 
         # header
         for item in ilsts.merge_data:
-            ch = "Slot" + str(item.SlotNumber) + "Ch" + str(item.ChannelNumber)
+            ch = channel_name(item.MPMnumber, item.SlotNumber, item.ChannelNumber)
             header.append(ch)
 
         writer.writerow(header)
@@ -224,6 +380,38 @@ def save_meas_data(ilsts: sts.StsProcess, filepath: str):
             counter += 1
 
     f.close()
+
+    metadata_file = meas_metadata_file(filepath)
+    rename_old_file(metadata_file)
+    with open(metadata_file, 'w') as export_file:
+        json.dump({"sweep_failures": ilsts.sweep_failures if sweep_failures is None else sweep_failures,
+                   "skipped_ranges": ilsts.skipped_ranges},
+                  export_file, indent=4)
+
+    return None
+
+
+def save_segmented_meas_data(measurement, filepath: str):
+    """
+    Saves the stitched IL data of a segmented measurement, in the same format as save_meas_data.
+
+    Args:
+        measurement (segmented_sweep.SegmentedMeasurement): Measured segments.
+        filepath (str): CSV file.
+    """
+    rename_old_file(filepath)
+
+    with open(filepath, "w", newline="") as f:
+        writer = csv.writer(f)
+
+        header = ["Wavelength(nm)"]
+        for item in measurement.ilsts.merge_data:
+            header.append(channel_name(item.MPMnumber, item.SlotNumber, item.ChannelNumber))
+        writer.writerow(header)
+
+        for counter, wave in enumerate(measurement.wavelength_table):
+            writer.writerow([str(wave)] + [item[counter] for item in measurement.il_data_array])
+
     return None
 
 
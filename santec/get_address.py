@@ -8,28 +8,160 @@ Created on Fri Feb 28 11:24:04 2020
 """
 
 # Basic imports
+import os
+import json
 import time
+from concurrent.futures import ThreadPoolExecutor
 
-# Importing pyvisa and nidaqmx -> to control TSL and MPM, and DAQ device
-import pyvisa
-import nidaqmx
+# pyvisa and nidaqmx (to control TSL and MPM, and DAQ device) are only imported on first use,
+# because creating the resource manager and scanning the buses takes a while.
+_resource_manager = None
+_system = None
 
-# Initializing pyvisa resource manager class
-resource_manager = pyvisa.ResourceManager()
 
-# Getting a list of all detected instruments
-resources = resource_manager.list_resources()
+def get_resource_manager():
+    """ Returns the pyvisa resource manager, initializing it on first use """
+    global _resource_manager
+    if _resource_manager is None:
+        import pyvisa
 
-# Getting a list of all detected DAQ devices
-system = nidaqmx.system.System.local()
+        _resource_manager = pyvisa.ResourceManager()
+    return _resource_manager
+
+
+def get_resources():
+    """ Scans the buses and returns a list of all detected instruments """
+    return get_resource_manager().list_resources()
+
+
+def get_daq_system():
+    """ Returns the local NI-DAQmx system, to get a list of all detected DAQ devices """
+    global _system
+    if _system is None:
+        import nidaqmx.system
+
+        _system = nidaqmx.system.System.local()
+    return _system
+
+
+# Discovery settings: short timeouts, so that a powered-off address does not stall the startup.
+DISCOVERY_OPEN_TIMEOUT = 300    # ms
+DISCOVERY_QUERY_TIMEOUT = 500   # ms
+DISCOVERY_WORKERS = 16
+
+# Inventory of the detected instruments: resource -> IDN -> role (TSL / MPM / DAQ)
+INVENTORY_FILE = "instrument_inventory.json"
+
+
+def get_instrument_role(idn: str):
+    """ Returns 'TSL' or 'MPM' for a SANTEC instrument IDN, else None """
+    if idn is None or 'SANTEC' not in idn:
+        return None
+    if 'SANTEC,MPM' in idn:
+        return 'MPM'
+    if 'SANTEC,TSL' in idn:
+        return 'TSL'
+    return None
+
+
+def query_idn(resource: str):
+    """
+    Queries the IDN of a resource with short timeouts.
+
+    Returns:
+        str: The IDN, or None if the resource did not answer.
+    """
+    try:
+        instrument = get_resource_manager().open_resource(resource, open_timeout=DISCOVERY_OPEN_TIMEOUT)
+    except Exception as err:
+        print(f"Unexpected {err=}, {type(err)=}")
+        return None
+
+    try:
+        instrument.timeout = DISCOVERY_QUERY_TIMEOUT
+        return instrument.query("*IDN?").strip()
+    except Exception as err:
+        print(f"Unexpected {err=}, {type(err)=}")
+        return None
+    finally:
+        instrument.close()
+
+
+def query_idns(resources: list) -> dict:
+    """
+    Queries the IDN of all the resources concurrently.
+    GPIB resources are queried through VISA, LAN (TCPIP socket) resources through asyncio sockets.
+
+    Returns:
+        dict: resource -> IDN (None if the resource did not answer).
+    """
+    idns = {}
+
+    lan_resources = [resource for resource in resources if resource.startswith('TCPIP')]
+    visa_resources = [resource for resource in resources if resource not in lan_resources]
+
+    if len(visa_resources) != 0:
+        with ThreadPoolExecutor(max_workers=min(DISCOVERY_WORKERS, len(visa_resources))) as executor:
+            idns.update(zip(visa_resources, executor.map(query_idn, visa_resources)))
+
+    if len(lan_resources) != 0:
+        import asyncio
+        from santec.lan_discovery import probe_idn
+
+        async def probe_all():
+            return await asyncio.gather(*[probe_idn(*split_resource(resource)[1:]) for resource in lan_resources])
+
+        idns.update(zip(lan_resources, asyncio.run(probe_all())))
+
+    return {resource: idns[resource] for resource in resources}
+
+
+def split_resource(resource: str):
+    """
+    Splits a resource into the arguments of TslDevice / MpmDevice.
+
+    Args:
+        resource (str): GPIB resource (ex: GPIB0::1::INSTR) or LAN resource (ex: TCPIP0::192.168.1.100::5000::SOCKET).
+
+    Returns:
+        tuple: (interface, address, port)
+    """
+    if resource.startswith('TCPIP'):
+        fields = resource.split('::')
+        port = int(fields[2]) if len(fields) > 3 else 5000
+        return 'LAN', fields[1], port
+
+    return 'GPIB', resource, 5000
+
+
+def __getattr__(name: str):
+    """ Lazy access to the former module attributes resource_manager, resources and system """
+    if name == "resource_manager":
+        return get_resource_manager()
+    if name == "resources":
+        return get_resources()
+    if name == "system":
+        return get_daq_system()
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
 
 
 class GetAddress:
-    def __init__(self):
-        """ Initializing TSL, MPM and DAQ objects """
+    def __init__(self, inventory_file: str = INVENTORY_FILE, lan_hosts: list = None, lan_port: int = 5000):
+        """
+        Initializing TSL, MPM and DAQ objects
+
+        Args:
+            inventory_file (str): Inventory of the detected instruments. None to disable the inventory.
+            lan_hosts (list): IP addresses, host names or subnets probed for LAN instruments (ex: ["192.168.1.0/24"]).
+                Defaults to the "lan_hosts" entry of the inventory file.
+            lan_port (int): LAN port of the instruments.
+        """
         self.__cached_TSL_Address = None
         self.__cached_MPM_Address = None
         self.__cached_DAQ_Address = None
+        self.inventory_file = inventory_file
+        self.lan_hosts = lan_hosts
+        self.lan_port = lan_port
 
     @staticmethod
     def Connection_Info_Class():
@@ -65,87 +197,184 @@ class GetAddress:
             self.Initialize_Device_Addresses()
         return self.__cached_DAQ_Address
 
-    def Initialize_Device_Addresses(self, mode: str = ""):
+    def load_inventory(self) -> dict:
         """
-        Each device needs to prompt for a different connection type
-        Returns
-        -------
-        TSL : str
-            DESCRIPTION.
-        OPM : str
-            DESCRIPTION.
-        DAQ : str
-            DESCRIPTION.
+        Loads the inventory of the previously detected instruments.
 
+        Returns:
+            dict: {"instruments": [{"resource", "idn", "role"}], "selected": {role: resource}, "lan_hosts": [host]}
         """
-        # Initializing an empty dictionary
-        devices = {'Name': [], 'Resource': []}
+        inventory = {"instruments": [], "selected": {}, "lan_hosts": []}
+        if self.inventory_file is None or not os.path.exists(self.inventory_file):
+            return inventory
 
+        try:
+            with open(self.inventory_file) as json_file:
+                inventory.update(json.load(json_file))
+        except (ValueError, OSError) as err:
+            print(f"Unexpected {err=}, {type(err)=}")
+
+        return inventory
+
+    def save_inventory(self, instruments: list, selected: dict):
+        """
+        Saves the inventory of the detected instruments, and the LAN hosts probed for instruments.
+
+        Args:
+            instruments (list): {"resource", "idn", "role"} of each detected instrument.
+            selected (dict): role -> selected resource (DAQ device name for the DAQ).
+        """
+        if self.inventory_file is None:
+            return None
+
+        with open(self.inventory_file, 'w') as export_file:
+            json.dump({"instruments": instruments, "selected": selected, "lan_hosts": list(self.lan_hosts or [])},
+                      export_file, indent=4)
+
+        return None
+
+    def validate_inventory(self, inventory: dict, mode: str = "") -> list:
+        """
+        Checks that the instruments of the inventory still answer with the same IDN.
+        Only the cached resources are queried (concurrently), the buses are not scanned.
+
+        Returns:
+            list: The valid inventory instruments.
+        """
+        cached = [item for item in inventory["instruments"] if item.get("role") in ('TSL', 'MPM')]
+        idns = query_idns([item["resource"] for item in cached])
+        valid = [item for item in cached if idns[item["resource"]] == item["idn"]]
+
+        if mode == 'SME':
+            daq_names = list(get_daq_system().devices.device_names)
+            valid += [item for item in inventory["instruments"]
+                      if item.get("role") == 'DAQ' and item["resource"] in daq_names]
+
+        return valid
+
+    def discover_instruments(self) -> list:
+        """
+        Scans the GPIB resources and queries their IDN concurrently.
+        The LAN hosts are probed as well, if any.
+
+        Returns:
+            list: {"resource", "idn", "role"} of each detected SANTEC instrument.
+        """
         # Gets and sorts GPIB connections only
-        resource_tools = [i for i in resources if 'GPIB' in i]
-
-        # Open the resources from the resource tools list and filter out SANTEC instruments only
-        # Append the resource and teh instrument idn to devices dictionary
-        for resource in resource_tools:
-            try:
-                resource_idn = resource_manager.open_resource(resource).query("*IDN?")
-                if 'SANTEC' in resource_idn:
-                    devices['Name'].append(resource_idn)
-                    devices['Resource'].append(resource)
-            except Exception as err:
-                print(f"Unexpected {err=}, {type(err)=}")
-
-        # Zipping devices dictionary 'Name' and 'Resource' into a list
-        devices_list = list(zip(devices['Name'], devices['Resource']))
+        resource_tools = [i for i in get_resources() if 'GPIB' in i]
+
+        instruments = []
+        for resource, resource_idn in query_idns(resource_tools).items():
+            role = get_instrument_role(resource_idn)
+            if role is not None:
+                instruments.append({"resource": resource, "idn": resource_idn, "role": role})
+
+        if self.lan_hosts:
+            from santec.lan_discovery import discover_lan_instruments
+
+            instruments += discover_lan_instruments(self.lan_hosts, self.lan_port)
+
+        return instruments
+
+    def Initialize_Device_Addresses(self, mode: str = "", use_inventory: bool = True):
+        """
+        Each device needs to prompt for a different connection type.
 
+        The instruments of the inventory file are validated first. If the previously selected instruments
+        are all still there, they are used without prompting. The buses are only scanned when the
+        inventory has no valid TSL or MPM.
+
+        Args:
+            mode (str): 'SME' to also select a DAQ board.
+            use_inventory (bool): False to always scan the buses.
+        """
+        inventory = self.load_inventory()
+        if self.lan_hosts is None:
+            self.lan_hosts = inventory["lan_hosts"]
+        if not use_inventory:
+            inventory = {"instruments": [], "selected": {}, "lan_hosts": self.lan_hosts}
+        instruments = self.validate_inventory(inventory, mode) if use_inventory else []
+
+        roles = [item["role"] for item in instruments]
+        if 'TSL' not in roles or 'MPM' not in roles or (mode == 'SME' and 'DAQ' not in roles):
+            instruments = self.discover_instruments()
+            if not self.lan_hosts and not any(item["role"] in ('TSL', 'MPM') for item in instruments):
+                # Nothing on GPIB, and no LAN hosts yet: they are saved to the inventory for the next runs
+                lan_hosts = input("No instruments were detected on GPIB. Input the LAN hosts or subnets to search, "
+                                  "separated by commas (ex: 192.168.1.0/24), or press ENTER to skip: ")
+                self.lan_hosts = [host.strip() for host in lan_hosts.split(",") if host.strip()]
+                if self.lan_hosts:
+                    instruments = self.discover_instruments()
+            if mode == 'SME':
+                instruments += [{"resource": name, "idn": name, "role": 'DAQ'}
+                                for name in get_daq_system().devices.device_names]
+
+        selected = {}
+        valid_resources = [item["resource"] for item in instruments]
+        required_roles = ('TSL', 'MPM', 'DAQ') if mode == 'SME' else ('TSL', 'MPM')
+        if all(inventory["selected"].get(role) in valid_resources for role in required_roles):
+            # Unattended reconnection to the previously selected instruments
+            selected = {role: inventory["selected"][role] for role in required_roles}
+            print("Using the instruments of '{}': ".format(self.inventory_file))
+            for role in required_roles:
+                print(role, ": ", selected[role])
+        else:
+            selected = self.__prompt_selection(instruments, mode)
+
+        if split_resource(selected['TSL'])[0] == 'GPIB':
+            # set the TSL to CRLF delimiter
+            buffer = get_resource_manager().open_resource(selected['TSL'])
+            buffer.write('SYST:COMM:GPIB:DEL 2')
+            buffer.close()
+
+        # Assigning all the user selected instruments
+        self.__cached_TSL_Address = selected['TSL']
+        self.__cached_MPM_Address = selected['MPM']
+
+        if mode == 'SME':
+            self.__cached_DAQ_Address = selected['DAQ']
+
+        self.save_inventory(instruments, selected)
+
+        return None
+
+    @staticmethod
+    def __prompt_selection(instruments: list, mode: str) -> dict:
+        """ Prompts the user to select the TSL, MPM (and DAQ board) """
         # Sorting the devices list in order from TSL to MPM instruments
-        devices_list = sorted(devices_list, key=lambda x: x[0].startswith('SANTEC,MPM'))
+        devices_list = sorted([item for item in instruments if item["role"] in ('TSL', 'MPM')],
+                              key=lambda x: x["idn"].startswith('SANTEC,MPM'))
+        daq_list = [item for item in instruments if item["role"] == 'DAQ']
 
-        # Unzipping the sorted devices list and assigning key & values of devices dictionary
-        devices['Name'], devices['Resource'] = zip(*devices_list)
+        if len(devices_list) == 0:
+            raise Exception("No SANTEC instruments were detected")
 
-        # Prints all the detected SANTEC GPIB instruments in order of TSL to MPM
-        print("Present GPIB Instruments: ")
-        for i in range(len(devices['Name'])):
-            print(i + 1, ": ", devices['Name'][i])
+        # Prints all the detected SANTEC GPIB and LAN instruments in order of TSL to MPM
+        print("Present Instruments: ")
+        for i in range(len(devices_list)):
+            print(i + 1, ": ", devices_list[i]["idn"], "({})".format(devices_list[i]["resource"]))
 
         if mode == 'SME':
             # Prints all the detected DAQ devices
             print("Detected DAQ devices: ")
-            for i in system.devices.device_names:
-                print(system.devices.device_names.index(i) + 1 + len(devices['Name']), ": ", i)
+            for i in range(len(daq_list)):
+                print(i + 1 + len(devices_list), ": ", daq_list[i]["resource"])
 
         time.sleep(0.2)
 
+        selected = {}
+
         # User laser instrument selection
         selection = int(input("\nSelect Laser instrument: "))
-        selected_resource = devices['Resource'][selection - 1]
-        # connect GPIB into a buffer
-        buffer = resource_manager.open_resource(selected_resource)
-        # buffer.read_termination = "\r\n"
-        # set the TSL to CRLF delimiter
-        buffer.write('SYST:COMM:GPIB:DEL 2')
-        TSL = buffer.resource_name
+        selected['TSL'] = devices_list[selection - 1]["resource"]
 
         # User power meter instrument selection
         selection = int(input("Select Power meter: "))
-        selected_resource = devices['Resource'][selection - 1]
-        # connect GPIB into a buffer
-        buffer = resource_manager.open_resource(selected_resource)
-        # buffer.read_termination = "\r\n"
-        OPM = buffer.resource_name
+        selected['MPM'] = devices_list[selection - 1]["resource"]
 
-        DAQ = None
         if mode == 'SME':
             # User daq device selection
             selection = input("Select DAQ board: ")
-            DAQ = system.devices[int(selection) - 1 - len(devices['Name'])].name
+            selected['DAQ'] = daq_list[int(selection) - 1 - len(devices_list)]["resource"]
 
-        # Assigning all the user selected instruments
-        self.__cached_TSL_Address = TSL
-        self.__cached_MPM_Address = OPM
-
-        if mode == 'SME':
-            self.__cached_DAQ_Address = DAQ
-
-        return None
+        return selected
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+
+"""
+Created on Mon Oct 26 09:33:21 2026
+
+@author: chentir
+@organization: santec holdings corp.
+"""
+
+
+class InstrumentState:
+    """
+    Last settings applied to an instrument.
+    Used to skip the commands that would not change anything on the instrument.
+    A setting is invalidated before it is sent, and only marked as applied once the instrument accepted it,
+    so that a failure always leads to re-sending it.
+    """
+
+    def __init__(self):
+        self.__applied = {}
+
+    def is_applied(self, key: str, value) -> bool:
+        """ True if value is the last applied value of the setting """
+        return key in self.__applied and self.__applied[key] == value
+
+    def get(self, key: str, default=None):
+        """ Returns the last applied value of the setting """
+        return self.__applied.get(key, default)
+
+    def set_applied(self, key: str, value):
+        """ Marks value as applied to the instrument """
+        self.__applied[key] = value
+
+    def invalidate(self, key: str = None):
+        """
+        Forgets a setting, or all of them (on connection, or after a raw command).
+
+        Args:
+            key (str): Setting to forget. None forgets all the settings.
+        """
+        if key is None:
+            self.__applied.clear()
+        else:
+            self.__applied.pop(key, None)
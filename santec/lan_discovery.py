@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+
+"""
+Created on Thu Oct 22 10:25:07 2026
+
+@author: chentir
+@organization: santec holdings corp.
+"""
+
+# Basic imports
+import asyncio
+import ipaddress
+
+# Santec instruments LAN port
+DEFAULT_PORT = 5000
+
+# Probing settings
+PROBE_TIMEOUT = 0.5     # s, connection and answer
+PROBE_CONCURRENCY = 256
+PROBE_TERMINATOR = b"\r\n"
+
+
+def expand_hosts(hosts: list) -> list:
+    """
+    Expands a host list into single hosts.
+
+    Args:
+        hosts (list): IP addresses, host names or subnets (ex: ["192.168.1.100", "192.168.2.0/24"]).
+
+    Returns:
+        list: Hosts to probe, without duplicates.
+    """
+    expanded = []
+    for host in hosts:
+        host = str(host).strip()
+        if '/' in host:
+            expanded += [str(address) for address in ipaddress.ip_network(host, strict=False).hosts()]
+        else:
+            expanded.append(host)
+
+    return list(dict.fromkeys(expanded))
+
+
+def lan_resource_name(host: str, port: int = DEFAULT_PORT) -> str:
+    """ Returns the VISA resource name of a LAN instrument """
+    return "TCPIP0::{}::{}::SOCKET".format(host, port)
+
+
+async def probe_idn(host: str, port: int = DEFAULT_PORT, timeout: float = PROBE_TIMEOUT):
+    """
+    Connects to host:port and queries its IDN.
+
+    Returns:
+        str: The IDN, or None if the host did not answer.
+    """
+    writer = None
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+        writer.write(b"*IDN?" + PROBE_TERMINATOR)
+        await writer.drain()
+
+        # TSL answers with CR, other instruments with LF or CR LF
+        answer = b""
+        while b"\r" not in answer and b"\n" not in answer:
+            chunk = await asyncio.wait_for(reader.read(256), timeout)
+            if not chunk:
+                break
+            answer += chunk
+
+        return answer.decode("ascii", errors="replace").strip() or None
+    except (OSError, asyncio.TimeoutError):
+        return None
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+async def probe_hosts(hosts: list, port: int = DEFAULT_PORT, timeout: float = PROBE_TIMEOUT,
+                      concurrency: int = PROBE_CONCURRENCY) -> dict:
+    """
+    Queries the IDN of all the hosts concurrently.
+
+    Returns:
+        dict: host -> IDN (None if the host did not answer).
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def probe(host):
+        async with semaphore:
+            return await probe_idn(host, port, timeout)
+
+    idns = await asyncio.gather(*[probe(host) for host in hosts])
+    return dict(zip(hosts, idns))
+
+
+def discover_lan_instruments(hosts: list, port: int = DEFAULT_PORT, timeout: float = PROBE_TIMEOUT,
+                             concurrency: int = PROBE_CONCURRENCY) -> list:
+    """
+    Probes a host list or subnet for SANTEC instruments.
+
+    Args:
+        hosts (list): IP addresses, host names or subnets (see expand_hosts).
+        port (int): Instruments LAN port.
+        timeout (float): Connection and answer timeout of each host (s).
+        concurrency (int): Maximum number of simultaneous connections.
+
+    Returns:
+        list: {"resource", "idn", "role"} of each detected instrument, in the same format as the GPIB discovery.
+    """
+    from santec.get_address import get_instrument_role
+
+    idns = asyncio.run(probe_hosts(expand_hosts(hosts), port, timeout, concurrency))
+
+    instruments = []
+    for host, idn in idns.items():
+        role = get_instrument_role(idn)
+        if role is not None:
+            instruments.append({"resource": lan_resource_name(host, port), "idn": idn, "role": role})
+
+    return instruments
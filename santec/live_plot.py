@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+
+"""
+Created on Tue Nov 03 14:08:52 2026
+
+@author: chentir
+@organization: santec holdings corp.
+
+Non-blocking live view of the IL spectra.
+The plot window runs in its own process, so drawing never delays the next sweep. The spectra are decimated to
+the screen resolution before being sent to it, keeping the minimum and maximum of each bin so that narrow
+features stay visible.
+"""
+
+# Basic imports
+import queue
+import multiprocessing
+
+import numpy
+
+DEFAULT_BINS = 2000             # Decimation bins per channel (about the plot width in pixels)
+REFRESH_INTERVAL = 0.05         # s, event loop period of the plot window
+
+
+def decimate_minmax(wavelengths, il_data_array, bins: int = DEFAULT_BINS):
+    """
+    Peak-preserving decimation: the points are split into bins, and only the minimum and maximum of each bin are
+    kept, in their original order.
+
+    Args:
+        wavelengths (list): Wavelength table (nm).
+        il_data_array (list): IL data of each channel.
+        bins (int): Number of bins.
+
+    Returns:
+        tuple: (wavelengths, il) numpy arrays, one row per channel (at most 2 * bins points, plus the last
+        incomplete bin).
+    """
+    wavelengths = numpy.asarray(wavelengths, dtype=numpy.float64)
+    il = numpy.atleast_2d(numpy.asarray(il_data_array, dtype=numpy.float64))
+    channel_count, point_count = il.shape
+
+    if point_count <= 2 * bins:
+        return numpy.broadcast_to(wavelengths, il.shape), il
+
+    size = point_count // bins
+    used = size * bins
+    blocks = il[:, :used].reshape(channel_count, bins, size)
+
+    minimum = numpy.argmin(blocks, axis=2)
+    maximum = numpy.argmax(blocks, axis=2)
+    offsets = numpy.arange(bins) * size
+    indices = numpy.stack((numpy.minimum(minimum, maximum), numpy.maximum(minimum, maximum)), axis=2)
+    indices = (indices + offsets[:, numpy.newaxis]).reshape(channel_count, 2 * bins)
+
+    # The last incomplete bin is kept as it is
+    tail = numpy.broadcast_to(numpy.arange(used, point_count), (channel_count, point_count - used))
+    indices = numpy.concatenate((indices, tail), axis=1)
+
+    return wavelengths[indices], numpy.take_along_axis(il, indices, axis=1)
+
+
+def _plot_process(data_queue, labels: list, title: str):
+    """ Plot window process: draws the spectra received on data_queue, until None is received or the window is closed """
+    import matplotlib.pyplot as pyplot
+
+    pyplot.ion()
+    figure, axes = pyplot.subplots()
+    axes.set_title(title)
+    axes.set_xlabel("Wavelength (nm)")
+    axes.set_ylabel("IL (dB)")
+    axes.grid(True)
+    lines = []
+
+    while pyplot.fignum_exists(figure.number):
+        try:
+            data = data_queue.get_nowait()
+        except queue.Empty:
+            pyplot.pause(REFRESH_INTERVAL)
+            continue
+
+        if data is None:
+            break
+
+        wavelengths, il = data
+        if len(lines) != len(il):
+            for line in lines:
+                line.remove()
+            lines = [axes.plot([], [], linewidth=0.8,
+                               label=labels[index] if labels and index < len(labels) else "Channel {}".format(index + 1))[0]
+                     for index in range(len(il))]
+            axes.legend(loc="lower right")
+
+        # Updated in place
+        for line, channel_wavelengths, channel_il in zip(lines, wavelengths, il):
+            line.set_data(channel_wavelengths, channel_il)
+        axes.relim()
+        axes.autoscale_view()
+        figure.canvas.draw_idle()
+        pyplot.pause(REFRESH_INTERVAL)
+
+    pyplot.close(figure)
+
+
+class LivePlot:
+    """
+    Live view of the IL of all the channels, updated after each sweep.
+
+    Example:
+        live_plot = LivePlot(["Slot1Ch1", "Slot1Ch2"])
+        ilsts.sts_measurement()
+        live_plot.update(ilsts.wavelength_table, ilsts.il_data_array)
+        live_plot.close()
+    """
+
+    def __init__(self, labels: list = None, bins: int = DEFAULT_BINS, title: str = "DUT measurement"):
+        """
+        Args:
+            labels (list): Name of each channel.
+            bins (int): Decimation bins per channel (see decimate_minmax).
+            title (str): Window title.
+        """
+        self.bins = bins
+        self.dropped_updates = 0
+
+        # A single pending update: the window only needs the latest spectra
+        self.__queue = multiprocessing.Queue(maxsize=1)
+        self.__process = multiprocessing.Process(target=_plot_process,
+                                                 args=(self.__queue, labels, title),
+                                                 daemon=True)
+        self.__process.start()
+
+    @property
+    def is_open(self) -> bool:
+        """ False once the plot window was closed """
+        return self.__process.is_alive()
+
+    def update(self, wavelength_table, il_data_array) -> bool:
+        """
+        Sends the spectra to the plot window. Never waits for the window: the update is dropped if the window
+        did not draw the previous one yet.
+
+        Returns:
+            bool: True if the update was sent.
+        """
+        if not self.is_open:
+            return False
+
+        try:
+            self.__queue.put_nowait(decimate_minmax(wavelength_table, il_data_array, self.bins))
+        except queue.Full:
+            self.dropped_updates += 1
+            return False
+        return True
+
+    def close(self, timeout: float = 2.0):
+        """ Closes the plot window """
+        if self.is_open:
+            try:
+                self.__queue.put(None, timeout=timeout)
+            except queue.Full:
+                pass
+            self.__process.join(timeout)
+        if self.__process.is_alive():
+            self.__process.terminate()
+        return None
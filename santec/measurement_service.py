@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+
+"""
+Created on Fri Oct 23 09:14:56 2026
+
+@author: chentir
+@organization: santec holdings corp.
+
+Long-running measurement service.
+The service owns the connected instruments and the StsProcess (with its reference data), and runs
+the measurement jobs sent by the clients over a local socket. Clients only pay for the sweeps.
+The clients authenticate with a random key made at each service start. The key is written to a file that only
+the user running the service can read, where the clients of the same user find it.
+"""
+
+# Basic imports
+import os
+import queue
+import secrets
+import itertools
+import threading
+from datetime import datetime
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener, Client
+
+# Importing file logging to save the job results
+import santec.file_logging as file_logging
+
+# Local socket of the service
+SERVICE_ADDRESS = ("localhost", 6100)
+SERVICE_KEY_FILE = os.path.join(os.path.expanduser("~"), ".santec_sts_service_key")
+AUTHKEY_BYTES = 32
+
+
+def write_authkey(authkey: bytes, key_file: str = SERVICE_KEY_FILE):
+    """ Writes the authentication key to a file readable by the current user only """
+    if os.path.exists(key_file):
+        os.remove(key_file)
+    descriptor = os.open(key_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(descriptor, "w") as f:
+        f.write(authkey.hex())
+    return None
+
+
+def read_authkey(key_file: str = SERVICE_KEY_FILE) -> bytes:
+    """
+    Reads the authentication key of the running service.
+
+    Raises:
+        Exception: If the service key file does not exist.
+    """
+    if not os.path.exists(key_file):
+        raise Exception("No measurement service key in '{}': is the service running?".format(key_file))
+    with open(key_file) as f:
+        return bytes.fromhex(f.read().strip())
+
+
+class MeasurementJob:
+    """ Measurement job, queued by priority (lower value first) then by submission order """
+
+    def __init__(self, priority: int, sequence: int, request: dict):
+        self.priority = priority
+        self.sequence = sequence
+        self.request = request
+        self.result = None
+        self.done = threading.Event()
+
+    def __lt__(self, other):
+        return (self.priority, self.sequence) < (other.priority, other.sequence)
+
+
+class MeasurementService:
+    """
+    Keeps the TSL, MPM and SPU connected and the reference loaded, and runs measurement jobs.
+
+    Requests (dict) sent by the clients:
+        {"command": "measure", "repeat": 1, "priority": 0, "return_data": False, "label": ""}
+            Runs the DUT measurement and saves the IL data to a CSV file.
+            Returns {"status": "ok", "files": [...], "sweep_failures": [...], "wavelength": [...], "il": [[...], ...]}
+            (wavelength and il only with return_data). sweep_failures lists the range sweep failures.
+            A failed measurement returns {"status": "error", "error": "...", "files": [...], "sweep_failures": [...]}
+            with the files and sweep failures of the scans up to the failure.
+        {"command": "status"}
+            Returns the number of queued jobs and the job being measured. Not queued.
+        {"command": "shutdown"}
+            Stops the service once the queued jobs are done.
+    """
+
+    def __init__(self, ilsts, address=SERVICE_ADDRESS, authkey: bytes = None, output_folder: str = ".",
+                 key_file: str = SERVICE_KEY_FILE):
+        """
+        Args:
+            ilsts (StsProcess): Configured STS process, with its reference data already taken or loaded.
+            address: Local socket (host, port) of the service.
+            authkey (bytes): Authentication key shared with the clients. Defaults to a random key, written to
+                key_file for the clients.
+            output_folder (str): Folder of the measurement files.
+            key_file (str): File of the random authentication key. None to not write it.
+        """
+        self.ilsts = ilsts
+        self.address = address
+        self.authkey = authkey
+        self.output_folder = output_folder
+        self.key_file = key_file
+
+        self.current_job = None
+        self.__jobs = queue.PriorityQueue()
+        self.__sequence = itertools.count()
+        self.__stopping = threading.Event()
+        self.__listener = None
+
+    def serve_forever(self):
+        """ Accepts the clients until a shutdown request """
+        key_file = None
+        if self.authkey is None:
+            self.authkey = secrets.token_bytes(AUTHKEY_BYTES)
+            if self.key_file is not None:
+                key_file = self.key_file
+                write_authkey(self.authkey, key_file)
+
+        worker = threading.Thread(target=self.__run_jobs, name="MeasurementWorker", daemon=True)
+        worker.start()
+
+        self.__listener = Listener(self.address, authkey=self.authkey)
+        print("Measurement service listening on {}:{}".format(*self.__listener.address))
+
+        try:
+            while True:
+                try:
+                    connection = self.__listener.accept()
+                except (AuthenticationError, EOFError, ConnectionError):
+                    continue  # Client without the key, or gone during the authentication
+                if self.__stopping.is_set():
+                    connection.close()
+                    break
+                threading.Thread(target=self.__handle_client, args=(connection,), daemon=True).start()
+        finally:
+            self.__jobs.put(MeasurementJob(float("inf"), next(self.__sequence), None))  # Stops the worker
+            worker.join()
+            self.__listener.close()
+            if key_file is not None and os.path.exists(key_file):
+                os.remove(key_file)
+
+        return None
+
+    def submit(self, request: dict) -> MeasurementJob:
+        """ Queues a measurement job """
+        job = MeasurementJob(int(request.get("priority", 0)), next(self.__sequence), request)
+        self.__jobs.put(job)
+        return job
+
+    def __handle_client(self, connection):
+        with connection:
+            while True:
+                try:
+                    request = connection.recv()
+                except (EOFError, OSError):
+                    break
+
+                command = request.get("command")
+                if command == "status":
+                    connection.send({"status": "ok",
+                                     "queued_jobs": self.__jobs.qsize(),
+                                     "current_job": None if self.current_job is None else self.current_job.request})
+                elif command == "shutdown":
+                    connection.send({"status": "ok"})
+                    self.__stopping.set()
+                    # Wakes up the accept loop of serve_forever
+                    Client(self.__listener.address, authkey=self.authkey).close()
+                    break
+                elif command == "measure":
+                    job = self.submit(request)
+                    job.done.wait()
+                    connection.send(job.result)
+                else:
+                    connection.send({"status": "error", "error": "Unknown command '{}'".format(command)})
+
+    def __run_jobs(self):
+        """ Runs the jobs one at a time, the instruments are not shared between threads """
+        while True:
+            job = self.__jobs.get()
+            if job.request is None:
+                break
+
+            self.current_job = job
+            try:
+                job.result = self.__measure(job)
+            except Exception as ex:
+                job.result = {"status": "error", "error": str(ex)}
+            finally:
+                self.current_job = None
+                job.done.set()
+
+    def __measure(self, job: MeasurementJob) -> dict:
+        request = job.request
+        files = []
+        sweep_failures = []
+
+        repeat = int(request.get("repeat", 1))
+        for scan in range(repeat):
+            try:
+                self.ilsts.sts_measurement(more_scans=scan < repeat - 1)
+            except Exception as scan_exception:
+                sweep_failures += [dict(failure, scan=scan + 1) for failure in self.ilsts.sweep_failures]
+                return {"status": "error", "error": str(scan_exception), "files": files,
+                        "sweep_failures": sweep_failures}
+            sweep_failures += [dict(failure, scan=scan + 1) for failure in self.ilsts.sweep_failures]
+
+            filename = "data_measurement_{}_job{}_{}{}.csv".format(
+                datetime.now().strftime("%Y%m%d_%Hhr%Mm%Ssec"),
+                job.sequence,
+                scan + 1,
+                "_" + request["label"] if request.get("label") else "")
+            filename = os.path.join(self.output_folder, filename)
+            file_logging.save_meas_data(self.ilsts, filename)
+            files.append(os.path.abspath(filename))
+
+        result = {"status": "ok", "files": files, "sweep_failures": sweep_failures}
+        if request.get("return_data", False):
+            result["wavelength"] = list(self.ilsts.wavelength_table)
+            result["il"] = [list(il_data) for il_data in self.ilsts.il_data_array]
+
+        return result
+
+
+class MeasurementClient:
+    """ Client of the measurement service """
+
+    def __init__(self, address=SERVICE_ADDRESS, authkey: bytes = None, key_file: str = SERVICE_KEY_FILE):
+        """
+        Args:
+            address: Local socket (host, port) of the service.
+            authkey (bytes): Authentication key of the service. Defaults to the key in key_file.
+            key_file (str): Key file written by the service.
+        """
+        self.last_result = None
+        self.__connection = Client(address, authkey=authkey or read_authkey(key_file))
+
+    def request(self, request: dict) -> dict:
+        """
+        Sends a request and waits for its result, also kept in last_result.
+
+        Raises:
+            Exception: If the service returns an error. The error reply (e.g. with the sweep failures of a
+                failed measurement) is in last_result.
+        """
+        self.__connection.send(request)
+        result = self.__connection.recv()
+        self.last_result = result
+        if result.get("status") != "ok":
+            raise Exception(result.get("error", "Measurement service error"))
+        return result
+
+    def measure(self, repeat: int = 1, priority: int = 0, return_data: bool = False, label: str = "") -> dict:
+        """ Runs a DUT measurement, see MeasurementService """
+        return self.request({"command": "measure",
+                             "repeat": repeat,
+                             "priority": priority,
+                             "return_data": return_data,
+                             "label": label})
+
+    def status(self) -> dict:
+        """ Returns the status of the service """
+        return self.request({"command": "status"})
+
+    def shutdown(self):
+        """ Stops the service """
+        return self.request({"command": "shutdown"})
+
+    def close(self):
+        """ Closes the connection """
+        self.__connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -8,32 +8,47 @@ Created on Thu Mar 17 19:48:11 2022
 """
 
 # Basic imports
-import os
-import clr
 import time
-from numpy import array
 
 # Importing instrument error strings
 from santec.error_handing_class import instrument_error_strings
-
-# Adding Instrument DLL to the reference
-ROOT = str(os.path.dirname(__file__)) + '\\DLL\\'
-# print(ROOT)    """ <-- uncomment in to check if the root was selected properly """
+from santec.dll_reference import add_dll_reference
+from santec.instrument_state import InstrumentState
+from santec.scpi_batch import run_batch, is_query
 
 PATH1 = 'InstrumentDLL'
-ans = clr.AddReference(ROOT + PATH1)  # Add in santec.Instrument.DLL
-# print(ans) #<-- comment in to check if the DLL was added properly
 
-# Importing from Santec namespace
-from Santec import MPM  # Importing MPM class
-from Santec.Communication import CommunicationMethod  # Enumeration Class
-from Santec.Communication import GPIBConnectType  # Enumeration Class
+# Polling of the logging status (see wait_log_completion)
+LOG_POLL_MIN_INTERVAL = 0.01    # s
+LOG_POLL_MAX_INTERVAL = 0.5     # s
+LOG_COMPLETION_MARGIN = 10      # s, added to the expected logging duration before timing out
+
+# Santec namespace classes, imported from InstrumentDLL on first use (see load_dll)
+MPM = None
+CommunicationMethod = None
+GPIBConnectType = None
+
+
+def load_dll():
+    """ Adds InstrumentDLL to the references and imports the MPM classes, on first use """
+    global MPM, CommunicationMethod, GPIBConnectType
+
+    if MPM is None:
+        add_dll_reference(PATH1)  # Add in santec.Instrument.DLL
+
+        # Importing from Santec namespace
+        from Santec import MPM  # Importing MPM class
+        from Santec.Communication import CommunicationMethod  # Enumeration Class
+        from Santec.Communication import GPIBConnectType  # Enumeration Class
+
+    return None
 
 
 class MpmDevice:
     """ MPM device class """
 
     def __init__(self, interface: str, address: str, port: int = 5000):
+        load_dll()
         self.__mpm = MPM()
         self.interface = interface
         self.address = address
@@ -45,6 +60,17 @@ class MpmDevice:
 
         self.mods_and_chans = None
 
+        # Last applied settings, to skip redundant commands
+        self.state = InstrumentState()
+
+        # Optional transport of the logging data (see set_log_transport)
+        self.log_transport = None
+
+        # Expected logging (see set_logging_parameters), used to pace wait_log_completion
+        self.expected_log_points = None
+        self.expected_log_duration = None
+        self.__log_start_time = None
+
     def connect_mpm(self):
         """
         Method handling the connection protocol of the MPM.
@@ -52,6 +78,9 @@ class MpmDevice:
         Raises:
             Exception: In case failed to connect to the MPM.
         """
+        # Nothing is known about the settings of a newly connected MPM
+        self.state.invalidate()
+
         if self.interface == "GPIB":
             mpm_communication_method = CommunicationMethod.GPIB
             self.__mpm.GPIBBoard = int(self.address.split('::')[0][-1])
@@ -74,15 +103,35 @@ class MpmDevice:
     def QueryMPM(self, command: str):
         """ Queries a command to the instrument and returns a string """
         command = command.upper()
+        if '?' not in command:
+            self.state.invalidate()  # The command might change any setting
         status, response = self.__mpm.Echo(command, "")
         return status, response
 
     def WriteMPM(self, command: str):
         """ Writes a command to the instrument """
         command = command.upper()
+        self.state.invalidate()  # The command might change any setting
         status = self.__mpm.Write(command)
         return status
 
+    def BatchMPM(self, commands: list) -> list:
+        """
+        Sends a list of writes and queries in as few transactions as possible (';' joined commands).
+
+        Args:
+            commands (list): Commands, in the order they must be executed (ex: ['POW 5', 'POW?']).
+
+        Raises:
+            Exception: If the instrument returns an error status.
+
+        Returns:
+            list: The answer of each query, None for each write.
+        """
+        if not all(is_query(command) for command in commands):
+            self.state.invalidate()  # The commands might change any setting
+        return run_batch(commands, self.WriteMPM, self.QueryMPM)
+
     def ReadMPM(self):
         """ Reads from the instrument """
         status, response = self.__mpm.Read("")
@@ -181,7 +230,31 @@ class MpmDevice:
         """
         return bool(self.__mpm.Information.ModuleType[slot_num] == "MPM-212")
 
-    def get_range(self) -> array:
+    def get_module_type(self, slot_num: int) -> str:
+        """
+        Returns the type of the module mounted at slot number slot_num (ex: "MPM-211").
+
+        Args:
+            slot_num (int): The module number (0~4).
+        """
+        return str(self.__mpm.Information.ModuleType[slot_num])
+
+    def get_power_unit(self) -> int:
+        """
+        Returns the power unit of the measured and logged data.
+
+        Raises:
+            Exception: In case the unit couldn't be read from the MPM.
+
+        Returns:
+            int: 0: dBm, 1: mW.
+        """
+        errorcode, response = self.QueryMPM("UNIT?")
+        if errorcode != 0:
+            raise Exception(str(errorcode) + ": " + instrument_error_strings(errorcode))
+        return int(response)
+
+    def get_range(self) -> list:
         """
         Gets the measurement dynamic range of the MPM module.
         Depending on the module type, the dynamic range varies.
@@ -214,13 +287,28 @@ class MpmDevice:
             Exception:  In case the MPM is busy.
                         In case wrong value for power_range is entered
         """
+        # Nothing to do if the MPM is already in this range
+        if self.state.is_applied("range", power_range):
+            return None
+
+        self.state.invalidate("range")
         errorcode = self.__mpm.Set_Range(power_range)
 
         if errorcode != 0:
             raise Exception(str(errorcode) + ": " + instrument_error_strings(errorcode))
 
+        self.state.set_applied("range", power_range)
         return None
 
+    def get_current_range(self):
+        """
+        Returns the dynamic range last set with set_range.
+
+        Returns:
+            int: The current dynamic range, None if unknown (e.g. after a raw command).
+        """
+        return self.state.get("range")
+
     def zeroing(self):
         """
         Performs a Zeroing on all MPM channels.
@@ -254,11 +342,17 @@ class MpmDevice:
         Returns:
             float: averaging time
         """
+        # The averaging time only changes with the logging parameters, or a raw command
+        if self.state.get("averaging_time") is not None:
+            self.averaging_time = self.state.get("averaging_time")
+            return self.averaging_time
+
         errorcode, self.averaging_time = self.__mpm.Get_Averaging_Time(0)
 
         if errorcode != 0:
             raise Exception(str(errorcode) + ": " + instrument_error_strings(errorcode))
 
+        self.state.set_applied("averaging_time", self.averaging_time)
         return self.averaging_time
 
     def logging_start(self):
@@ -271,6 +365,7 @@ class MpmDevice:
         errorcode = self.__mpm.Logging_Start()
         if errorcode != 0:
             raise Exception(str(errorcode) + ": " + instrument_error_strings(errorcode))
+        self.__log_start_time = time.monotonic()
 
     def logging_stop(self, except_if_error=True):
         """
@@ -289,9 +384,40 @@ class MpmDevice:
         if errorcode != 0 and except_if_error is True:
             raise Exception(str(errorcode) + ": " + instrument_error_strings(errorcode))
 
-    def get_each_channel_log_data(self, slot_num: int, chan_num: int) -> array:
+    def set_log_transport(self, log_transport=None):
+        """
+        Sets the transport of the logging data.
+
+        Args:
+            log_transport: Object with a get_each_channel_log_data(slot_num, chan_num) method,
+                e.g. mpm_log_transport.MpmVisaLogTransport. None to use InstrumentDLL again.
+        """
+        if self.log_transport is not None and self.log_transport is not log_transport:
+            self.log_transport.close()
+        self.log_transport = log_transport
+        return None
+
+    def use_visa_log_transport(self, resource_manager=None, **kwargs):
+        """
+        Reads the logging data with the binary block transfer over PyVISA, instead of InstrumentDLL.
+
+        Args:
+            resource_manager: pyvisa resource manager (see MpmVisaLogTransport).
+            kwargs: chunk_size, timeout (see MpmVisaLogTransport).
+        """
+        from santec.mpm_log_transport import MpmVisaLogTransport, mpm_resource_name
+
+        transport = MpmVisaLogTransport(mpm_resource_name(self.interface, self.address, self.port),
+                                        resource_manager,
+                                        **kwargs)
+        transport.open()
+        self.set_log_transport(transport)
+        return None
+
+    def get_each_channel_log_data(self, slot_num: int, chan_num: int) -> list:
         """
         Gets log data for specified slot and channel.
+        Uses the log transport if one is set (see set_log_transport).
 
         Args:
             slot_num (int): Module number (0~4).
@@ -303,6 +429,9 @@ class MpmDevice:
         Returns:
             array: array of logged data.
         """
+        if self.log_transport is not None:
+            return self.log_transport.get_each_channel_log_data(slot_num, chan_num)
+
         errorcode, log_data = self.__mpm.Get_Each_Channel_Logdata(slot_num, chan_num, None)
         if errorcode != 0:
             raise Exception(str(errorcode) + ": " + instrument_error_strings(errorcode))
@@ -322,6 +451,17 @@ class MpmDevice:
             RuntimeError: When trigger signal is not detected
             RuntimeError: if the MPM didn't record data
         """
+        # Number of points and duration of the logging, to pace wait_log_completion
+        self.expected_log_points = int(round(abs(stop_wavelength - start_wavelength) / sweep_step)) + 1
+        self.expected_log_duration = abs(stop_wavelength - start_wavelength) / sweep_speed
+
+        # Nothing to do if the MPM is already set to these parameters
+        logging_parameters = (start_wavelength, stop_wavelength, sweep_step, sweep_speed)
+        if self.state.is_applied("logging_parameters", logging_parameters):
+            return instrument_error_strings(0)
+
+        self.state.invalidate("logging_parameters")
+        self.state.invalidate("averaging_time")
         errorcode = self.__mpm.Set_Logging_Paremeter_for_STS(start_wavelength,
                                                              stop_wavelength,
                                                              sweep_step,
@@ -331,29 +471,85 @@ class MpmDevice:
         if errorcode != 0:
             raise Exception(str(errorcode) + ": " + instrument_error_strings(errorcode))
 
+        self.state.set_applied("logging_parameters", logging_parameters)
         return instrument_error_strings(errorcode)
 
     def Disconnect(self):
         """ Disconnects MPM instrument """
+        self.state.invalidate()
+        self.set_log_transport(None)
         self.__mpm.DisConnect()
 
-    def wait_log_completion(self, sweep_count: int):
-        """ Waits for log completion """
-        errorcode = None
-        # Check MPM Loging stopped
-        status = 0  # MPM Logging status  0: During logging 1: Completed, -1:stopped, 10:stopped
-        logging_point = 0
+    def wait_log_completion(self, sweep_count: int, timeout: float = None, progress_callback=None,
+                            cancel_event=None):
+        """
+        Waits for log completion.
+        Polls the logging status every half of the estimated remaining logging time (within
+        LOG_POLL_MIN_INTERVAL and LOG_POLL_MAX_INTERVAL), so that the completion is detected within one short
+        poll interval without querying the MPM continuously during the sweep.
+        If the logging lasts longer than expected, the poll interval doubles at each poll.
 
-        # constantly get the status in a loop. Increase the MPM timeout for this process,
+        Args:
+            sweep_count (int): Sweep number (for the error messages).
+            timeout (float, optional): Maximum waiting time (s).
+                Defaults to the expected logging duration + LOG_COMPLETION_MARGIN.
+            progress_callback (callable, optional): Called with (logging_point, expected_points)
+                each time the number of logged points changes. expected_points is None if unknown.
+            cancel_event (threading.Event, optional): Stops the waiting when set.
 
-        while status == 0:
-            errorcode, status, logging_point = self.__mpm.Get_Logging_Status(0, 0)  # Updates status, which should break us out of the loop.
-            break
+        Raises:
+            RuntimeError: When trigger signal is not detected;
+                          In case the MPM returns an error;
+                          If the logging did not complete within the timeout;
+                          If the waiting was cancelled.
+        """
+        # MPM Logging status  0: During logging 1: Completed, -1:stopped, 10:stopped
+        now = time.monotonic()
+        log_start_time = self.__log_start_time if self.__log_start_time is not None else now
+        expected_end = log_start_time + (self.expected_log_duration or 0)
+        if timeout is None:
+            timeout = (self.expected_log_duration or 0) + LOG_COMPLETION_MARGIN
+        deadline = now + timeout
+
+        last_point = None
+        overrun_interval = LOG_POLL_MIN_INTERVAL
+
+        while True:
+            errorcode, status, logging_point = self.__mpm.Get_Logging_Status(0, 0)
+
+            if errorcode == -999:
+                error_string = "MPM Trigger received an error! Please check trigger cable connection."
+                raise RuntimeError(error_string)
+
+            # it's a success if either the error code is 0, or the status is -1. Otherwise, throw.
+            if errorcode != 0 and status != -1:
+                raise RuntimeError(str(errorcode) + ": " + instrument_error_strings(errorcode))
+
+            if progress_callback is not None and logging_point != last_point:
+                progress_callback(logging_point, self.expected_log_points)
+            last_point = logging_point
+
+            if status != 0:
+                break
+
+            now = time.monotonic()
+            if now >= deadline:
+                raise RuntimeError("MPM logging of sweep {} did not complete within {:.1f} s "
+                                   "({} points logged)".format(sweep_count, timeout, logging_point))
+
+            # Half of the estimated remaining time, then backing off once the expected end is passed
+            remaining = expected_end - now
+            if remaining > 0:
+                interval = min(max(remaining / 2, LOG_POLL_MIN_INTERVAL), LOG_POLL_MAX_INTERVAL)
+            else:
+                interval = overrun_interval
+                overrun_interval = min(overrun_interval * 2, LOG_POLL_MAX_INTERVAL)
+            interval = min(interval, deadline - now)
 
-        if errorcode == -999:
-            error_string = "MPM Trigger received an error! Please check trigger cable connection."
-            raise RuntimeError(error_string)
+            if cancel_event is not None:
+                if cancel_event.wait(interval):
+                    raise RuntimeError("MPM logging of sweep {} was cancelled".format(sweep_count))
+            else:
+                time.sleep(interval)
 
-        if errorcode != 0 and status != -1:     # it's a success if either the error code is 0, or the status is -1. Otherwise, throw.
-            raise RuntimeError(str(errorcode) + ": " + instrument_error_strings(errorcode))
         return None
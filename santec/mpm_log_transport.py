@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+"""
+Created on Wed Oct 28 09:52:16 2026
+
+@author: chentir
+@organization: santec holdings corp.
+
+Reads the MPM logging data with the SCPI binary block transfer (LOGG?) over PyVISA,
+instead of MPM.Get_Each_Channel_Logdata of InstrumentDLL.
+"""
+
+# Basic imports
+import numpy
+
+# Transfer settings
+LOG_CHUNK_SIZE = 1024 * 1024    # bytes read per VISA call
+LOG_TIMEOUT = 10000             # ms, a full logging memory takes a while over GPIB
+
+
+def mpm_resource_name(interface: str, address: str, port: int = 5000) -> str:
+    """ Returns the VISA resource name of an MPM (see MpmDevice arguments) """
+    if interface == "GPIB":
+        return address
+    return "TCPIP0::{}::{}::SOCKET".format(address, port)
+
+
+class MpmVisaLogTransport:
+    """
+    Persistent VISA session used to read the MPM logging data as binary blocks.
+    Each point is a little-endian float32 (dBm), read straight into a numpy array.
+    """
+
+    def __init__(self, resource_name: str, resource_manager=None, chunk_size: int = LOG_CHUNK_SIZE,
+                 timeout: int = LOG_TIMEOUT):
+        """
+        Args:
+            resource_name (str): VISA resource of the MPM (see mpm_resource_name).
+            resource_manager: pyvisa resource manager. Defaults to the one of get_address.
+                A SimulatedResourceManager (see simulated_devices) can be used instead.
+            chunk_size (int): Bytes read per VISA call.
+            timeout (int): VISA timeout (ms).
+        """
+        self.resource_name = resource_name
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+
+        self.__resource_manager = resource_manager
+        self.__resource = None
+
+    def open(self):
+        """ Opens the VISA session, if not already open """
+        if self.__resource is not None:
+            return None
+
+        resource_manager = self.__resource_manager
+        if resource_manager is None:
+            from santec.get_address import get_resource_manager
+
+            resource_manager = get_resource_manager()
+
+        self.__resource = resource_manager.open_resource(self.resource_name)
+        self.__resource.chunk_size = self.chunk_size
+        self.__resource.timeout = self.timeout
+
+        if self.resource_name.endswith("SOCKET"):
+            self.__resource.write_termination = "\n"
+            self.__resource.read_termination = "\n"
+
+        return None
+
+    def get_each_channel_log_data(self, slot_num: int, chan_num: int) -> numpy.ndarray:
+        """
+        Gets log data for specified slot and channel.
+
+        Args:
+            slot_num (int): Module number (0~4).
+            chan_num (int): Channel number (1~4).
+
+        Returns:
+            numpy.ndarray: logged data (float64).
+        """
+        self.open()
+
+        self.__resource.write("LOGG? {},{}".format(slot_num, chan_num))
+        log_data = self.__resource.read_binary_values(datatype='f',
+                                                      is_big_endian=False,
+                                                      container=numpy.ndarray,
+                                                      header_fmt='ieee',
+                                                      expect_termination=self.resource_name.endswith("SOCKET"))
+
+        return log_data.astype(numpy.float64)
+
+    def close(self):
+        """ Closes the VISA session """
+        if self.__resource is not None:
+            self.__resource.close()
+            self.__resource = None
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+
+"""
+Created on Wed Nov 04 09:47:15 2026
+
+@author: chentir
+@organization: santec holdings corp.
+
+Passband metrics of the IL spectra of all the channels at once (channels x wavelengths IL array), e.g.:
+    metrics = passband_metrics(ilsts.wavelength_table, ilsts.il_data_array)
+    metrics["bandwidth_3db"]     # -3 dB bandwidth of each channel (nm)
+The IL is in dB with the passband as maximum (transmission, 0 dB = no loss). The band edges are linearly
+interpolated between the points around the threshold; edges outside the sweep span are NaN.
+"""
+
+# Basic imports
+import numpy
+
+BANDWIDTH_LEVELS = (0.5, 1.0, 3.0)      # dB below the peak
+CENTER_LEVEL = 3.0                      # dB, the center wavelength is the middle of this band
+SLOPE_LEVELS = (1.0, 3.0)               # dB, the edge slopes are taken between these two levels
+RIPPLE_FRACTION = 0.5                   # Central part of the CENTER_LEVEL band where the ripple is taken
+EDGE_SEARCH_WINDOW = 1024               # points, first window searched left of the peak (then 4 times wider)
+
+
+def _level_name(level: float) -> str:
+    """ Field name suffix of a level: 0.5 -> 0_5db, 3.0 -> 3db """
+    return "{:g}".format(level).replace(".", "_") + "db"
+
+
+def metrics_dtype(levels=BANDWIDTH_LEVELS) -> numpy.dtype:
+    """ Structured dtype of the metrics of one channel """
+    fields = [("min_il", numpy.float64),
+              ("max_il", numpy.float64),
+              ("mean_il", numpy.float64),
+              ("peak_wavelength", numpy.float64),
+              ("center_wavelength", numpy.float64),
+              ("ripple", numpy.float64)]
+    fields += [("bandwidth_" + _level_name(level), numpy.float64) for level in levels]
+    fields += [("left_slope", numpy.float64),
+               ("right_slope", numpy.float64),
+               ("isolation", numpy.float64)]
+    return numpy.dtype(fields)
+
+
+def band_edges(wavelengths, il, peak_index: int, threshold: float):
+    """
+    Finds the crossings of the threshold on both sides of the peak of one channel.
+
+    Args:
+        wavelengths (numpy.ndarray): Wavelengths (n), ascending.
+        il (numpy.ndarray): IL of the channel (n).
+        peak_index (int): Index of the peak.
+        threshold (float): Threshold (dB).
+
+    Returns:
+        tuple: (left, right) interpolated wavelengths, NaN where the IL does not cross the threshold.
+    """
+    def crossing(low, high):
+        if il[high] == il[low]:
+            return wavelengths[low]
+        return wavelengths[low] + (threshold - il[low]) / (il[high] - il[low]) * (wavelengths[high] - wavelengths[low])
+
+    # Last point below the threshold before the peak, searched in windows growing away from the peak
+    left = numpy.nan
+    window = EDGE_SEARCH_WINDOW
+    start = peak_index
+    while start > 0:
+        start = max(0, peak_index - window)
+        below = numpy.flatnonzero(il[start:peak_index] < threshold)
+        if len(below) > 0:
+            low = start + int(below[-1])
+            left = crossing(low, low + 1)
+            break
+        window *= 4
+
+    # First point below the threshold after the peak (argmax stops at the first True)
+    right = numpy.nan
+    below = il[peak_index + 1:] < threshold
+    if len(below) > 0:
+        distance = int(numpy.argmax(below))
+        if below[distance]:
+            high = peak_index + 1 + distance
+            right = crossing(high - 1, high)
+
+    return left, right
+
+
+def passband_metrics(wavelengths, il_data_array, levels=BANDWIDTH_LEVELS, ripple_fraction: float = RIPPLE_FRACTION,
+                     isolation_offset: float = None) -> numpy.ndarray:
+    """
+    Computes the passband metrics of each channel.
+    Each channel is processed with whole-array operations, the points are never looped over.
+
+    Args:
+        wavelengths (list): Wavelength table (nm), ascending.
+        il_data_array (list): IL of each channel (dB), e.g. StsProcess.il_data_array.
+        levels (tuple): Levels of the bandwidths (dB below the peak).
+        ripple_fraction (float): Central part of the -3 dB band where the ripple (peak to peak IL) is taken.
+        isolation_offset (float): Distance from the center wavelength (nm) beyond which the isolation (peak IL
+            minus the highest IL) is taken. Defaults to the -3 dB bandwidth.
+
+    Returns:
+        numpy.ndarray: Structured array (see metrics_dtype), one record per channel.
+    """
+    wavelengths = numpy.asarray(wavelengths, dtype=numpy.float64)
+    il_array = numpy.atleast_2d(numpy.asarray(il_data_array, dtype=numpy.float64))
+
+    metrics = numpy.full(len(il_array), numpy.nan, dtype=metrics_dtype(levels))
+    edge_levels = sorted(set(levels) | set(SLOPE_LEVELS) | {CENTER_LEVEL})
+
+    for record, il in zip(metrics, il_array):
+        peak_index = int(numpy.argmax(il))
+        peak = il[peak_index]
+        record["min_il"] = numpy.min(il)
+        record["max_il"] = peak
+        record["mean_il"] = numpy.mean(il)
+        record["peak_wavelength"] = wavelengths[peak_index]
+
+        edges = {level: band_edges(wavelengths, il, peak_index, peak - level) for level in edge_levels}
+        for level in levels:
+            left, right = edges[level]
+            record["bandwidth_" + _level_name(level)] = right - left
+
+        # Edge slopes (dB/nm), positive on the rising edge and negative on the falling edge
+        (top_left, top_right), (bottom_left, bottom_right) = edges[SLOPE_LEVELS[0]], edges[SLOPE_LEVELS[1]]
+        level_difference = SLOPE_LEVELS[1] - SLOPE_LEVELS[0]
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            record["left_slope"] = numpy.float64(level_difference) / (top_left - bottom_left)
+            record["right_slope"] = -numpy.float64(level_difference) / (bottom_right - top_right)
+
+        left, right = edges[CENTER_LEVEL]
+        if numpy.isnan(left) or numpy.isnan(right):
+            continue
+        center = (left + right) / 2
+        bandwidth = right - left
+        record["center_wavelength"] = center
+
+        # The wavelengths are ascending: the windows are index ranges
+        half_width = ripple_fraction * bandwidth / 2
+        first, last = numpy.searchsorted(wavelengths, (center - half_width, center + half_width), side="left")
+        last = max(last, first + 1)
+        record["ripple"] = numpy.max(il[first:last]) - numpy.min(il[first:last])
+
+        offset = bandwidth if isolation_offset is None else isolation_offset
+        first, last = numpy.searchsorted(wavelengths, (center - offset, center + offset), side="right")
+        stopband = [part for part in (il[:first], il[last:]) if len(part) > 0]
+        if len(stopband) > 0:
+            record["isolation"] = peak - max(numpy.max(part) for part in stopband)
+
+    return metrics
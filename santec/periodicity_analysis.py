@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+
+"""
+Created on Fri Nov 06 11:02:44 2026
+
+@author: chentir
+@organization: santec holdings corp.
+
+Spectral periodicity of the IL: Fabry-Perot ripple (e.g. between connectors) and periodic devices.
+The spectra are resampled to a uniform optical frequency axis, windowed and Fourier transformed, all the spectra
+at once. A ripple of period FSR (THz) is a peak at the delay 1 / FSR (ps) of the periodogram, i.e. the round trip
+time of the cavity, of length c / (2 * group index * FSR).
+"""
+
+# Basic imports
+import numpy
+
+SPEED_OF_LIGHT = 299792.458     # nm.THz, wavelength (nm) = SPEED_OF_LIGHT / frequency (THz)
+GROUP_INDEX = 1.4682            # Group index of the cavities (single mode fiber at 1550 nm)
+PEAK_COUNT = 3                  # Dominant periods reported for each spectrum
+MIN_DELAY_BINS = 3              # The first delay bins hold the residue of the detrending, not ripple
+MIN_RELATIVE_AMPLITUDE = 8.0    # A period is reported if its peak is this many times the median of the periodogram
+
+# Dominant period of a spectrum
+PERIOD_DTYPE = numpy.dtype([("delay", numpy.float64),           # Round trip time (ps)
+                            ("fsr", numpy.float64),             # Free spectral range (THz)
+                            ("fsr_wavelength", numpy.float64),  # Free spectral range at the center wavelength (nm)
+                            ("ripple", numpy.float64),          # Peak to peak amplitude (dB)
+                            ("cavity_length", numpy.float64)])  # mm, at the group index
+
+
+def to_uniform_frequency(wavelengths, il_arrays, point_count: int = None):
+    """
+    Resamples spectra to a uniform optical frequency axis (linear interpolation).
+    The interpolation weights are computed once and applied to all the spectra.
+
+    Args:
+        wavelengths (list): Wavelength table (nm), e.g. the rescaled wavelength table of the StsProcess.
+        il_arrays (list): IL of the spectra (dB), the points on the last axis.
+        point_count (int): Points of the frequency axis. Defaults to the number of wavelengths.
+
+    Returns:
+        tuple: (frequencies (THz), ascending, resampled IL with the same leading axes as il_arrays).
+    """
+    wavelengths = numpy.asarray(wavelengths, dtype=numpy.float64)
+    il_arrays = numpy.asarray(il_arrays, dtype=numpy.float64)
+
+    source = SPEED_OF_LIGHT / wavelengths
+    order = numpy.argsort(source)
+    source = source[order]
+    il_arrays = il_arrays[..., order]
+
+    frequencies = numpy.linspace(source[0], source[-1], point_count or len(source))
+    upper = numpy.clip(numpy.searchsorted(source, frequencies), 1, len(source) - 1)
+    lower = upper - 1
+    fraction = (frequencies - source[lower]) / (source[upper] - source[lower])
+
+    resampled = il_arrays[..., lower] * (1 - fraction) + il_arrays[..., upper] * fraction
+    return frequencies, resampled
+
+
+def periodogram(wavelengths, il_arrays, window=numpy.hanning, point_count: int = None):
+    """
+    Amplitude spectrum of the IL on the optical frequency axis, all the spectra at once.
+    The linear trend of each spectrum is removed before windowing.
+
+    Args:
+        wavelengths (list): Wavelength table (nm).
+        il_arrays (list): IL of the spectra (dB), the points on the last axis (e.g. scans x channels x points).
+        window: Window function of the number of points (numpy.hanning, numpy.blackman, numpy.ones...).
+        point_count (int): Points of the frequency axis. Defaults to the power of two at or above the number of
+            wavelengths, the fastest FFT length.
+
+    Returns:
+        tuple: (delays (ps), amplitudes (dB) with the same leading axes as il_arrays). A sinusoidal ripple of
+        amplitude A (dB, half the peak to peak) gives a peak of height A.
+    """
+    if point_count is None:
+        point_count = 1 << (len(wavelengths) - 1).bit_length()
+    frequencies, resampled = to_uniform_frequency(wavelengths, il_arrays, point_count)
+
+    # Linear detrending, all the spectra at once
+    spectra = resampled.reshape(-1, point_count)
+    centered = (frequencies - numpy.mean(frequencies)) / (frequencies[-1] - frequencies[0])
+    slope = spectra @ centered / (centered @ centered)
+    spectra = spectra - numpy.mean(spectra, axis=1)[:, numpy.newaxis] - slope[:, numpy.newaxis] * centered
+
+    weights = window(point_count)
+    amplitudes = 2 * numpy.abs(numpy.fft.rfft(spectra * weights, axis=1)) / numpy.sum(weights)
+    delays = numpy.fft.rfftfreq(point_count, frequencies[1] - frequencies[0])
+
+    return delays, amplitudes.reshape(resampled.shape[:-1] + (len(delays),))
+
+
+def dominant_periods(wavelengths, il_arrays, peak_count: int = PEAK_COUNT, group_index: float = GROUP_INDEX,
+                     window=numpy.hanning, min_delay_bins: int = MIN_DELAY_BINS,
+                     min_relative_amplitude: float = MIN_RELATIVE_AMPLITUDE) -> numpy.ndarray:
+    """
+    Finds the strongest periods of each spectrum.
+    The peaks of the periodogram are refined between the delay bins by Gaussian (log-parabolic) interpolation.
+    Peaks that do not stand out of the noise floor (median of the periodogram) are not periods.
+
+    Args:
+        wavelengths (list): Wavelength table (nm).
+        il_arrays (list): IL of the spectra (dB), the points on the last axis (e.g. scans x channels x points).
+        peak_count (int): Number of periods reported for each spectrum, strongest first.
+        group_index (float): Group index of the cavities, for the cavity lengths.
+        window: Window function, see periodogram.
+        min_delay_bins (int): Delay bins ignored next to zero delay.
+        min_relative_amplitude (float): Smallest peak amplitude, relative to the median amplitude of the
+            periodogram between min_delay_bins and the largest delay resolved by the wavelength table.
+            0 to report every peak.
+
+    Returns:
+        numpy.ndarray: Structured array (PERIOD_DTYPE) with the leading axes of il_arrays and peak_count periods
+        on the last axis. The periods that were not found, or below the amplitude threshold, are NaN.
+    """
+    wavelengths = numpy.asarray(wavelengths, dtype=numpy.float64)
+    delays, amplitudes = periodogram(wavelengths, il_arrays, window)
+    leading_shape = amplitudes.shape[:-1]
+    amplitudes = amplitudes.reshape(-1, len(delays))
+    spectrum_count, bin_count = amplitudes.shape
+
+    # Local maxima of the periodogram, strongest first
+    is_peak = numpy.zeros(amplitudes.shape, dtype=bool)
+    is_peak[:, 1:-1] = (amplitudes[:, 1:-1] > amplitudes[:, :-2]) & (amplitudes[:, 1:-1] >= amplitudes[:, 2:])
+    is_peak[:, :max(min_delay_bins, 1)] = False
+    candidates = numpy.where(is_peak, amplitudes, -1.0)
+    peak_count = min(peak_count, bin_count)
+    ranked = numpy.argpartition(-candidates, peak_count - 1, axis=1)[:, :peak_count]
+    ranked = numpy.take_along_axis(ranked, numpy.argsort(-numpy.take_along_axis(candidates, ranked, axis=1), axis=1),
+                                   axis=1)
+    found = numpy.take_along_axis(is_peak, ranked, axis=1)
+
+    # Amplitude threshold above the noise floor. The delays beyond the sampling of the wavelength table (the FFT
+    # length is padded to a power of two) hold no noise, and are left out of the floor.
+    resolved_bins = max(min(bin_count, len(wavelengths) // 2 + 1), max(min_delay_bins, 1) + 1)
+    floor = numpy.median(amplitudes[:, max(min_delay_bins, 1):resolved_bins], axis=1)
+    found &= numpy.take_along_axis(amplitudes, ranked, axis=1) >= min_relative_amplitude * floor[:, numpy.newaxis]
+
+    # Log-parabolic interpolation between the bins around each peak
+    rows = numpy.arange(spectrum_count)[:, numpy.newaxis]
+    neighbours = numpy.clip(ranked, 1, bin_count - 2)
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        before, center, after = (numpy.log(amplitudes[rows, neighbours + shift]) for shift in (-1, 0, 1))
+        curvature = before - 2 * center + after
+        offset = numpy.where(curvature < 0, 0.5 * (before - after) / curvature, 0.0)
+        amplitude = numpy.exp(center - 0.25 * (before - after) * offset)
+
+    delay_step = delays[1] - delays[0]
+    delay = (neighbours + offset) * delay_step
+
+    center_wavelength = (wavelengths[0] + wavelengths[-1]) / 2
+    periods = numpy.full((spectrum_count, peak_count), numpy.nan, dtype=PERIOD_DTYPE)
+    periods["delay"] = numpy.where(found, delay, numpy.nan)
+    periods["fsr"] = 1 / periods["delay"]
+    periods["fsr_wavelength"] = center_wavelength ** 2 * periods["fsr"] / SPEED_OF_LIGHT
+    periods["ripple"] = numpy.where(found, 2 * amplitude, numpy.nan)
+    # Round trip time = 2 * group index * length / c, with c = SPEED_OF_LIGHT * 1e-6 mm/ps
+    periods["cavity_length"] = SPEED_OF_LIGHT * 1e-6 * periods["delay"] / (2 * group_index)
+
+    return periods.reshape(leading_shape + (peak_count,))
@@ -0,0 +1,328 @@
+# -*- coding: utf-8 -*-
+
+"""
+Created on Thu Nov 05 10:21:37 2026
+
+@author: chentir
+@organization: santec holdings corp.
+
+Resonance analysis of the IL spectra (e.g. ring resonators with hundreds of resonances per spectrum).
+The resonances are detected as the extrema of their neighbourhood with a minimum prominence, then each resonance
+is fitted with a Lorentzian, linearised so that all the resonances of a spectrum are fitted at once:
+    1 / depth(x) = c2 * x² + c1 * x + c0
+The spectra of several channels and scans are analysed in parallel processes (see analyze_resonances_batch).
+"""
+
+# Basic imports
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy
+
+PROMINENCE = 3.0            # dB, smallest prominence of a resonance
+MIN_DISTANCE = 0.1          # nm, smallest distance between two resonances (and prominence window)
+FIT_DEPTH_FRACTION = 0.25   # Points shallower than this fraction of the resonance depth are not fitted
+BASELINE_WINDOW_FWHM = 5.0  # Half width of the baseline windows, in measured FWHM
+FIT_WINDOW_FWHM = 3.0       # Half width of the fit windows, in measured FWHM
+MIN_COVERAGE_FWHM = 2.0     # Fits whose window does not cover this many fitted FWHM on each side are invalid
+WIDTH_ITERATIONS = 3        # Baseline and half maximum width refinements
+CROSSING_SEARCH_WINDOW = 64     # points, first window searched for the half maximum crossings (then 4 times wider)
+
+# Fitted parameters of each resonance
+RESONANCE_DTYPE = numpy.dtype([("index", numpy.int64),              # Index of the detected extremum
+                               ("wavelength", numpy.float64),       # Fitted center wavelength (nm)
+                               ("fwhm", numpy.float64),             # Fitted full width at half maximum (nm)
+                               ("q", numpy.float64),                # Loaded Q factor, wavelength / fwhm
+                               ("extinction_ratio", numpy.float64),  # dB, measured
+                               ("prominence", numpy.float64)])      # dB
+
+
+def trailing_extremum(values, window: int, ufunc=numpy.maximum) -> numpy.ndarray:
+    """
+    Maximum (or minimum with numpy.minimum) of the window points ending at each point, in O(n) whatever the window
+    (van Herk / Gil-Werman algorithm).
+
+    Args:
+        values (numpy.ndarray): Values (n).
+        window (int): Window length (points).
+        ufunc: numpy.maximum or numpy.minimum.
+
+    Returns:
+        numpy.ndarray: ufunc of values[i - window + 1:i + 1] for each i (shorter windows at the start).
+    """
+    values = numpy.asarray(values, dtype=numpy.float64)
+    point_count = len(values)
+    fill = -numpy.inf if ufunc is numpy.maximum else numpy.inf
+
+    padded_length = -(-(point_count + window - 1) // window) * window
+    padded = numpy.full(padded_length, fill)
+    padded[window - 1:window - 1 + point_count] = values
+
+    blocks = padded.reshape(-1, window)
+    prefix = ufunc.accumulate(blocks, axis=1).ravel()
+    suffix = ufunc.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].ravel()
+
+    # The window starting at i in the padded array spans the end of a block and the start of the next one
+    return ufunc(suffix[:point_count], prefix[window - 1:window - 1 + point_count])
+
+
+def distance_points(wavelengths, distance: float) -> int:
+    """ Returns a wavelength distance (nm) in points of the wavelength table (at least 1) """
+    step = abs(wavelengths[-1] - wavelengths[0]) / max(len(wavelengths) - 1, 1)
+    return max(1, int(round(distance / step))) if step > 0 else 1
+
+
+def window_extremum(values, starts, stops, ufunc=numpy.maximum) -> numpy.ndarray:
+    """
+    Maximum (or minimum with numpy.minimum) of values[starts[i]:stops[i]] for each i, the windows may overlap.
+
+    Args:
+        values (numpy.ndarray): Values (n).
+        starts (numpy.ndarray): First index of each window.
+        stops (numpy.ndarray): Index after the last one of each window (at most n, above starts).
+    """
+    # The reduction of each start runs up to the next bound, its stop
+    bounds = numpy.stack((starts, stops), axis=1).ravel()
+    return ufunc.reduceat(numpy.append(values, values[-1]), bounds)[::2]
+
+
+def half_maximum_crossings(signal, indices, levels, limits, direction: int) -> numpy.ndarray:
+    """
+    Finds the first point at or below the level on one side of each resonance, all the resonances at once.
+    The points are searched in windows growing away from the resonances, up to the limits.
+
+    Args:
+        signal (numpy.ndarray): Signal (n), above the levels inside the resonances.
+        indices (numpy.ndarray): Indices of the resonances.
+        levels (numpy.ndarray): Level of each resonance.
+        limits (numpy.ndarray): Last index searched for each resonance.
+        direction (int): -1 to search on the left of the resonances, 1 on the right.
+
+    Returns:
+        numpy.ndarray: Index of the crossing of each resonance, NaN where the signal does not cross the level.
+    """
+    crossings = numpy.full(len(indices), numpy.nan)
+    remaining = numpy.arange(len(indices))
+    window = CROSSING_SEARCH_WINDOW
+
+    while len(remaining) > 0:
+        positions = indices[remaining, numpy.newaxis] + direction * numpy.arange(1, window + 1)
+        searched = (limits[remaining, numpy.newaxis] - positions) * direction >= 0
+        below = searched & (signal[numpy.clip(positions, 0, len(signal) - 1)] <= levels[remaining, numpy.newaxis])
+
+        # argmax stops at the first crossing
+        first = numpy.argmax(below, axis=1)
+        rows = numpy.arange(len(remaining))
+        found = below[rows, first]
+        crossings[remaining[found]] = positions[rows[found], first[found]]
+
+        # The search stops at the limits
+        remaining = remaining[~found & searched[:, -1]]
+        window *= 4
+
+    return crossings
+
+
+def find_resonances(wavelengths, il, prominence: float = PROMINENCE, distance: float = MIN_DISTANCE,
+                    kind: str = "dip"):
+    """
+    Detects the resonances of a spectrum.
+    A resonance is the extremum of the distance on both sides, and its prominence is its depth below the
+    highest of the two bases (the opposite extremum within the distance on each side).
+
+    Args:
+        wavelengths (list): Wavelength table (nm), ascending.
+        il (list): IL (dB).
+        prominence (float): Smallest prominence (dB).
+        distance (float): Smallest distance between two resonances (nm), also the prominence window. It must be
+            larger than about half the FWHM of the resonances.
+        kind (str): "dip" (notch, e.g. through port) or "peak" (e.g. drop port).
+
+    Returns:
+        tuple: (indices, prominences) numpy arrays of the resonances, ascending.
+    """
+    values = numpy.asarray(il, dtype=numpy.float64)
+    if kind == "dip":
+        values = -values
+    elif kind != "peak":
+        raise Exception("The resonance kind must be 'dip' or 'peak'.")
+
+    point_count = len(values)
+    distance = distance_points(wavelengths, distance)
+    window = 2 * distance + 1
+
+    # Extremum of its neighbourhood, the first point of a plateau only
+    tail = numpy.full(distance, -numpy.inf)
+    neighbourhood_max = trailing_extremum(numpy.concatenate((values, tail)), window)[distance:]
+    is_extremum = values >= neighbourhood_max
+    is_extremum[1:] &= ~is_extremum[:-1]
+    indices = numpy.flatnonzero(is_extremum)
+
+    # Bases on both sides
+    tail = numpy.full(distance, numpy.inf)
+    left_base = trailing_extremum(values, distance + 1, numpy.minimum)[indices]
+    right_base = trailing_extremum(numpy.concatenate((values, tail)), distance + 1, numpy.minimum)[indices + distance]
+    prominences = values[indices] - numpy.maximum(left_base, right_base)
+
+    # The bases are only defined inside the spectrum
+    keep = (prominences >= prominence) & (indices > 0) & (indices < point_count - 1)
+    return indices[keep], prominences[keep]
+
+
+def fit_lorentzians(wavelengths, il, indices, kind: str = "dip", distance: float = MIN_DISTANCE) -> tuple:
+    """
+    Fits a Lorentzian on each resonance, all the resonances at once.
+    The windows follow the width of each resonance: the half maximum crossings are measured against the baseline,
+    the highest power (lowest for a peak) within BASELINE_WINDOW_FWHM widths, and both are refined in turn.
+    The fit is then the weighted linear least squares fit of 1 / depth within FIT_WINDOW_FWHM widths, bounded by
+    the middle of the neighbouring resonances, with depth the distance of the linear power to the baseline.
+
+    Args:
+        wavelengths (list): Wavelength table (nm), ascending.
+        il (list): IL (dB).
+        indices (list): Indices of the resonances (see find_resonances), ascending.
+        kind (str): "dip" or "peak".
+        distance (float): Smallest baseline window (nm).
+
+    Returns:
+        tuple: (center wavelengths, fwhm, extinction ratios (dB)) numpy arrays. The center and fwhm are NaN where
+        the fit failed, or where its window does not cover MIN_COVERAGE_FWHM fitted widths on each side.
+    """
+    wavelengths = numpy.asarray(wavelengths, dtype=numpy.float64)
+    power = 10 ** (numpy.asarray(il, dtype=numpy.float64) / 10)
+    indices = numpy.asarray(indices, dtype=numpy.int64)
+    point_count = len(power)
+
+    # Signal above its half maximum inside the resonances, and baseline extremum
+    signal, ufunc = (-power, numpy.maximum) if kind == "dip" else (power, numpy.minimum)
+    left_limits = numpy.concatenate(([0], indices[:-1]))
+    right_limits = numpy.concatenate((indices[1:], [point_count - 1]))
+
+    # Width of each resonance (points), from the baseline within the distance at first
+    width = numpy.zeros(len(indices))
+    min_half_window = distance_points(wavelengths, distance)
+    for _ in range(WIDTH_ITERATIONS):
+        half_window = numpy.maximum(min_half_window, (BASELINE_WINDOW_FWHM * width).astype(numpy.int64))
+        baseline = window_extremum(power,
+                                   numpy.maximum(indices - half_window, 0),
+                                   numpy.minimum(indices + half_window + 1, point_count),
+                                   ufunc)
+        levels = -(baseline + power[indices]) / 2 if kind == "dip" else (baseline + power[indices]) / 2
+        width = (half_maximum_crossings(signal, indices, levels, right_limits, 1) -
+                 half_maximum_crossings(signal, indices, levels, left_limits, -1))
+        width = numpy.nan_to_num(width, nan=0.0)
+
+    # Fit windows, up to the middle of the neighbouring resonances
+    half_window = numpy.maximum(2, (FIT_WINDOW_FWHM * width).astype(numpy.int64))
+    first = numpy.maximum(indices - half_window, numpy.concatenate(([0], (indices[:-1] + indices[1:]) // 2)))
+    last = numpy.minimum(indices + half_window,
+                         numpy.concatenate(((indices[:-1] + indices[1:] + 1) // 2, [point_count - 1])))
+    offsets = numpy.arange(-int(numpy.max(indices - first, initial=0)), int(numpy.max(last - indices, initial=0)) + 1)
+    window = indices[:, numpy.newaxis] + offsets
+    in_window = (window >= first[:, numpy.newaxis]) & (window <= last[:, numpy.newaxis])
+    window = numpy.clip(window, 0, point_count - 1)
+
+    center = wavelengths[indices]
+    scale = numpy.maximum(center - wavelengths[first], wavelengths[last] - center)
+    scale[scale == 0] = 1.0
+    x = (wavelengths[window] - center[:, numpy.newaxis]) / scale[:, numpy.newaxis]
+    window_power = power[window]
+
+    if kind == "dip":
+        depth = baseline[:, numpy.newaxis] - window_power
+        extinction_ratio = 10 * numpy.log10(baseline / numpy.min(window_power, axis=1, where=in_window,
+                                                                  initial=numpy.inf))
+    else:
+        depth = window_power - baseline[:, numpy.newaxis]
+        extinction_ratio = 10 * numpy.log10(numpy.max(window_power, axis=1, where=in_window, initial=0.0) / baseline)
+
+    # Only the points well inside the resonance, weighted by depth² (relative error of 1 / depth)
+    depth = numpy.where(in_window, depth, 0.0)
+    used = depth > FIT_DEPTH_FRACTION * numpy.max(depth, axis=1)[:, numpy.newaxis]
+    weights = numpy.where(used, depth ** 2, 0.0)
+    inverse_depth = numpy.where(used, 1 / numpy.where(used, depth, 1.0), 0.0)
+
+    basis = numpy.stack((x ** 2, x, numpy.ones_like(x)), axis=2)
+    normal_matrix = numpy.einsum("rk,rki,rkj->rij", weights, basis, basis)
+    normal_vector = numpy.einsum("rk,rki,rk->ri", weights, basis, inverse_depth)
+    c2, c1, c0 = numpy.einsum("rij,rj->ri", numpy.linalg.pinv(normal_matrix), normal_vector).T
+
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        x0 = -c1 / (2 * c2)
+        gamma_squared = c0 / c2 - x0 ** 2
+        fitted_wavelength = center + x0 * scale
+        fwhm = 2 * numpy.sqrt(numpy.abs(gamma_squared)) * scale
+        valid = (c2 > 0) & (gamma_squared > 0) & (numpy.abs(x0) <= 1) & \
+                (fitted_wavelength - wavelengths[first] >= MIN_COVERAGE_FWHM * fwhm) & \
+                (wavelengths[last] - fitted_wavelength >= MIN_COVERAGE_FWHM * fwhm)
+
+    return numpy.where(valid, fitted_wavelength, numpy.nan), numpy.where(valid, fwhm, numpy.nan), extinction_ratio
+
+
+def analyze_resonances(wavelengths, il, prominence: float = PROMINENCE, distance: float = MIN_DISTANCE,
+                       kind: str = "dip") -> numpy.ndarray:
+    """
+    Detects and fits the resonances of one spectrum.
+
+    Args:
+        wavelengths (list): Wavelength table (nm), ascending.
+        il (list): IL (dB), e.g. one channel of StsProcess.il_data_array.
+        prominence, distance, kind: see find_resonances.
+
+    Returns:
+        numpy.ndarray: Structured array (RESONANCE_DTYPE), one record per resonance.
+    """
+    indices, prominences = find_resonances(wavelengths, il, prominence, distance, kind)
+    resonances = numpy.zeros(len(indices), dtype=RESONANCE_DTYPE)
+    if len(indices) == 0:
+        return resonances
+
+    wavelength, fwhm, extinction_ratio = fit_lorentzians(wavelengths, il, indices, kind, distance)
+    resonances["index"] = indices
+    resonances["wavelength"] = wavelength
+    resonances["fwhm"] = fwhm
+    resonances["q"] = wavelength / fwhm
+    resonances["extinction_ratio"] = extinction_ratio
+    resonances["prominence"] = prominences
+    return resonances
+
+
+# Wavelength table and parameters of the worker processes (see analyze_resonances_batch)
+_worker_wavelengths = None
+_worker_parameters = None
+
+
+def _init_worker(wavelengths, parameters: dict):
+    global _worker_wavelengths, _worker_parameters
+    _worker_wavelengths = wavelengths
+    _worker_parameters = parameters
+
+
+def _analyze_worker(il):
+    return analyze_resonances(_worker_wavelengths, il, **_worker_parameters)
+
+
+def analyze_resonances_batch(wavelengths, il_arrays, processes: int = None, **parameters) -> list:
+    """
+    Analyses the spectra of several channels and scans in parallel processes.
+    The wavelength table is sent once to each process.
+
+    Args:
+        wavelengths (list): Wavelength table (nm), common to all the spectra.
+        il_arrays (list): IL of each spectrum, e.g. StsProcess.il_data_array.
+        processes (int): Number of processes. Defaults to the number of cores, 1 analyses in this process.
+        parameters: Parameters of analyze_resonances (prominence, distance, kind).
+
+    Returns:
+        list: Structured array of the resonances of each spectrum (see analyze_resonances).
+    """
+    wavelengths = numpy.asarray(wavelengths, dtype=numpy.float64)
+    il_arrays = [numpy.asarray(il, dtype=numpy.float64) for il in il_arrays]
+    processes = min(processes or os.cpu_count() or 1, len(il_arrays))
+
+    if processes <= 1:
+        return [analyze_resonances(wavelengths, il, **parameters) for il in il_arrays]
+
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker,
+                             initargs=(wavelengths, parameters)) as executor:
+        return list(executor.map(_analyze_worker, il_arrays))
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+
+"""
+Created on Tue Oct 27 10:07:45 2026
+
+@author: chentir
+@organization: santec holdings corp.
+
+Batching of SCPI commands: several commands are joined with ';' into one transaction,
+and the answers of the queries of a transaction come back in one read, separated by ';'.
+"""
+
+# Importing instrument error strings
+from santec.error_handing_class import instrument_error_strings
+
+# Longest joined command line sent in one transaction (characters)
+MAX_TRANSACTION_LENGTH = 200
+
+
+def is_query(command: str) -> bool:
+    """ True if the command expects an answer """
+    return '?' in command
+
+
+def build_transactions(commands: list, max_length: int = MAX_TRANSACTION_LENGTH) -> list:
+    """
+    Groups consecutive commands into as few transactions as possible.
+
+    Args:
+        commands (list): SCPI commands (writes and queries), in the order they must be executed.
+        max_length (int): Longest joined command line.
+
+    Returns:
+        list: (joined command, indexes of the commands in the transaction) of each transaction.
+    """
+    transactions = []
+    joined = ""
+    indexes = []
+
+    for index, command in enumerate(commands):
+        command = command.strip()
+        if ';' in command:
+            raise Exception("The batch commands cannot contain ';': '{}'".format(command))
+
+        if indexes and len(joined) + 1 + len(command) > max_length:
+            transactions.append((joined, indexes))
+            joined = ""
+            indexes = []
+
+        joined = command if not indexes else joined + ";" + command
+        indexes.append(index)
+
+    if indexes:
+        transactions.append((joined, indexes))
+
+    return transactions
+
+
+def run_batch(commands: list, write, query, max_length: int = MAX_TRANSACTION_LENGTH) -> list:
+    """
+    Sends the commands in as few transactions as possible, and splits the answers back out.
+    If the answers of a transaction of queries only cannot be split, its queries are sent again one by one.
+
+    Args:
+        commands (list): SCPI commands (writes and queries).
+        write: Method writing a command and returning a status (ex: TslDevice.WriteTSL).
+        query: Method querying a command and returning (status, answer) (ex: TslDevice.QueryTSL).
+        max_length (int): Longest joined command line.
+
+    Raises:
+        Exception: If the instrument returns an error status, or if the answers of a transaction with writes
+            cannot be split (its writes were executed, asking its queries again would not give the same answers).
+
+    Returns:
+        list: The answer of each query, None for each write.
+    """
+    answers = [None] * len(commands)
+
+    for joined, indexes in build_transactions(commands, max_length):
+        query_indexes = [index for index in indexes if is_query(commands[index])]
+
+        if len(query_indexes) == 0:
+            status = write(joined)
+            if status != 0:
+                raise Exception(str(status) + ": " + instrument_error_strings(status))
+            continue
+
+        status, response = query(joined)
+        if status != 0:
+            raise Exception(str(status) + ": " + instrument_error_strings(status))
+
+        split_response = [item.strip() for item in str(response).strip().split(';')]
+        if len(split_response) != len(query_indexes):
+            if len(query_indexes) != len(indexes):
+                raise Exception("Got {} answers instead of {} to '{}'.".format(
+                    len(split_response), len(query_indexes), joined))
+
+            # Queries only: they can be asked again one by one
+            split_response = []
+            for index in query_indexes:
+                status, response = query(commands[index])
+                if status != 0:
+                    raise Exception(str(status) + ": " + instrument_error_strings(status))
+                split_response.append(str(response).strip())
+
+        for index, answer in zip(query_indexes, split_response):
+            answers[index] = answer
+
+    return answers
@@ -0,0 +1,337 @@
+# -*- coding: utf-8 -*-
+
+"""
+Created on Thu Oct 29 10:05:17 2026
+
+@author: chentir
+@organization: santec holdings corp.
+
+Segmented sweeps: a list of wavelength windows, each with its own sweep step and speed, measured as consecutive
+sweeps and stitched into one non-uniform wavelength axis.
+For example, fine steps on the passband edges of a filter and coarse steps everywhere else.
+"""
+
+# Basic imports
+import os
+from array import array
+
+# Two wavelengths closer than this (nm) are the same point when stitching the segments
+STITCH_TOLERANCE = 1e-6
+
+
+class SweepSegment:
+    """ Wavelength window swept with its own step and speed """
+
+    def __init__(self, start_wavelength: float, stop_wavelength: float, sweep_step: float, sweep_speed: float):
+        """
+        Args:
+            start_wavelength (float): Segment start wavelength (nm).
+            stop_wavelength (float): Segment stop wavelength (nm).
+            sweep_step (float): Segment sweep step (nm).
+            sweep_speed (float): Segment sweep speed (nm/s), from the TSL sweep speed table.
+        """
+        if stop_wavelength <= start_wavelength:
+            raise Exception("The segment stop wavelength must be above its start wavelength.")
+        if sweep_step <= 0 or sweep_speed <= 0:
+            raise Exception("The segment sweep step and speed must be positive.")
+
+        self.start_wavelength = start_wavelength
+        self.stop_wavelength = stop_wavelength
+        self.sweep_step = sweep_step
+        self.sweep_speed = sweep_speed
+
+    @property
+    def point_count(self) -> int:
+        """ Number of points of the segment """
+        return int(round((self.stop_wavelength - self.start_wavelength) / self.sweep_step)) + 1
+
+    @property
+    def sweep_time(self) -> float:
+        """ Sweep duration of the segment (s) """
+        return (self.stop_wavelength - self.start_wavelength) / self.sweep_speed
+
+    def to_list(self) -> list:
+        return [self.start_wavelength, self.stop_wavelength, self.sweep_step, self.sweep_speed]
+
+    def __repr__(self):
+        return "SweepSegment({}, {}, {}, {})".format(*self.to_list())
+
+
+class SweepPlan:
+    """ Ordered, non overlapping sweep segments (adjacent segments may share their boundary wavelength) """
+
+    def __init__(self, segments: list, allow_overlap: bool = False):
+        """
+        Args:
+            segments (list): SweepSegment objects, or [start, stop, step, speed] lists.
+            allow_overlap (bool): Accepts overlapping segments (see chunked_sweep). point_count then counts
+                the overlapping points twice.
+
+        Raises:
+            Exception: If the plan is empty or if segments overlap.
+        """
+        self.segments = [segment if isinstance(segment, SweepSegment) else SweepSegment(*segment)
+                         for segment in segments]
+        self.segments.sort(key=lambda segment: segment.start_wavelength)
+
+        if len(self.segments) == 0:
+            raise Exception("A sweep plan needs at least one segment.")
+
+        for previous, segment in zip(self.segments, self.segments[1:]):
+            if not allow_overlap and segment.start_wavelength < previous.stop_wavelength - STITCH_TOLERANCE:
+                raise Exception("The segments {} and {} overlap.".format(previous, segment))
+
+    @classmethod
+    def from_list(cls, segments: list):
+        """ Creates the plan from [[start, stop, step, speed], ...], e.g. loaded from a json file """
+        return cls([SweepSegment(*segment) for segment in segments])
+
+    def to_list(self) -> list:
+        return [segment.to_list() for segment in self.segments]
+
+    @property
+    def point_count(self) -> int:
+        """ Number of points of the stitched wavelength axis """
+        count = 0
+        for previous, segment in zip([None] + self.segments, self.segments):
+            count += segment.point_count
+            if previous is not None and abs(segment.start_wavelength - previous.stop_wavelength) <= STITCH_TOLERANCE:
+                count -= 1  # Shared boundary point
+        return count
+
+    @property
+    def sweep_time(self) -> float:
+        """ Total sweep duration of the segments (s), without the TSL return and setting times """
+        return sum(segment.sweep_time for segment in self.segments)
+
+    def __len__(self):
+        return len(self.segments)
+
+
+def stitch_segments(wavelength_tables: list, il_data_arrays: list):
+    """
+    Stitches the results of consecutive segments. Points of a segment that are not above the last wavelength
+    of the previous segments (shared boundary) are dropped.
+
+    Args:
+        wavelength_tables (list): Wavelength table of each segment, ascending.
+        il_data_arrays (list): IL data of each segment, one array per channel.
+
+    Returns:
+        tuple: (wavelength_table, il_data_array) of the whole plan.
+    """
+    wavelength_table = array('d')
+    il_data_array = None
+
+    for segment_wavelengths, segment_il_data in zip(wavelength_tables, il_data_arrays):
+        if il_data_array is None:
+            il_data_array = [array('d') for _ in segment_il_data]
+        if len(segment_il_data) != len(il_data_array):
+            raise Exception("All the segments must be measured on the same channels.")
+
+        first = 0
+        if len(wavelength_table) > 0:
+            while first < len(segment_wavelengths) and \
+                    segment_wavelengths[first] <= wavelength_table[-1] + STITCH_TOLERANCE:
+                first += 1
+
+        wavelength_table.extend(segment_wavelengths[first:])
+        for stitched, il_data in zip(il_data_array, segment_il_data):
+            stitched.extend(il_data[first:])
+
+    return wavelength_table, il_data_array
+
+
+def save_reference_file(reference_data_array: list, filename: str):
+    """
+    Saves a reference data array (see StsProcess._reference_data_array) to a binary numpy file (.npz),
+    much smaller and faster to write and read than the json reference file.
+    """
+    import numpy
+
+    fields = {}
+    for index, ref_object in enumerate(reference_data_array):
+        for key, value in ref_object.items():
+            fields["ref{}_{}".format(index, key)] = numpy.asarray(value)
+
+    with open(filename, "wb") as f:
+        numpy.savez(f, **fields)
+    return None
+
+
+def load_reference_file(filename: str) -> list:
+    """ Loads a reference data array saved by save_reference_file, with array('d') data """
+    import numpy
+
+    reference_data_array = []
+    with numpy.load(filename) as fields:
+        for name in fields.files:
+            index, key = name[3:].split("_", 1)
+            while int(index) >= len(reference_data_array):
+                reference_data_array.append({})
+
+            value = fields[name]
+            if value.ndim == 0:
+                reference_data_array[int(index)][key] = value.item()
+            else:
+                data = array('d')
+                data.frombytes(value.astype(numpy.float64).tobytes())
+                reference_data_array[int(index)][key] = data
+
+    return reference_data_array
+
+
+class SegmentedMeasurement:
+    """
+    Measures a sweep plan with an StsProcess.
+    The StsProcess tables are rebuilt for each segment, and the reference of each segment is added back from its
+    saved reference data (see StsProcess.sts_reference_from_saved_file), so each channel is connected only once.
+    With a reference folder, the references are saved to files and only the reference of the segment being
+    measured is held in memory.
+    """
+
+    def __init__(self, ilsts, plan: SweepPlan, reference_folder: str = None):
+        """
+        Args:
+            ilsts (StsProcess): STS process, with its channels, ranges and data structures already set.
+            plan (SweepPlan): Segments to measure.
+            reference_folder (str, optional): Folder where the reference of each segment and channel is saved
+                (see save_reference_file), instead of being kept in memory.
+        """
+        self.ilsts = ilsts
+        self.plan = plan
+        self.reference_folder = reference_folder
+
+        # Reference of each segment: reference objects (same format as StsProcess._reference_data_array),
+        # or the files they were saved to
+        self.references = [[] for _ in plan.segments]
+
+        self.wavelength_table = None
+        self.il_data_array = None
+        self.il = None
+
+    def apply_segment(self, index: int):
+        """ Sets the TSL, MPM, SPU and the STS process tables for a segment """
+        segment = self.plan.segments[index]
+        self.ilsts._tsl.set_sweep_parameters(segment.start_wavelength,
+                                             segment.stop_wavelength,
+                                             segment.sweep_step,
+                                             segment.sweep_speed)
+        self.ilsts.set_parameters()
+        return None
+
+    def take_references(self):
+        """ Takes the reference of each channel on every segment """
+        self.references = [[] for _ in self.plan.segments]
+
+        for data_struct_item in self.ilsts.ref_data:
+            input("\nConnect Slot{} Ch{}, then press ENTER".format(data_struct_item.SlotNumber,
+                                                                   data_struct_item.ChannelNumber))
+            self.take_channel_references(data_struct_item)
+
+        return None
+
+    def take_channel_references(self, data_struct_item):
+        """
+        Takes the reference of one channel on every segment. The channel must already be connected.
+
+        Args:
+            data_struct_item (Data structure): Reference data structure of the channel (see StsProcess.ref_data).
+        """
+        ilsts = self.ilsts
+
+        for index in range(len(self.plan)):
+            self.apply_segment(index)
+            ilsts._tsl.set_sweep_mode(False)
+            ilsts.set_mpm_range(ilsts.range[0])
+
+            print("Scanning segment {} of {}...".format(index + 1, len(self.plan)))
+            ilsts.sts_sweep_process(0)
+
+            # get_reference_data appends the reference to the StsProcess reference array
+            ilsts._reference_data_array = []
+            ilsts.get_reference_data(data_struct_item)
+            if self.reference_folder is None:
+                # Only the raw data is kept: it is all sts_reference_from_saved_file needs, and the rescaled data are
+                # views of a reference dataset with a row for every channel
+                self.references[index].extend({key: value for key, value in ref_object.items()
+                                               if not key.startswith("rescaled_")}
+                                              for ref_object in ilsts._reference_data_array)
+            else:
+                os.makedirs(self.reference_folder, exist_ok=True)
+                filename = os.path.join(self.reference_folder, "reference_segment{}_mpm{}_slot{}_ch{}.npz".format(
+                    index + 1, data_struct_item.MPMNumber, data_struct_item.SlotNumber, data_struct_item.ChannelNumber))
+                save_reference_file(ilsts._reference_data_array, filename)
+                self.references[index].append(filename)
+                ilsts._reference_data_array = []
+
+            ilsts._tsl.stop_sweep()
+
+        return None
+
+    def get_segment_reference(self, index: int) -> list:
+        """ Returns the reference data array of a segment, loaded from its files if it was saved """
+        reference_data_array = []
+        for reference in self.references[index]:
+            if isinstance(reference, str):
+                reference_data_array.extend(load_reference_file(reference))
+            else:
+                reference_data_array.append(reference)
+        return reference_data_array
+
+    def load_references(self, references: list):
+        """
+        Uses previously taken references.
+
+        Args:
+            references (list): Reference of each segment (see the references attribute).
+        """
+        if len(references) != len(self.plan):
+            raise Exception("The saved references have {} segments, the sweep plan has {}."
+                            .format(len(references), len(self.plan)))
+        self.references = references
+        return None
+
+    def measure_segment(self, index: int):
+        """
+        Measures one segment.
+
+        Returns:
+            tuple: (wavelength_table, il_data_array) of the segment.
+        """
+        ilsts = self.ilsts
+        if len(self.references[index]) == 0:
+            raise Exception("No reference for segment {}, see take_references.".format(index + 1))
+
+        self.apply_segment(index)
+        ilsts._reference_data_array = self.get_segment_reference(index)
+        ilsts.sts_reference_from_saved_file()
+
+        ilsts.sts_measurement()
+        return array('d', ilsts.wavelength_table), list(ilsts.il_data_array)
+
+    def measure(self):
+        """
+        Measures all the segments and stitches their IL data.
+
+        Returns:
+            tuple: (wavelength_table, il_data_array), also kept in the wavelength_table and il_data_array attributes.
+        """
+        wavelength_tables = []
+        il_data_arrays = []
+
+        for index in range(len(self.plan)):
+            wavelength_table, il_data_array = self.measure_segment(index)
+            wavelength_tables.append(wavelength_table)
+            il_data_arrays.append(il_data_array)
+
+        self.wavelength_table, self.il_data_array = stitch_segments(wavelength_tables, il_data_arrays)
+        self.il = list(self.il_data_array[0])
+
+        return self.wavelength_table, self.il_data_array
+
+    def get_wavelength_axis(self):
+        """ Returns the stitched wavelength axis (sts_dataset.WavelengthAxis, not uniform) """
+        from santec.sts_dataset import WavelengthAxis
+
+        return WavelengthAxis.from_wavelengths(self.wavelength_table)
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+
+"""
+Created on Thu Oct 22 11:48:33 2026
+
+@author: chentir
+@organization: santec holdings corp.
+
+Stand-ins for instruments, to try out the santec package without the hardware.
+"""
+
+# Basic imports
+import re
+import time
+import asyncio
+import threading
+
+from santec.switch_scheduler import SwitchDriver
+
+
+class IdnStandInServer:
+    """
+    Local TCP server that answers *IDN? like a SANTEC LAN instrument.
+
+    Example:
+        with IdnStandInServer("SANTEC,TSL-570,12345678,0001.0001") as server:
+            discover_lan_instruments([server.host], server.port)
+    """
+
+    def __init__(self, idn: str, host: str = "127.0.0.1", port: int = 0, terminator: bytes = b"\r"):
+        """
+        Args:
+            idn (str): Answer to *IDN?.
+            host (str): Listening address.
+            port (int): Listening port. 0 picks a free port (see the port attribute once started).
+            terminator (bytes): Answer terminator. The TSL answers with CR over LAN.
+        """
+        self.idn = idn
+        self.host = host
+        self.port = port
+        self.terminator = terminator
+        self.received = []
+
+        self.__loop = None
+        self.__server = None
+        self.__thread = None
+        self.__started = threading.Event()
+
+    async def __handle(self, reader, writer):
+        buffer = b""
+        try:
+            while True:
+                chunk = await reader.read(256)
+                if not chunk:
+                    break
+                buffer += chunk.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+                while b"\n" in buffer:
+                    command, buffer = buffer.split(b"\n", 1)
+                    command = command.decode("ascii").strip()
+                    self.received.append(command)
+                    if command.upper() == "*IDN?":
+                        writer.write(self.idn.encode("ascii") + self.terminator)
+                        await writer.drain()
+        finally:
+            writer.close()
+
+    def __run(self):
+        self.__loop = asyncio.new_event_loop()
+        self.__server = self.__loop.run_until_complete(asyncio.start_server(self.__handle, self.host, self.port))
+        self.port = self.__server.sockets[0].getsockname()[1]
+        self.__started.set()
+        self.__loop.run_forever()
+
+        self.__server.close()
+        self.__loop.run_until_complete(self.__server.wait_closed())
+        self.__loop.close()
+
+    def start(self):
+        """ Starts the server in a background thread """
+        self.__thread = threading.Thread(target=self.__run, name="IdnStandInServer", daemon=True)
+        self.__thread.start()
+        self.__started.wait()
+        return self
+
+    def stop(self):
+        """ Stops the server """
+        self.__loop.call_soon_threadsafe(self.__loop.stop)
+        self.__thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+class SimulatedMpmResource:
+    """
+    Stand-in for the pyvisa resource of an MPM.
+    Answers LOGG? <module>,<port> with an IEEE 488.2 binary block of little-endian float32, like the MPM.
+    """
+
+    def __init__(self, resource_name: str, log_data: dict = None):
+        """
+        Args:
+            resource_name (str): VISA resource name.
+            log_data (dict): (module, port) -> logging data (dBm) returned by LOGG?.
+        """
+        self.resource_name = resource_name
+        self.log_data = log_data if log_data is not None else {}
+        self.chunk_size = 20 * 1024
+        self.timeout = 2000
+        self.read_termination = None
+        self.write_termination = None
+        self.written = []
+
+        self.__pending = b""
+
+    def write(self, command: str):
+        self.written.append(command)
+        match = re.fullmatch(r"LOGG\?\s*(\d+)\s*,\s*(\d+)", command.strip().upper())
+        if match is not None:
+            import numpy
+
+            values = self.log_data.get((int(match.group(1)), int(match.group(2))), [])
+            payload = numpy.asarray(values, dtype='<f4').tobytes()
+            length = str(len(payload))
+            self.__pending = b"#" + str(len(length)).encode("ascii") + length.encode("ascii") + payload
+        return len(command)
+
+    def read_raw(self) -> bytes:
+        data, self.__pending = self.__pending, b""
+        return data
+
+    def read_binary_values(self, datatype='f', is_big_endian=False, container=list, header_fmt='ieee',
+                           expect_termination=True):
+        """ Parses the pending binary block, with the same arguments as pyvisa """
+        import numpy
+
+        block = self.read_raw()
+        if header_fmt != 'ieee' or not block.startswith(b"#"):
+            raise ValueError("No IEEE binary block to read")
+
+        digits = int(block[1:2])
+        length = int(block[2:2 + digits])
+        payload = block[2 + digits:2 + digits + length]
+
+        dtype = numpy.dtype(datatype).newbyteorder('>' if is_big_endian else '<')
+        values = numpy.frombuffer(payload, dtype=dtype)
+        return values if container is numpy.ndarray else container(values)
+
+    def close(self):
+        pass
+
+
+class SimulatedResourceManager:
+    """ Stand-in for the pyvisa resource manager, serving simulated resources """
+
+    def __init__(self, resources: dict):
+        """
+        Args:
+            resources (dict): resource name -> simulated resource (ex: SimulatedMpmResource).
+        """
+        self.resources = resources
+
+    def list_resources(self):
+        return tuple(self.resources)
+
+    def open_resource(self, resource_name: str, **kwargs):
+        return self.resources[resource_name]
+
+
+class SimulatedSwitch(SwitchDriver):
+    """ Stand-in for an optical switch, counting its moves """
+
+    def __init__(self, position_count: int, position: int = None, switching_time: float = 0.0):
+        """
+        Args:
+            position_count (int): Number of positions (1 to position_count).
+            position (int): Initial position, None if unknown.
+            switching_time (float): Duration of a move (s).
+        """
+        super().__init__()
+        self.position_count = position_count
+        self.position = position
+        self.switching_time = switching_time
+        self.moves = []
+
+    def set_position(self, position: int):
+        if not 1 <= position <= self.position_count:
+            raise Exception("Switch position {} out of range (1~{}).".format(position, self.position_count))
+        if self.switching_time > 0:
+            time.sleep(self.switching_time)
+        self.moves.append((self.position, position))
+        self.position = position
+        return None
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+
+"""
+Created on Mon Oct 19 10:12:40 2026
+
+@author: chentir
+@organization: santec holdings corp.
+"""
+
+# Basic imports
+import numpy
+
+
+class WavelengthAxis:
+    """
+    Wavelength axis shared by all the channels and ranges of a dataset.
+    A uniform axis is only stored as start / step / count.
+    """
+
+    def __init__(self, start: float, step: float, count: int, wavelengths=None):
+        self.start = float(start)
+        self.step = float(step)
+        self.count = int(count)
+
+        # Only kept when the axis is not uniform
+        self.__wavelengths = None
+        if wavelengths is not None:
+            self.__wavelengths = numpy.ascontiguousarray(wavelengths, dtype=numpy.float64)
+            self.count = len(self.__wavelengths)
+
+    @classmethod
+    def from_wavelengths(cls, wavelengths, tolerance: float = 1e-7):
+        """
+        Creates the axis from a wavelength table.
+
+        Args:
+            wavelengths (list): Wavelength table (nm).
+            tolerance (float): Largest deviation (nm) from a uniform grid for the axis to be stored as start / step.
+
+        Returns:
+            WavelengthAxis
+        """
+        wavelengths = numpy.asarray(wavelengths, dtype=numpy.float64)
+        count = len(wavelengths)
+        if count == 0:
+            raise Exception("The wavelength table cannot be empty.")
+
+        start = wavelengths[0]
+        step = (wavelengths[-1] - start) / (count - 1) if count > 1 else 0.0
+        uniform_grid = start + step * numpy.arange(count)
+
+        if numpy.max(numpy.abs(wavelengths - uniform_grid)) <= tolerance:
+            return cls(start, step, count)
+
+        return cls(start, step, count, wavelengths)
+
+    @property
+    def is_uniform(self) -> bool:
+        """ True if the axis is stored as start / step """
+        return self.__wavelengths is None
+
+    @property
+    def nbytes(self) -> int:
+        """ Memory used by the wavelength values (bytes) """
+        return 0 if self.__wavelengths is None else self.__wavelengths.nbytes
+
+    def to_array(self) -> numpy.ndarray:
+        """ Returns the wavelengths (nm) as an array """
+        if self.__wavelengths is not None:
+            return self.__wavelengths
+        return self.start + self.step * numpy.arange(self.count)
+
+    def to_list(self) -> list:
+        """ Returns the wavelengths (nm) as a list """
+        return self.to_array().tolist()
+
+    def __len__(self):
+        return self.count
+
+
+class StsDataset:
+    """
+    Reference or DUT data of all the channels and ranges of a scan, on one shared wavelength axis.
+    The power and monitor data are contiguous arrays of shape (channels, ranges, wavelengths),
+    so that power[channel_index, range_index] is the trace of one channel in one range.
+    The reference is stored in range 0. The traces that were not measured are NaN.
+    """
+
+    def __init__(self, axis: WavelengthAxis, channels: list, ranges: list, dtype=numpy.float64):
+        """
+        Args:
+            axis (WavelengthAxis): Wavelength axis shared by all the traces.
+            channels (list): (MPM number, slot number, channel number) of each channel.
+            ranges (list): MPM range of each range.
+            dtype: numpy.float64, or numpy.float32 to halve the memory.
+        """
+        self.axis = axis
+        self.channels = [tuple(int(i) for i in channel) for channel in channels]
+        self.ranges = [int(i) for i in ranges]
+        self.dtype = numpy.dtype(dtype)
+
+        shape = (len(self.channels), len(self.ranges), len(axis))
+        self.power = numpy.full(shape, numpy.nan, dtype=self.dtype)
+        self.monitor = numpy.full(shape, numpy.nan, dtype=self.dtype)
+
+        self.__channel_index = {channel: i for i, channel in enumerate(self.channels)}
+        self.__range_index = {mpm_range: i for i, mpm_range in enumerate(self.ranges)}
+
+    @property
+    def wavelengths(self) -> numpy.ndarray:
+        """ The shared wavelength axis (nm) """
+        return self.axis.to_array()
+
+    @property
+    def nbytes(self) -> int:
+        """ Memory used by the dataset arrays (bytes) """
+        return self.power.nbytes + self.monitor.nbytes + self.axis.nbytes
+
+    def index(self, mpm_number: int, slot_number: int, channel_number: int, range_number: int):
+        """ Returns the (channel index, range index) of a trace """
+        try:
+            return (self.__channel_index[(int(mpm_number), int(slot_number), int(channel_number))],
+                    self.__range_index[int(range_number)])
+        except KeyError:
+            raise Exception("MPM{} Slot{} Ch{} R{} is not part of the dataset.".format(
+                mpm_number, slot_number, channel_number, range_number))
+
+    def set_trace(self, mpm_number, slot_number, channel_number, range_number, power, monitor):
+        """ Stores the power and monitor data of one channel in one range """
+        if len(power) != len(self.axis) or len(monitor) != len(self.axis):
+            raise Exception(
+                "The length of the wavelength axis is {}, the length of the power array is {}, and the length of "
+                "the monitor array is {}. They must all be the same length.".format(
+                    len(self.axis), len(power), len(monitor)))
+
+        i, j = self.index(mpm_number, slot_number, channel_number, range_number)
+        self.power[i, j] = power
+        self.monitor[i, j] = monitor
+        return None
+
+    def get_power(self, mpm_number, slot_number, channel_number, range_number) -> numpy.ndarray:
+        """ Returns the power trace of one channel in one range """
+        return self.power[self.index(mpm_number, slot_number, channel_number, range_number)]
+
+    def get_monitor(self, mpm_number, slot_number, channel_number, range_number) -> numpy.ndarray:
+        """ Returns the monitor trace of one channel in one range """
+        return self.monitor[self.index(mpm_number, slot_number, channel_number, range_number)]
+
+    def to_data_array(self, power_key: str, monitor_key: str) -> list:
+        """
+        Returns the traces as an array of reference or dut objects (see from_data_array), range by range.
+        The objects are views of the dataset: their wavelengths are the shared wavelength array, and their power and
+        monitor data are rows of the dataset arrays, not copies. The traces of range 0 have no RangeNumber.
+
+        Args:
+            power_key (str): "rescaled_reference_power" or "rescaled_dut_power".
+            monitor_key (str): "rescaled_monitor" or "rescaled_dut_monitor".
+        """
+        wavelengths = self.wavelengths
+        data_array = []
+        for j, range_number in enumerate(self.ranges):
+            for i, (mpm_number, slot_number, channel_number) in enumerate(self.channels):
+                item = {"MPMNumber": mpm_number, "SlotNumber": slot_number, "ChannelNumber": channel_number}
+                if range_number != 0:
+                    item["RangeNumber"] = range_number
+                item["rescaled_wavelength"] = wavelengths
+                item[monitor_key] = self.monitor[i, j]
+                item[power_key] = self.power[i, j]
+                data_array.append(item)
+
+        return data_array
+
+    @classmethod
+    def from_data_array(cls, data_array: list, power_key: str, monitor_key: str, dtype=numpy.float64):
+        """
+        Converts an array of reference or dut objects (see StsProcess) to a dataset.
+        Reference objects have no RangeNumber, and are stored in range 0.
+
+        Args:
+            data_array (list): StsProcess._reference_data_array or StsProcess._dut_data_array.
+            power_key (str): "rescaled_reference_power" or "rescaled_dut_power".
+            monitor_key (str): "rescaled_monitor" or "rescaled_dut_monitor".
+            dtype: numpy.float64 or numpy.float32.
+
+        Returns:
+            StsDataset
+        """
+        if data_array is None or len(data_array) == 0:
+            raise Exception("The data array cannot be null or empty.")
+
+        channels = []
+        ranges = []
+        for item in data_array:
+            channel = (item["MPMNumber"], item["SlotNumber"], item["ChannelNumber"])
+            if channel not in channels:
+                channels.append(channel)
+            if item.get("RangeNumber", 0) not in ranges:
+                ranges.append(item.get("RangeNumber", 0))
+
+        # All the wavelengths are all the same for any slot and channel. So just get the first one.
+        dataset = cls(WavelengthAxis.from_wavelengths(data_array[0]["rescaled_wavelength"]), channels, ranges, dtype)
+
+        for item in data_array:
+            dataset.set_trace(item["MPMNumber"], item["SlotNumber"], item["ChannelNumber"], item.get("RangeNumber", 0),
+                              item[power_key], item[monitor_key])
+
+        return dataset
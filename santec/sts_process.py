@@ -8,30 +8,59 @@ Created on Fri Jan 21 17:21:13 2022
 """
 
 # Basic imports
-import os
-import clr  # python for .net
 import re
+import time
 from array import array
+from collections import deque
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 
 # Importing instrument classes and sts error strings
 from santec.daq_device_class import SpuDevice
 from santec.error_handing_class import sts_process_error_strings
 from santec.mpm_instrument_class import MpmDevice
 from santec.tsl_instrument_class import TslDevice
+from santec.dll_reference import add_dll_reference
+from santec.instrument_state import InstrumentState
+from santec.sweep_timing import PhaseTimings, logger as timing_logger
+from santec.two_way_sweep import is_two_way_compatible, normalize_reverse_leg, reverse_trigger_mapping
 
+PATH = 'STSProcess'
 
-# Adding Instrument DLL to the reference
-ROOT = str(os.path.dirname(__file__)) + '\\DLL\\'
-# print(ROOT)    """ <-- uncomment in to check if the root was selected properly """
+# Number of times a failed range sweep is taken again before the measurement fails (see sts_measurement)
+SWEEP_RETRIES = 2
 
-PATH = 'STSProcess'
-# Add in santec.STSProcess.DLL
-ans = clr.AddReference(ROOT + PATH)
-# print(ans) #<-- comment in to check if the DLL was added properly
+# Valid power window (top, floor) of each range, in dBm, for each MPM module type (nominal values, see
+# StsProcess.range_windows). The adaptive ranges need the windows of the module type of every selected channel.
+MPM_211_RANGE_WINDOWS = {1: (10.0, -30.0),
+                         2: (0.0, -40.0),
+                         3: (-10.0, -50.0),
+                         4: (-20.0, -60.0),
+                         5: (-30.0, -80.0)}
+RANGE_WINDOWS = {"MPM-211": MPM_211_RANGE_WINDOWS,
+                 "MPM-212": MPM_211_RANGE_WINDOWS}
+RANGE_FLOOR_MARGIN = 3.0    # dB, points closer than this to the range floor are not trusted
+
+# Classes of the STSProcess DLL, imported on first use (see load_dll)
+ILSTS = None
+STSDataStruct = None
+STSDataStructForMerge = None
+RescalingMode = None
+Module_Type = None
+
+
+def load_dll():
+    """ Adds STSProcess DLL to the references and imports its classes, on first use """
+    global ILSTS, STSDataStruct, STSDataStructForMerge, RescalingMode, Module_Type
+
+    if ILSTS is None:
+        # Add in santec.STSProcess.DLL
+        add_dll_reference(PATH)
+
+        # Importing classes from STSProcess DLL (namespace of STSProcess DLL)
+        from Santec.STSProcess import ILSTS, STSDataStruct, STSDataStructForMerge, RescalingMode, Module_Type
 
-# Importing classes from STSProcess DLL
-from Santec.STSProcess import *  # namespace of  STSProcess DLL
+    return None
 
 
 class StsProcess:
@@ -44,6 +73,13 @@ class StsProcess:
     _spu: SpuDevice
 
     def __init__(self, _tsl, _mpm, _spu):
+        """
+        Args:
+            _tsl (TslDevice): TSL.
+            _mpm (MpmDevice): MPM, or list of the MPMs on the TSL trigger chain. The MPM number of a channel is the
+                index of its MPM in the list.
+            _spu (SpuDevice): SPU.
+        """
         self.log_data = None
         self.il = None
         self.il_data = None
@@ -53,21 +89,59 @@ class StsProcess:
         self.ref_data = None
         self.ref_monitor = None
         self.merge_data = None
+        self.merge_module_type = None
         self.dut_data = None
         self.dut_monitor = None
         self.selected_ranges = None
         self.all_channels = None
+        self.all_mpm_channels = None
         self.selected_chans = None
         self._tsl = _tsl
-        self._mpm = _mpm
+        self._mpms = list(_mpm) if isinstance(_mpm, (list, tuple)) else [_mpm]
+        self._mpm = self._mpms[0]  # Ranges and averaging time
         self._spu = _spu
+        load_dll()
         self._ilsts = ILSTS()
-        self._reference_data_array = []
-        self._dut_data_array = []
+        # Rescaled reference data (StsDataset, see get_reference_data) and raw reference data of each channel,
+        # and rescaled DUT data of each scan (StsDataset, see get_dut_data)
+        self.dataset_dtype = "float64"  # "float32" halves the memory of the datasets
+        self.reference_dataset = None
+        self._reference_raw_data = []
+        self._dut_datasets = []
+        self._dut_stream = None
+        # Last applied STS process settings, to skip rebuilding identical wavelength tables
+        self._state = InstrumentState()
+        # Logging progress callback (logging_point, expected_points) and cancellation event of the sweeps,
+        # see MpmDevice.wait_log_completion
+        self.progress_callback = None
+        self.cancel_event = None
+        # Timeouts of the sweep phases (see set_parameters) and durations of the phases of the last sweep
+        self.timing = None
+        self.phase_timings = PhaseTimings()
+        # Retries of the failed range sweeps, and the failures of the last measurement
+        self.max_sweep_retries = SWEEP_RETRIES
+        self.sweep_failures = []
+        # Raw data of each range sweep of the measurement in progress, to add it again after a recovery
+        self._meas_raw_data = {}
+        # Two-way sweep: the return leg of a range sweep measures the next range (see enable_two_way_sweep)
+        self.two_way_sweep = False
+        self.turnaround_delay = 1.0
+        # Return leg trigger of each forward leg wavelength, with the sweep parameters it was made for
+        self._reverse_mapping = None
+        # End of the turnaround of the forward leg left running for the next range sweep (perf_counter time)
+        self._return_leg_deadline = None
+        # Serpentine range order: a DUT measurement starts in the range where the previous one ended
+        self.serpentine_ranges = True
+        # Adaptive ranges: the remaining ranges are skipped once every point was measured in a valid range window
+        self.adaptive_ranges = False
+        self.range_windows = {module_type: dict(windows) for module_type, windows in RANGE_WINDOWS.items()}
+        self.range_floor_margin = RANGE_FLOOR_MARGIN
+        self.skipped_ranges = []
 
     def set_parameters(self):
         """
         Sets parameters for STS process.
+        The instruments and the STS process are only set again when their parameters changed.
         Args:
             start wave (float): Input the start wavelength value.
             stop_wavelength (float): Input the stop wavelength value.
@@ -87,10 +161,11 @@ class StsProcess:
         """
 
         # Logging parameters for MPM
-        self._mpm.set_logging_parameters(self._tsl.start_wavelength,
-                                         self._tsl.stop_wavelength,
-                                         self._tsl.sweep_step,
-                                         self._tsl.sweep_speed)
+        for mpm in self._mpms:
+            mpm.set_logging_parameters(self._tsl.start_wavelength,
+                                       self._tsl.stop_wavelength,
+                                       self._tsl.sweep_step,
+                                       self._tsl.sweep_speed)
 
         # Logging parameter for SPU(DAQ)
         self._spu.set_logging_parameters(self._tsl.start_wavelength,
@@ -101,6 +176,21 @@ class StsProcess:
         # pass MPM averaging time to SPU Class
         self._spu.AveragingTime = self._mpm.get_averaging_time()
 
+        # Timeouts of the sweep phases
+        self.timing = self._tsl.get_sweep_timing(self._spu.AveragingTime)
+        timing_logger.info("Sweep timeouts (ms): %s", self.timing.timeouts())
+
+        # Nothing to do if the tables were already made for the same sweep. This keeps the reference data as well.
+        sts_parameters = (self._tsl.start_wavelength,
+                          self._tsl.stop_wavelength,
+                          self._tsl.sweep_step,
+                          self._tsl.actual_step,
+                          self._spu.AveragingTime)
+        if self._state.is_applied("sts_parameters", sts_parameters):
+            return sts_process_error_strings(0)
+
+        self._state.invalidate("sts_parameters")
+
         # -----STS Process setting Class
         # Clear measurement data
         sts_error = self._ilsts.Clear_Measdata()
@@ -130,12 +220,13 @@ class StsProcess:
 
         # Set Rescaling mode for STSProcess class
         sts_error = self._ilsts.Set_Rescaling_Setting(RescalingMode.Freerun_SPU,
-                                                      self._mpm.get_averaging_time(),
+                                                      self._spu.AveragingTime,
                                                       True)
 
         if sts_error != 0:
             raise Exception(str(sts_error) + ": " + sts_process_error_strings(sts_error))
 
+        self._state.set_applied("sts_parameters", sts_parameters)
         return sts_process_error_strings(sts_error)
 
     def set_selected_channels(self, previous_param_data):
@@ -151,6 +242,8 @@ class StsProcess:
         """
         if previous_param_data is not None:
             self.selected_chans = previous_param_data["selected_chans"]  # an array, like [1,3,5]
+            for this_mod_channel in self.selected_chans:
+                self.check_channel(this_mod_channel)
             allModChans = ""
             for this_mod_channel in self.selected_chans:
                 allModChans += ",".join(
@@ -162,13 +255,16 @@ class StsProcess:
         self.selected_chans = []
         # Array of arrays: array 0  displays the connected modules
         # The following arrays contain ints of available channels of each module
-        self.all_channels = self._mpm.get_mods_chans()
+        self.all_mpm_channels = [mpm.get_mods_chans() for mpm in self._mpms]
+        self.all_channels = self.all_mpm_channels[0]
 
         print("\nAvailable modules/channels:")
-        for i in range(len(self.all_channels)):
-            if len(self.all_channels[i]) == 0:
-                continue
-            print("\r" + "Module {}: Channels {}".format(i, self.all_channels[i]))
+        for mpm_number, all_channels in enumerate(self.all_mpm_channels):
+            for i in range(len(all_channels)):
+                if len(all_channels[i]) == 0:
+                    continue
+                mpm_name = "MPM {} ".format(mpm_number) if len(self._mpms) > 1 else ""
+                print("\r" + mpm_name + "Module {}: Channels {}".format(i, all_channels[i]))
 
         mpm_choices = {'1': self.set_all_chans,
                        '2': self.set_even_chans,
@@ -187,45 +283,104 @@ class StsProcess:
         mpm_choices[user_selection]()
         return None
 
+    def get_available_channels(self) -> list:
+        """
+        Returns the channels of all the MPMs: [module, channel], or [mpm, module, channel] with several MPMs.
+        """
+        available_channels = []
+        for mpm_number, all_channels in enumerate(self.all_mpm_channels):
+            for i in range(len(all_channels)):
+                for j in all_channels[i]:
+                    available_channels.append([i, j] if len(self._mpms) == 1 else [mpm_number, i, j])
+        return available_channels
+
     def set_all_chans(self):
         """ Selects all modules and all channels that are connected to MPM """
-        for i in range(len(self.all_channels)):
-            for j in self.all_channels[i]:
-                self.selected_chans.append([i, j])
+        for ch in self.get_available_channels():
+            self.selected_chans.append(ch)
         return None
 
     def set_even_chans(self):
         """ Selects only even channels on the MPM """
-        for i in range(len(self.all_channels)):
-            for j in self.all_channels[i]:
-                if j % 2 == 0:
-                    self.selected_chans.append([i, j])
+        for ch in self.get_available_channels():
+            if ch[-1] % 2 == 0:
+                self.selected_chans.append(ch)
         return None
 
     def set_odd_chans(self):
         """ Selects only odd channels on the MPM """
-        for i in range(len(self.all_channels)):
-            for j in self.all_channels[i]:
-                if j % 2 != 0:
-                    self.selected_chans.append([i, j])
+        for ch in self.get_available_channels():
+            if ch[-1] % 2 != 0:
+                self.selected_chans.append(ch)
         return None
 
     def set_special(self):
         """ Manually enter/select the channels to be measured """
-        selection = input("Input (module,channel) to be tested [ex: (0,1); (1,1)]  ")
+        if len(self._mpms) > 1:
+            selection = input("Input (mpm,module,channel) to be tested [ex: (0,0,1); (1,0,1)]  ")
+            group = 3
+        else:
+            selection = input("Input (module,channel) to be tested [ex: (0,1); (1,1)]  ")
+            group = 2
         selection = re.findall(r"[\w']+", selection)
+        if len(selection) == 0 or len(selection) % group != 0:
+            raise Exception("Invalid channel selection: {} values, expected groups of {}.".format(len(selection), group))
 
-        i = 0
-        while i <= len(selection) - 1:
-            self.selected_chans.append([selection[i], selection[i + 1]])
-            i += 2
+        for i in range(0, len(selection), group):
+            self.check_channel(selection[i:i + group])
+            self.selected_chans.append(selection[i:i + group])
+        return None
+
+    def check_channel(self, ch):
+        """
+        Checks a selected channel against the connected MPMs, and against their modules and channels once they
+        were read (see set_selected_channels).
+
+        Args:
+            ch (list): [module, channel] (MPM 0), or [mpm, module, channel].
+
+        Raises:
+            Exception: If the channel is malformed, or if its MPM, module or channel is not connected.
+        """
+        if len(ch) not in (2, 3):
+            raise Exception("Invalid channel {}: expected (module,channel) or (mpm,module,channel).".format(ch))
+        try:
+            mpm_number, slot_number, channel_number = self.split_channel(ch)
+        except ValueError:
+            raise Exception("Invalid channel {}: the values must be numbers.".format(ch))
+
+        if not 0 <= mpm_number < len(self._mpms):
+            raise Exception("Invalid channel {}: MPM {} is not connected ({} MPM(s)).".format(
+                ch, mpm_number, len(self._mpms)))
+
+        if self.all_mpm_channels is not None:
+            all_channels = self.all_mpm_channels[mpm_number]
+            if not 0 <= slot_number < len(all_channels) or channel_number not in all_channels[slot_number]:
+                raise Exception("Invalid channel {}: Module {} Channel {} is not available.".format(
+                    ch, slot_number, channel_number))
         return None
 
     def cancel(self):
         self._tsl.Disconnect()
-        self._mpm.Disconnect()
+        for mpm in self._mpms:
+            mpm.Disconnect()
         self._spu.Disconnect()
 
+    @staticmethod
+    def split_channel(ch) -> tuple:
+        """
+        Splits a selected channel.
+
+        Args:
+            ch (list): [module, channel] (MPM 0), or [mpm, module, channel].
+
+        Returns:
+            tuple: (mpm number, slot number, channel number).
+        """
+        if len(ch) == 3:
+            return int(ch[0]), int(ch[1]), int(ch[2])
+        return 0, int(ch[0]), int(ch[1])
+
     def set_selected_ranges(self, previous_param_data):
         """ Sets the optical dynamic range of the MPM """
 
@@ -256,6 +411,12 @@ class StsProcess:
     def set_data_struct(self):
         """ Create the data structures, which includes the potentially savable reference data """
 
+        # The DLL data no longer matches the data structures
+        self._state.invalidate()
+
+        # Module type of the range data merge
+        self.merge_module_type = self.get_merge_module_type()
+
         # List data clear
         self.dut_monitor = []
         self.dut_data = []
@@ -269,10 +430,11 @@ class StsProcess:
         # Configure STSDatastruct for each measurement
         for m_range in self.selected_ranges:
             for ch in self.selected_chans:
+                mpm_number, slot_number, channel_number = self.split_channel(ch)
                 data_st = STSDataStruct()
-                data_st.MPMNumber = 0
-                data_st.SlotNumber = int(ch[0])  # slot number
-                data_st.ChannelNumber = int(ch[1])  # channel number
+                data_st.MPMNumber = mpm_number  # index of the MPM in the MPM list
+                data_st.SlotNumber = slot_number  # slot number
+                data_st.ChannelNumber = channel_number  # channel number
                 data_st.RangeNumber = m_range  # array of MPM ranges
                 data_st.SweepCount = counter
                 data_st.SOP = 0
@@ -295,22 +457,50 @@ class StsProcess:
 
         # Configure STSDataStruct for merge
         for ch in self.selected_chans:
+            mpm_number, slot_number, channel_number = self.split_channel(ch)
             merge_sts = STSDataStructForMerge()
-            merge_sts.MPMnumber = 0
-            merge_sts.SlotNumber = int(ch[0])  # slot number
-            merge_sts.ChannelNumber = int(ch[1])  # channel number
+            merge_sts.MPMnumber = mpm_number  # index of the MPM in the MPM list
+            merge_sts.SlotNumber = slot_number  # slot number
+            merge_sts.ChannelNumber = channel_number  # channel number
             merge_sts.SOP = 0
 
             self.merge_data.append(merge_sts)
 
+    def get_merge_module_type(self):
+        """
+        Returns the Module_Type of the range data merge, from the modules of the selected channels.
+
+        Raises:
+            Exception: If the selected channels are on modules of different types, or on a module type the STS
+                process cannot merge.
+        """
+        module_types = set()
+        for ch in self.selected_chans:
+            mpm_number, slot_number, channel_number = self.split_channel(ch)
+            module_types.add(self._mpms[mpm_number].get_module_type(slot_number))
+
+        if len(module_types) != 1:
+            raise Exception("The selected channels are on modules of different types ({}): their range data cannot "
+                            "be merged in one measurement.".format(", ".join(sorted(module_types))))
+
+        module_type = module_types.pop()
+        merge_module_type = getattr(Module_Type, module_type.replace("-", "_"), None)
+        if merge_module_type is None:
+            raise Exception("The range data of the {} modules cannot be merged.".format(module_type))
+        return merge_module_type
+
     # STS Reference handling
     def sts_reference(self):
         """ Take reference data for each module/channel selected by the user """
+        # The reference is always taken on the forward leg
+        self._tsl.set_sweep_mode(False)
+
         for i in self.ref_data:
-            input("\nConnect Slot{} Ch{}, then press ENTER".format(i.SlotNumber, i.ChannelNumber))
+            mpm_name = "MPM{} ".format(i.MPMNumber) if len(self._mpms) > 1 else ""
+            input("\nConnect {}Slot{} Ch{}, then press ENTER".format(mpm_name, i.SlotNumber, i.ChannelNumber))
 
             # Set MPM range for 1st setting renge
-            self._mpm.set_range(self.range[0])
+            self.set_mpm_range(self.range[0])
 
             # TSL Wavelength set to use Sweep Start Command
             # self.__tsl.start_sweep() #redundant, also exists within sts_sweep_process
@@ -369,23 +559,57 @@ class StsProcess:
                 raise Exception(str(errorcode) + ": " + sts_process_error_strings(errorcode))
 
     # STS Measurement handling
-    def sts_measurement(self):
-        """ DUT measurement """
-        # Range loop
-        sweep_count = 1
-        for mpm_range in self.range:
-            # set MPM Range
-            error_string = self._mpm.set_range(mpm_range)
-            # print(error_string)
+    def sts_measurement(self, more_scans: bool = False):
+        """
+        DUT measurement.
+        A failed range sweep is recovered (see recover_sweep) and taken again, up to max_sweep_retries times.
+        The failures are recorded in sweep_failures.
+        With adaptive_ranges, the remaining ranges are skipped once every point of every channel was measured within
+        the valid window of a range (see range_windows, the windows of each range for each module type).
+        The skipped ranges are recorded in skipped_ranges, and have no DUT data (see get_dut_data).
 
-            # sweep handling
-            self.sts_sweep_process(sweep_count)
+        Args:
+            more_scans (bool): True when the next DUT measurement follows at once (repeated scans). With the two-way
+                sweep, a measurement ending on a forward leg then leaves its return leg to the first range of the
+                next measurement, if it starts within the turnaround delay.
 
-            # Get DUT data
-            error_string = self.sts_get_meas_data(sweep_count)
-            # print(error_string)
+        Raises:
+            RuntimeError: If a range sweep still fails after the retries, or if the measurement was cancelled.
+            Exception: With adaptive_ranges, if a selected channel is on a module type without range windows.
+        """
+        if self.adaptive_ranges:
+            self.check_range_windows()
+
+        self.sweep_failures = []
+        self.skipped_ranges = []
+        self._meas_raw_data = {}
+
+        # Return leg left running by the previous measurement
+        reverse_leg = self._return_leg_deadline is not None
+        if reverse_leg and (not self.two_way_sweep or self.turnaround_delay != self._tsl.turnaround_delay or
+                            time.perf_counter() > self._return_leg_deadline):
+            self._tsl.stop_sweep(False)
+            self._tsl.wait_for_sweep_status(waiting_time=self.timing.standby_timeout, sweep_status=1)  # Standby
+            self._return_leg_deadline = None
+            reverse_leg = False
+        self._tsl.set_sweep_mode(self.two_way_sweep, self.turnaround_delay)
 
-            sweep_count += 1
+        # Range loop
+        range_order = self.get_range_order()
+        power_units = [mpm.get_power_unit() for mpm in self._mpms] if self.adaptive_ranges else None
+        covered = None
+        for index, (sweep_count, mpm_range) in enumerate(range_order):
+            reverse_leg = self.__measure_range(mpm_range, sweep_count, reverse_leg,
+                                               index < len(range_order) - 1 or more_scans)
+
+            if self.adaptive_ranges and index < len(range_order) - 1:
+                # Coverage of each point of each channel
+                valid = self.__valid_points(sweep_count, mpm_range, power_units)
+                covered = valid if covered is None else covered | valid
+                if covered.all():
+                    self.__skip_ranges(range_order[index + 1:], sweep_count, reverse_leg)
+                    reverse_leg = False
+                    break
 
         # Rescaling
         errorcode = self._ilsts.Cal_MeasData_Rescaling()
@@ -393,12 +617,14 @@ class StsProcess:
             raise Exception(str(errorcode) + ": " + sts_process_error_strings(errorcode))
 
         # Range data merge
-        errorcode = self._ilsts.Cal_IL_Merge(Module_Type.MPM_211)
+        errorcode = self._ilsts.Cal_IL_Merge(self.merge_module_type)
         if errorcode != 0:
             raise Exception(str(errorcode) + ": " + sts_process_error_strings(errorcode))
+        self._meas_raw_data = {}
 
-        # TSL stop
-        self._tsl.stop_sweep()
+        # TSL stop, unless its return leg is left to the next measurement
+        if not reverse_leg:
+            self._tsl.stop_sweep()
 
         #####################################################################
 
@@ -430,41 +656,323 @@ class StsProcess:
 
         return None
 
+    def set_mpm_range(self, mpm_range):
+        """ Sets the dynamic range of all the MPMs (see MpmDevice.set_range) """
+        for mpm in self._mpms:
+            mpm.set_range(mpm_range)
+        return None
+
+    def get_range_order(self) -> list:
+        """
+        Order of the range sweeps of the next DUT measurement.
+        With serpentine_ranges, the ranges are swept in reverse order when the MPM is already in the last range,
+        e.g. 1, 3, 5 for a DUT then 5, 3, 1 for the next one. This saves one range switch and settling per DUT.
+
+        Returns:
+            list: (sweep_count, range) of each range sweep, in measurement order.
+        """
+        range_order = [(sweep_count, mpm_range) for sweep_count, mpm_range in enumerate(self.range, start=1)]
+        if self.serpentine_ranges and len(self.range) > 1 and \
+                all(mpm.get_current_range() == self.range[-1] for mpm in self._mpms):
+            range_order.reverse()
+        return range_order
+
+    def enable_two_way_sweep(self, enable: bool = True, turnaround_delay: float = 1.0):
+        """
+        Measures the ranges on both legs of the TSL-570 two-way sweep: every other range is measured on the return
+        leg of the previous range sweep, instead of waiting for the TSL to return to the start wavelength.
+        The return leg data is mapped to ascending wavelength (see two_way_sweep). Repeated measurements alternate
+        the legs as well (see sts_measurement).
+
+        Args:
+            enable (bool): True to use the two-way sweep for the DUT measurements.
+            turnaround_delay (float): Delay between the legs (s), see TslDevice.set_sweep_mode. It must cover reading
+                the forward leg data and re-arming the MPMs and the SPU, else the return leg sweep fails.
+
+        Raises:
+            Exception: If the sweep span is not a multiple of the actual sweep step.
+        """
+        if enable and not is_two_way_compatible(self._tsl.start_wavelength,
+                                                self._tsl.stop_wavelength,
+                                                self._tsl.actual_step):
+            raise Exception("The two-way sweep needs a sweep span that is a multiple of the actual sweep step ({} nm)."
+                            .format(self._tsl.actual_step))
+
+        self.two_way_sweep = enable
+        self.turnaround_delay = turnaround_delay
+        return None
+
+    def get_reverse_mapping(self) -> list:
+        """ Returns the return leg trigger of each forward leg wavelength (see two_way_sweep.reverse_trigger_mapping) """
+        sweep_parameters = (self._tsl.start_wavelength, self._tsl.stop_wavelength, self._tsl.actual_step)
+        if self._reverse_mapping is None or self._reverse_mapping[0] != sweep_parameters:
+            self._reverse_mapping = (sweep_parameters, reverse_trigger_mapping(*sweep_parameters))
+        return self._reverse_mapping[1]
+
+    def __measure_range(self, mpm_range, sweep_count: int, reverse_leg: bool = False, more_ranges: bool = False):
+        """
+        Sweeps one range and adds its data to the STS process, retrying after a failure.
+        A retry always starts a new sweep, on the forward leg.
+
+        Args:
+            more_ranges (bool): Another range sweep follows, which can be measured on the return leg.
+
+        Returns:
+            bool: True if the TSL is now sweeping back, so that the next range is measured on the return leg.
+        """
+        attempt = 0
+        while True:
+            try:
+                # set MPM Range
+                self.set_mpm_range(mpm_range)
+
+                # sweep handling
+                next_leg = self.two_way_sweep and not reverse_leg and more_ranges
+                self.sts_sweep_process(sweep_count, reverse_leg, next_leg)
+
+                # Get DUT data
+                self.sts_get_meas_data(sweep_count, reverse_leg)
+                return next_leg
+            except Exception as sweep_exception:
+                reverse_leg = False
+                attempt += 1
+                cancelled = self.cancel_event is not None and self.cancel_event.is_set()
+                retry = attempt <= self.max_sweep_retries and not cancelled
+                self.sweep_failures.append({"sweep_count": sweep_count,
+                                            "range": mpm_range,
+                                            "attempt": attempt,
+                                            "error": str(sweep_exception),
+                                            "time": datetime.now().isoformat(timespec="seconds"),
+                                            "retried": retry})
+
+                # The instruments and the STS process are brought back to a known state in any case
+                self.recover_sweep(sweep_count)
+
+                if not retry:
+                    raise RuntimeError("Range {} sweep failed after {} attempt(s): {}".format(
+                        mpm_range, attempt, sweep_exception)) from sweep_exception
+
+                print("Range {} sweep failed ({}), retrying ({}/{})...".format(
+                    mpm_range, sweep_exception, attempt, self.max_sweep_retries))
+
+    def check_range_windows(self):
+        """
+        Checks that range_windows has the windows of the module type of every selected channel, and of every
+        selected range (see adaptive_ranges).
+
+        Raises:
+            Exception: If the windows of a module type or range are missing.
+        """
+        for ch in self.selected_chans:
+            mpm_number, slot_number, channel_number = self.split_channel(ch)
+            module_type = self._mpms[mpm_number].get_module_type(slot_number)
+            missing_ranges = [mpm_range for mpm_range in self.selected_ranges
+                              if mpm_range not in self.range_windows.get(module_type, {})]
+            if len(missing_ranges) > 0:
+                raise Exception("Adaptive ranges: no range window for the {} module of channel {}, range(s) {} "
+                                "(see range_windows).".format(module_type, ch,
+                                                              ", ".join(str(i) for i in missing_ranges)))
+        return None
+
+    def __valid_points(self, sweep_count: int, mpm_range, power_units: list):
+        """
+        Checks the raw data of a range sweep against the valid window of its range, for the module type of each
+        channel.
+
+        Args:
+            power_units (list): Power unit of the logged data of each MPM (see MpmDevice.get_power_unit).
+
+        Returns:
+            numpy.ndarray: channels x points, True where the channel is within the window.
+        """
+        import numpy
+
+        log_data_array, _, _ = self._meas_raw_data[sweep_count]
+        windows = []
+        for item, _ in log_data_array:
+            module_windows = self.range_windows.get(self._mpms[item.MPMNumber].get_module_type(item.SlotNumber), {})
+            windows.append(module_windows.get(mpm_range, (numpy.nan, numpy.nan)))
+        top, floor = numpy.array(windows, dtype=numpy.float64).T[:, :, numpy.newaxis]
+
+        power = numpy.array([log_data for _, log_data in log_data_array], dtype=numpy.float64)
+        in_mw = numpy.array([power_units[item.MPMNumber] == 1 for item, _ in log_data_array])
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            power[in_mw] = 10 * numpy.log10(power[in_mw])   # mW to dBm
+
+        # NaN windows (no window, see check_range_windows) are never valid
+        return (power <= top) & (power >= floor + self.range_floor_margin)
+
+    def __skip_ranges(self, skipped_order: list, measured_sweep_count: int, return_leg: bool = False):
+        """
+        Skips the remaining range sweeps. The merge of the STS process expects the data of every range, so the data
+        of the last measured range sweep is added in their place: the merged IL is the same on every point.
+        These copies are not DUT data of the skipped ranges, and get_dut_data leaves them out.
+
+        Args:
+            return_leg (bool): The TSL is sweeping back for the next range (two-way sweep), and is stopped.
+        """
+        log_data_array, trigger, monitor = self._meas_raw_data[measured_sweep_count]
+        channel_data = {(item.MPMNumber, item.SlotNumber, item.ChannelNumber): log_data
+                        for item, log_data in log_data_array}
+
+        if return_leg:
+            self._tsl.stop_sweep(False)
+            self._return_leg_deadline = None
+
+        for sweep_count, mpm_range in skipped_order:
+            self._meas_raw_data[sweep_count] = ([(item, channel_data[(item.MPMNumber,
+                                                                               item.SlotNumber,
+                                                                               item.ChannelNumber)])
+                                                 for item in self.dut_data if item.SweepCount == sweep_count],
+                                                trigger,
+                                                monitor)
+            self.__add_meas_data(sweep_count)
+            self.skipped_ranges.append(mpm_range)
+
+        print("Skipped the range(s) {}: every point was measured within a valid range window.".format(
+            ", ".join(str(mpm_range) for mpm_range in self.skipped_ranges)))
+        return None
+
+    def invalidate_instrument_states(self):
+        """
+        Forgets the settings applied to the TSL, the MPMs and the SPU, after a failed sweep left them in an unknown
+        state: the next set_parameters, set_mpm_range and sts_measurement send them again instead of skipping them.
+        """
+        self._tsl.state.invalidate()
+        for mpm in self._mpms:
+            mpm.state.invalidate()
+        self._spu.state.invalidate()
+        return None
+
+    def recover_sweep(self, failed_sweep_count: int):
+        """
+        Stops the sweep and the logging, waits for the TSL to be back in standby, then clears the measurement data
+        of the STS process and adds again the data of the ranges that were already measured.
+
+        Args:
+            failed_sweep_count (int): Sweep count of the failed range sweep, whose data is dropped.
+
+        Raises:
+            Exception: If the STS process measurement data couldn't be cleared or added again.
+        """
+        self.invalidate_instrument_states()
+        self._tsl.stop_sweep(False)
+        self._return_leg_deadline = None
+        for mpm in self._mpms:
+            mpm.logging_stop(False)
+        try:
+            standby_timeout = self.timing.standby_timeout if self.timing is not None else None
+            self._tsl.wait_for_sweep_status(waiting_time=standby_timeout or 5000, sweep_status=1)  # Standby
+        except Exception:
+            pass  # The next sweep start reports the TSL state if it is still not in standby
+
+        # Part of the failed sweep data might have been added already: clear all and add again the measured ranges
+        self._meas_raw_data.pop(failed_sweep_count, None)
+        errorcode = self._ilsts.Clear_Measdata()
+        if errorcode != 0:
+            raise Exception(str(errorcode) + ": " + sts_process_error_strings(errorcode))
+
+        for sweep_count in self._meas_raw_data:
+            self.__add_meas_data(sweep_count)
+
+        return None
+
     # STS Sweep Process
-    def sts_sweep_process(self, sweep_count: int):
+    def sts_sweep_process(self, sweep_count: int, reverse_leg: bool = False, next_leg: bool = False):
         """
         Configures TSL/MPM and Daq card to perform the sweep process.
 
         Args:
             sweep count (int)
+            reverse_leg (bool): Measures the return leg of the two-way sweep started by the previous call.
+                The MPMs and the SPU must be re-armed within the turnaround delay after the forward leg.
+            next_leg (bool): Returns without waiting for the TSL standby, so that the return leg of this two-way
+                sweep can be measured by the next call. Otherwise, the return leg of a two-way sweep is stopped.
 
         Raises:
             RuntimeError: If TSL/MPM and Daq card are not synchronized (TSL or MPM times out or issues with the Daq card.
             Exception: If there is an issue with TSL sweep process.
         """
-        # TSL Sweep Start
-        self._tsl.start_sweep()
-
-        # MPM Logging Start
-        self._mpm.logging_start()
+        if self.timing is None:
+            self.timing = self._tsl.get_sweep_timing(self._spu.AveragingTime or 0.0)
+        timing = self.timing
+        phases = self.phase_timings
+        phases.clear()
+
+        # The return leg starts on its own after the turnaround delay
+        logging_timeout = timing.logging_timeout
+        if reverse_leg:
+            logging_timeout = timing.return_leg_timeout(self._tsl.turnaround_delay)
+        else:
+            # The TSL slews from its current wavelength to the start wavelength before waiting for the trigger
+            timing.set_current_wavelength(self._tsl.get_wavelength())
+            # TSL Sweep Start
+            self._tsl.start_sweep()
+
+        # MPM Logging Start, on all the MPMs before the trigger
+        for mpm in self._mpms:
+            mpm.logging_start()
         try:
-            self._tsl.wait_for_sweep_status(waiting_time=3000, sweep_status=4)  # Waiting for Trigger
-            self._spu.sampling_start()
-            self._tsl.soft_trigger()
-            self._spu.sampling_wait()
-            self._mpm.wait_log_completion(sweep_count)
-            self._mpm.logging_stop(True)
+            if reverse_leg:
+                self._spu.sampling_start()
+                self.__check_return_leg_deadline()
+            else:
+                with phases.phase("Waiting for trigger", timing.trigger_timeout):
+                    self._tsl.wait_for_sweep_status(waiting_time=timing.trigger_timeout, sweep_status=4)
+                self._spu.sampling_start()
+                self._tsl.soft_trigger()
+            with phases.phase("SPU sampling"):
+                self._spu.sampling_wait()
+            with phases.phase("MPM logging", logging_timeout):
+                # The MPMs log the same triggers: the first one reports the progress
+                for mpm in self._mpms:
+                    mpm.wait_log_completion(sweep_count,
+                                            timeout=logging_timeout / 1000,
+                                            progress_callback=self.progress_callback if mpm is self._mpm else None,
+                                            cancel_event=self.cancel_event)
+            if next_leg:
+                # The TSL reached the stop wavelength: the turnaround started
+                self._return_leg_deadline = time.perf_counter() + self._tsl.turnaround_delay
+            for mpm in self._mpms:
+                mpm.logging_stop(True)
         except RuntimeError as scan_exception:
+            self.invalidate_instrument_states()
             self._tsl.stop_sweep(False)
-            self._mpm.logging_stop(False)
+            for mpm in self._mpms:
+                mpm.logging_stop(False)
             raise scan_exception
         except Exception as tsl_exception:
-            self._mpm.logging_stop(False)
+            self.invalidate_instrument_states()
+            for mpm in self._mpms:
+                mpm.logging_stop(False)
             raise tsl_exception
-        self._tsl.wait_for_sweep_status(waiting_time=5000, sweep_status=1)  # Standby
+        if next_leg:
+            return None
+
+        # The return leg of a two-way sweep that is not measured is stopped, rather than waited for
+        if self._tsl.two_way_sweep and not reverse_leg:
+            self._tsl.stop_sweep(False)
+        standby_timeout = timing.standby_timeout
+        with phases.phase("Return to standby", standby_timeout):
+            self._tsl.wait_for_sweep_status(waiting_time=standby_timeout, sweep_status=1)
 
         return None
 
+    def __check_return_leg_deadline(self):
+        """
+        Checks that the return leg was re-armed within the turnaround delay after the forward leg.
+
+        Raises:
+            Exception: If the turnaround delay is over, so that the first return leg triggers may have been missed.
+        """
+        deadline, self._return_leg_deadline = self._return_leg_deadline, None
+        late = time.perf_counter() - deadline if deadline is not None else 0.0
+        if late > 0:
+            raise Exception("The return leg was re-armed {:.3f} s after the end of the turnaround delay ({} s): "
+                            "increase the turnaround delay (see enable_two_way_sweep).".format(
+                                late, self._tsl.turnaround_delay))
+        return None
+
     # Get logging data & add STSProcess Class for Reference
     def get_reference_data(self, data_struct_item):
         """
@@ -479,12 +987,13 @@ class StsProcess:
         """
 
         # Get MPM logging data
-        log_data = self._mpm.get_each_channel_log_data(data_struct_item.SlotNumber, data_struct_item.ChannelNumber)
+        log_data = self._mpms[data_struct_item.MPMNumber].get_each_channel_log_data(data_struct_item.SlotNumber,
+                                                                                     data_struct_item.ChannelNumber)
 
         # Add MPM Logging data for STS Process Class
         self.log_data = array('d', log_data)  # List to Array
 
-        errorcode = self._ilsts.Add_Ref_MPMData_CH(log_data, data_struct_item)
+        errorcode = self._ilsts.Add_Ref_MPMData_CH(self.log_data, data_struct_item)
         if errorcode != 0:
             raise Exception(str(errorcode) + ": " + sts_process_error_strings(errorcode))
 
@@ -518,27 +1027,115 @@ class StsProcess:
                     len(wavelength_array), len(rescaled_ref_pwr), len(rescaled_ref_mon))
             )
 
-        # Save all desired reference data into the reference array of this StsProcess class.
-        ref_object = {
+        # Save the rescaled reference data into the reference dataset of this StsProcess class.
+        dataset = self.__get_reference_dataset(data_struct_item, wavelength_array)
+        dataset.set_trace(data_struct_item.MPMNumber,
+                          data_struct_item.SlotNumber,
+                          data_struct_item.ChannelNumber,
+                          0,
+                          array('d', rescaled_ref_pwr),
+                          array('d', rescaled_ref_mon))
+        self.reference_dataset = dataset
+
+        # Save the raw reference data of the channel, in place of its previous reference.
+        raw_object = {
             "MPMNumber": data_struct_item.MPMNumber,
             "SlotNumber": data_struct_item.SlotNumber,
             "ChannelNumber": data_struct_item.ChannelNumber,
-            "log_data": list(self.log_data),
+            "log_data": self.log_data,
             # unscaled log data is required if we want to load the reference data later.
-            "trigger": list(array('d', trigger)),
+            "trigger": array('d', trigger),
             # motor positions that correspond to wavelengths. required if we want to load the reference data later.
-            "monitor": list(array('d', monitor)),
+            "monitor": array('d', monitor),
             # unscaled monitor data is required if we want to load the reference data later.
-            "rescaled_monitor": list(array('d', rescaled_ref_mon)),  # rescaled monitor data
-            "rescaled_wavelength": list(array('d', wavelength_array)),  # all wavelengths, including triggers inbetween.
-            "rescaled_reference_power": list(array('d', rescaled_ref_pwr)),  # rescaled reference power
         }
-
-        self._reference_data_array.append(ref_object)
+        channel = (raw_object["MPMNumber"], raw_object["SlotNumber"], raw_object["ChannelNumber"])
+        for index, item in enumerate(self._reference_raw_data):
+            if (item["MPMNumber"], item["SlotNumber"], item["ChannelNumber"]) == channel:
+                self._reference_raw_data[index] = raw_object
+                break
+        else:
+            self._reference_raw_data.append(raw_object)
 
         return None
 
-    def get_wavelengths(self, data_struct_item: STSDataStruct, trigger_length: int):
+    def __get_reference_dataset(self, data_struct_item, wavelength_array):
+        """
+        Returns the reference dataset a channel reference is added to: the current one, or a new one on the
+        wavelength table, with a row for each reference channel (see ref_data), if no reference was taken yet.
+
+        Raises:
+            Exception: If the current reference dataset is on another wavelength table, or has no row for the channel.
+        """
+        import numpy
+        from santec.sts_dataset import StsDataset, WavelengthAxis
+
+        axis = WavelengthAxis.from_wavelengths(array('d', wavelength_array))
+        if self.reference_dataset is None or len(self._reference_raw_data) == 0:
+            channels = [(item.MPMNumber, item.SlotNumber, item.ChannelNumber) for item in self.ref_data]
+            return StsDataset(axis, channels, [0], self.dataset_dtype)
+
+        channel = (int(data_struct_item.MPMNumber), int(data_struct_item.SlotNumber),
+                   int(data_struct_item.ChannelNumber))
+        if len(axis) != len(self.reference_dataset.axis) or channel not in self.reference_dataset.channels or \
+                not numpy.allclose(axis.to_array(), self.reference_dataset.wavelengths, rtol=0, atol=1e-7):
+            raise Exception("The reference data array holds references of other channels or on another wavelength "
+                            "table: clear it before taking the reference of Slot{} Ch{}.".format(
+                                data_struct_item.SlotNumber, data_struct_item.ChannelNumber))
+        return self.reference_dataset
+
+    @property
+    def _reference_data_array(self) -> list:
+        """
+        Reference object of each referenced channel: its raw data, with views of its rescaled data in
+        reference_dataset (see StsDataset.to_data_array).
+        The objects can be saved (see file_logging.save_reference_json_data) and set back to load the reference
+        (see sts_reference_from_saved_file).
+        """
+        if self.reference_dataset is None:
+            return [dict(item) for item in self._reference_raw_data]
+
+        rescaled_data = {(item["MPMNumber"], item["SlotNumber"], item["ChannelNumber"]): item for item in
+                         self.reference_dataset.to_data_array("rescaled_reference_power", "rescaled_monitor")}
+        reference_data_array = []
+        for item in self._reference_raw_data:
+            ref_object = dict(item)
+            rescaled_object = rescaled_data[(int(item["MPMNumber"]), int(item["SlotNumber"]),
+                                             int(item["ChannelNumber"]))]
+            for key in ("rescaled_monitor", "rescaled_wavelength", "rescaled_reference_power"):
+                ref_object[key] = rescaled_object[key]
+            reference_data_array.append(ref_object)
+
+        return reference_data_array
+
+    @_reference_data_array.setter
+    def _reference_data_array(self, reference_data_array: list):
+        """
+        Sets the reference objects, e.g. loaded from a file. Their rescaled data, if they all have it, is stored in a
+        new reference_dataset.
+        """
+        from santec.sts_dataset import StsDataset
+
+        self._reference_raw_data = []
+        self.reference_dataset = None
+        if reference_data_array is None or len(reference_data_array) == 0:
+            return
+
+        for item in reference_data_array:
+            raw_object = {}
+            for key, value in item.items():
+                if key.startswith("rescaled_"):
+                    continue
+                raw_object[key] = value if isinstance(value, (int, float, array)) else array('d', value)
+            self._reference_raw_data.append(raw_object)
+
+        if all("rescaled_reference_power" in item for item in reference_data_array):
+            self.reference_dataset = StsDataset.from_data_array(reference_data_array,
+                                                                "rescaled_reference_power",
+                                                                "rescaled_monitor",
+                                                                self.dataset_dtype)
+
+    def get_wavelengths(self, data_struct_item, trigger_length: int):
         """ Get the list of wavelengths from the most recent scan """
         datapoint_count = 0
         wavelength_array = []
@@ -561,35 +1158,82 @@ class StsProcess:
         return wavelength_table
 
     # Get logging data & add STSProcess class for Measurement
-    def sts_get_meas_data(self, sweep_count):
+    def sts_get_meas_data(self, sweep_count, reverse_leg: bool = False):
         """
         Gets logged data during DUT measurement.
         Args:
             sweep count (int)
+            reverse_leg (bool): The data was logged on the return leg of a two-way sweep, and is mapped
+                to ascending wavelength.
 
         Raises:
             Exception: if power monitor/MPM data couldn't be added to the data structure
         """
-        errorcode = 0
-        for item in self.dut_data:
-            if item.SweepCount != sweep_count:
-                continue
+        log_data_array = []
+        items = [item for item in self.dut_data if item.SweepCount == sweep_count]
+
+        # Get MPM logging data
+        for item, log_data in zip(items, self.read_log_data(items)):
+            if reverse_leg:
+                log_data_array.append((item, normalize_reverse_leg(log_data, self.get_reverse_mapping())))
+            else:
+                log_data_array.append((item, array("d", log_data)))  # List to Array
 
-            # Get MPM logging data
-            log_data = self._mpm.get_each_channel_log_data(item.SlotNumber, item.ChannelNumber)
-            log_data = array("d", log_data)  # List to Array
+        # Get monitor data
+        trigger, monitor = self._spu.get_sampling_raw()
+
+        if reverse_leg:
+            trigger = normalize_reverse_leg(trigger)
+            monitor = normalize_reverse_leg(monitor)
+        else:
+            trigger = array("d", trigger)  # List to Array
+            monitor = array("d", monitor)  # list to Array
+
+        self._meas_raw_data[sweep_count] = (log_data_array, trigger, monitor)
+        return self.__add_meas_data(sweep_count)
+
+    def read_log_data(self, items: list) -> list:
+        """
+        Reads the logging data of the channels. The MPMs are read concurrently, one thread per MPM.
 
+        Args:
+            items (list): Data structures of the channels.
+
+        Returns:
+            list: Logging data of each channel, in the order of items.
+        """
+        mpm_items = {}
+        for index, item in enumerate(items):
+            mpm_items.setdefault(item.MPMNumber, []).append(index)
+
+        def read_mpm(mpm_number):
+            mpm = self._mpms[mpm_number]
+            return [(index, mpm.get_each_channel_log_data(items[index].SlotNumber, items[index].ChannelNumber))
+                    for index in mpm_items[mpm_number]]
+
+        if len(mpm_items) > 1:
+            with ThreadPoolExecutor(max_workers=len(mpm_items)) as executor:
+                results = list(executor.map(read_mpm, mpm_items))
+        else:
+            results = [read_mpm(mpm_number) for mpm_number in mpm_items]
+
+        log_data_array = [None] * len(items)
+        for result in results:
+            for index, log_data in result:
+                log_data_array[index] = log_data
+        return log_data_array
+
+    def __add_meas_data(self, sweep_count: int):
+        """ Adds the raw data of a range sweep (see sts_get_meas_data) to the STS process """
+        errorcode = 0
+        log_data_array, trigger, monitor = self._meas_raw_data[sweep_count]
+
+        for item, log_data in log_data_array:
             # Add MPM Logging data for STSProcess Class with STSDatastruct
             errorcode = self._ilsts.Add_Meas_MPMData_CH(log_data, item)
             if errorcode != 0:
                 raise Exception(str(errorcode) + ": " + sts_process_error_strings(errorcode))
 
-        # Get monitor data
-        trigger, monitor = self._spu.get_sampling_raw()
-
-        trigger = array("d", trigger)  # List to Array
-        monitor = array("d", monitor)  # list to Array
-
         # Search place of add in
         for item in self.dut_monitor:
             if item.SweepCount != sweep_count:
@@ -601,40 +1245,114 @@ class StsProcess:
 
         return errorcode
 
+    def enable_dut_streaming(self, dut_stream, scan_history: int = 2):
+        """
+        Streams the DUT data of each scan to dut_stream as soon as get_dut_data finishes.
+        Only the most recent scans are kept in memory afterwards.
+
+        Args:
+            dut_stream: Object with a write_scan(dut_objects) method, e.g. file_logging.DutDataStreamWriter.
+            scan_history (int): Number of most recent scans to keep in memory (see _dut_data_array).
+
+        Raises:
+            Exception: If the data structures were not configured yet (see set_data_struct).
+        """
+        if self.dut_data is None or len(self.dut_data) == 0:
+            raise Exception("The data structures must be set before enabling the DUT data streaming.")
+
+        if scan_history < 1:
+            raise Exception("At least one scan must be kept in memory.")
+
+        self._dut_stream = dut_stream
+        # Each scan is one dataset, so the ring is sized in scans.
+        self._dut_datasets = deque(self._dut_datasets, maxlen=scan_history)
+
+        return None
+
+    def get_reference_dataset(self):
+        """
+        Returns the rescaled reference data (StsDataset), with one shared wavelength axis and the reference of each
+        channel in range 0.
+
+        Raises:
+            Exception: If there is no rescaled reference data (see get_reference_data).
+        """
+        if self.reference_dataset is None:
+            raise Exception("There is no rescaled reference data, see sts_reference.")
+        return self.reference_dataset
+
+    def get_dut_dataset(self):
+        """
+        Returns the rescaled DUT data of each channel and range of the last scan (StsDataset), see get_dut_data.
+        The ranges skipped by the adaptive ranges (see skipped_ranges) are NaN.
+
+        Raises:
+            Exception: If no DUT data was stored yet.
+        """
+        if len(self._dut_datasets) == 0:
+            raise Exception("There is no DUT data, see get_dut_data.")
+        return self._dut_datasets[-1]
+
+    @property
+    def _dut_data_array(self) -> list:
+        """
+        Dut object of each channel and range of each stored scan: views of the scan datasets (see
+        StsDataset.to_data_array).
+        """
+        dut_data_array = []
+        for dataset in self._dut_datasets:
+            dut_data_array.extend(dataset.to_data_array("rescaled_dut_power", "rescaled_dut_monitor"))
+        return dut_data_array
+
     # Get and store dut data
     def get_dut_data(self):
+        """
+        Gets the rescaled DUT data of each channel and range of the last scan.
+        The data is read straight into a dataset (StsDataset) with one shared wavelength axis, which is stored (see
+        get_dut_dataset), and written to the DUT stream if streaming is enabled.
+        The ranges skipped by the adaptive ranges (see skipped_ranges) were not measured: their power and monitor
+        data is NaN.
+        """
+        from santec.sts_dataset import StsDataset, WavelengthAxis
+
+        # All the wavelengths are all the same for any slot, channel and range. So just get them once.
+        errorcode, wavelength_array = self._ilsts.Get_Target_Wavelength_Table(None)
+        if errorcode != 0:
+            raise Exception(str(errorcode) + ": " + sts_process_error_strings(errorcode))
+
+        channels = []
+        for data_struct_item in self.dut_data:
+            channel = (data_struct_item.MPMNumber, data_struct_item.SlotNumber, data_struct_item.ChannelNumber)
+            if channel not in channels:
+                channels.append(channel)
+
+        dataset = StsDataset(WavelengthAxis.from_wavelengths(array('d', wavelength_array)),
+                             channels,
+                             self.selected_ranges,
+                             self.dataset_dtype)
+
         # After rescaling is done, get the raw dut data
         for data_struct_item in self.dut_data:
+            if data_struct_item.RangeNumber in self.skipped_ranges:
+                # The STS process only holds a copy of another range
+                continue
+
             errorcode, rescaled_dut_pwr, rescaled_dut_mon = self._ilsts.Get_Meas_RawData(data_struct_item,
                                                                                          None, None)
             if errorcode != 0:
                 raise Exception(str(errorcode) + ": " + sts_process_error_strings(errorcode))
 
-            errorcode, wavelength_array = self._ilsts.Get_Target_Wavelength_Table(None)
-            if errorcode != 0:
-                raise Exception(str(errorcode) + ": " + sts_process_error_strings(errorcode))
+            dataset.set_trace(data_struct_item.MPMNumber,
+                              data_struct_item.SlotNumber,
+                              data_struct_item.ChannelNumber,
+                              data_struct_item.RangeNumber,
+                              array('d', rescaled_dut_pwr),
+                              array('d', rescaled_dut_mon))
+
+        # Write the scan out before it can be dropped from the in-memory ring.
+        if self._dut_stream is not None:
+            self._dut_stream.write_scan(dataset.to_data_array("rescaled_dut_power", "rescaled_dut_monitor"))
 
-            if len(wavelength_array) == 0 or len(wavelength_array) != len(rescaled_dut_pwr) or len(
-                    wavelength_array) != len(rescaled_dut_mon):
-                raise Exception(
-                    "The length of the wavelength array is {}, the length of the dut power array is {},"
-                    " and the length of the dut monitor is {}. They must all be the same length.".format(
-                        len(wavelength_array), len(rescaled_ref_pwr), len(rescaled_ref_mon))
-                )
-
-            # print("Channel: {}, Range: {} ".format(data_struct_item.ChannelNumber, data_struct_item.RangeNumber))
-
-            dut_object = {
-                "MPMNumber": data_struct_item.MPMNumber,
-                "SlotNumber": data_struct_item.SlotNumber,
-                "ChannelNumber": data_struct_item.ChannelNumber,
-                "RangeNumber": data_struct_item.RangeNumber,
-                "rescaled_wavelength": list(array('d', wavelength_array)),
-                # all wavelengths, including triggers in between.
-                "rescaled_dut_monitor": list(array('d', rescaled_dut_mon)),  # rescaled monitor data
-                "rescaled_dut_power": list(array('d', rescaled_dut_pwr)),  # rescaled dut power
-            }
-
-            self._dut_data_array.append(dut_object)
+        self._dut_datasets.append(dataset)
 
         return None
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+
+"""
+Created on Tue Oct 27 10:12:39 2026
+
+@author: chentir
+@organization: santec holdings corp.
+
+Timeouts of the sweep phases, computed from the sweep span, sweep speed, return speed and averaging time.
+The phase durations are logged with the "santec.sweep_timing" logger, e.g.:
+    logging.basicConfig(level=logging.INFO)
+"""
+
+# Basic imports
+import math
+import time
+import logging
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SAFETY_MARGIN = 1.5     # Factor applied to every expected duration
+DEFAULT_RETURN_SPEED = 100      # nm/s, when the TSL speed table is not available
+COMMAND_OVERHEAD = 1000         # ms, time for the instrument to process a command and settle
+MIN_BUSY_TIMEOUT = 3000         # ms, shortest timeout of the TSL busy check
+
+
+def timeout_ms(duration: float, safety_margin: float = DEFAULT_SAFETY_MARGIN) -> int:
+    """
+    Returns the timeout of an operation.
+
+    Args:
+        duration (float): Expected duration of the operation (s).
+        safety_margin (float): Factor applied to the expected duration and the command overhead.
+
+    Returns:
+        int: Timeout (ms), as expected by the DLL waiting methods.
+    """
+    return int(math.ceil((duration * 1000 + COMMAND_OVERHEAD) * safety_margin))
+
+
+def move_timeout(distance: float, speed: float, safety_margin: float = DEFAULT_SAFETY_MARGIN) -> int:
+    """ Returns the timeout (ms) of a wavelength move over distance (nm) at speed (nm/s) """
+    return timeout_ms(abs(distance) / speed, safety_margin)
+
+
+class SweepTiming:
+    """ Expected durations (s) and timeouts (ms) of the phases of one sweep """
+
+    def __init__(self, start_wavelength: float, stop_wavelength: float, sweep_speed: float,
+                 return_speed: float = DEFAULT_RETURN_SPEED, averaging_time: float = 0.0,
+                 safety_margin: float = DEFAULT_SAFETY_MARGIN, current_wavelength: float = None):
+        """
+        Args:
+            start_wavelength (float): Sweep start wavelength (nm).
+            stop_wavelength (float): Sweep stop wavelength (nm).
+            sweep_speed (float): Sweep speed (nm/s).
+            return_speed (float): Speed of the TSL going back to the start wavelength (nm/s).
+            averaging_time (float): MPM averaging time (ms).
+            safety_margin (float): Factor applied to every expected duration.
+            current_wavelength (float): Wavelength of the TSL (nm), before it moves to the start wavelength.
+                See set_current_wavelength.
+        """
+        span = abs(stop_wavelength - start_wavelength)
+
+        self.start_wavelength = start_wavelength
+        self.return_speed = return_speed
+        self.safety_margin = safety_margin
+        self.sweep_duration = span / sweep_speed + averaging_time / 1000
+        self.return_duration = span / return_speed
+        self.slew_duration = 0.0
+        self.set_current_wavelength(current_wavelength)
+
+    def set_current_wavelength(self, current_wavelength: float = None):
+        """
+        Sets the wavelength of the TSL (nm): the TSL slews from it to the start wavelength before the sweep.
+        None if unknown, the slew is then not counted.
+        """
+        if current_wavelength is None:
+            self.slew_duration = 0.0
+        else:
+            self.slew_duration = abs(self.start_wavelength - current_wavelength) / self.return_speed
+        return None
+
+    @property
+    def trigger_timeout(self) -> int:
+        """
+        Sweep start until the TSL waits for the trigger: the TSL may have to go back from the stop wavelength,
+        or slew from its current wavelength
+        """
+        return timeout_ms(self.return_duration + self.slew_duration, self.safety_margin)
+
+    @property
+    def logging_timeout(self) -> int:
+        """ Trigger until the end of the MPM logging """
+        return timeout_ms(self.sweep_duration, self.safety_margin)
+
+    @property
+    def standby_timeout(self) -> int:
+        """ End of the sweep until the TSL is back in standby, at the start wavelength """
+        return timeout_ms(self.return_duration, self.safety_margin)
+
+    def return_leg_timeout(self, turnaround_delay: float) -> int:
+        """ End of the forward leg until the TSL is back in standby, after the return leg of a two-way sweep """
+        return timeout_ms(turnaround_delay + self.sweep_duration, self.safety_margin)
+
+    @property
+    def busy_timeout(self) -> int:
+        """
+        Setting the sweep parameters, which may move the TSL across the sweep span and from its current wavelength.
+        Never below MIN_BUSY_TIMEOUT.
+        """
+        return max(timeout_ms(self.return_duration + self.slew_duration, self.safety_margin), MIN_BUSY_TIMEOUT)
+
+    def timeouts(self) -> dict:
+        """ Returns all the timeouts (ms) """
+        return {"trigger": self.trigger_timeout,
+                "logging": self.logging_timeout,
+                "standby": self.standby_timeout,
+                "busy": self.busy_timeout}
+
+
+class PhaseTimings:
+    """ Durations of the phases of the last sweep, with their timeouts """
+
+    def __init__(self):
+        self.phases = []
+
+    def clear(self):
+        """ Forgets the recorded phases """
+        self.phases = []
+
+    @contextmanager
+    def phase(self, name: str, timeout: int = None):
+        """
+        Records and logs the duration of a phase.
+
+        Args:
+            name (str): Phase name.
+            timeout (int): Timeout of the phase (ms), None if the phase has none.
+        """
+        start = time.perf_counter()
+        completed = False
+        try:
+            yield
+            completed = True
+        finally:
+            duration = time.perf_counter() - start
+            self.phases.append({"phase": name, "duration": duration, "timeout": timeout, "completed": completed})
+            logger.info("%s: %.3f s (timeout: %s ms)%s", name, duration, timeout, "" if completed else " FAILED")
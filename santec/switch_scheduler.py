@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+
+"""
+Created on Mon Nov 02 10:26:44 2026
+
+@author: chentir
+@organization: santec holdings corp.
+
+Optical switch in front of the MPM, to measure more DUT ports than MPM channels.
+Each logical DUT port is reached through a route (switch position, MPM number, MPM slot, MPM channel). The
+scheduler packs the ports into as few sweeps as possible (one sweep per switch position, measuring all its MPM
+channels at once) and orders the switch positions to keep the switch moves short.
+"""
+
+# Basic imports
+import abc
+import time
+
+
+def channel_key(channel: tuple) -> tuple:
+    """ (mpm, slot, channel) of an MPM channel given as (slot, channel) (first MPM) or (mpm, slot, channel) """
+    if len(channel) == 2:
+        channel = (0,) + tuple(channel)
+    if len(channel) != 3:
+        raise Exception("Invalid MPM channel {}: expected (slot, channel) or (mpm, slot, channel).".format(channel))
+    return tuple(int(value) for value in channel)
+
+
+class SwitchDriver(abc.ABC):
+    """
+    Base class of the optical switch drivers.
+    A driver only needs set_position (and get_position if the switch position can be read back).
+    """
+
+    def __init__(self):
+        self.position = None
+
+    @abc.abstractmethod
+    def set_position(self, position: int):
+        """ Moves the switch to a position """
+
+    def get_position(self):
+        """ Returns the current switch position, None if unknown """
+        return self.position
+
+    def close(self):
+        """ Releases the switch """
+        return None
+
+
+class VisaSwitchDriver(SwitchDriver):
+    """ Optical switch controlled with SCPI commands over PyVISA (e.g. santec OSX series) """
+
+    def __init__(self, resource_name: str, resource_manager=None, set_command: str = "CLOSE {}",
+                 settling_time: float = 0.0, timeout: int = 5000):
+        """
+        Args:
+            resource_name (str): VISA resource name of the switch.
+            resource_manager: pyvisa resource manager. Defaults to get_address.get_resource_manager().
+            set_command (str): Command moving the switch, formatted with the position.
+            settling_time (float): Time waited after the switch reported the end of the move (s).
+            timeout (int): VISA timeout (ms).
+        """
+        super().__init__()
+        if resource_manager is None:
+            from santec.get_address import get_resource_manager
+
+            resource_manager = get_resource_manager()
+
+        self.resource_name = resource_name
+        self.set_command = set_command
+        self.settling_time = settling_time
+        self.__resource = resource_manager.open_resource(resource_name)
+        self.__resource.timeout = timeout
+
+    def set_position(self, position: int):
+        self.position = None
+        self.__resource.write(self.set_command.format(position))
+        self.__resource.query("*OPC?")  # Waits for the end of the move
+        if self.settling_time > 0:
+            time.sleep(self.settling_time)
+        self.position = position
+        return None
+
+    def close(self):
+        self.__resource.close()
+        return None
+
+
+class SwitchStep:
+    """ One sweep: the switch position and the (port, mpm, slot, channel) routes it measures """
+
+    def __init__(self, position: int, routes: list):
+        self.position = position
+        self.routes = routes
+
+    @property
+    def ports(self) -> list:
+        return [port for port, _, _, _ in self.routes]
+
+    def __repr__(self):
+        return "SwitchStep({}, {})".format(self.position, self.routes)
+
+
+def make_port_map(port_count: int, mpm_channels: list, first_position: int = 1) -> dict:
+    """
+    Port map of the usual wiring: ports 1 to N of position p are connected to the MPM channels in order.
+
+    Args:
+        port_count (int): Number of DUT ports.
+        mpm_channels (list): (slot, channel) or (mpm, slot, channel) of the MPM channels behind the switch.
+        first_position (int): First switch position.
+
+    Returns:
+        dict: port -> [(position, mpm, slot, channel)]
+    """
+    port_map = {}
+    for index in range(port_count):
+        port_map[index + 1] = [(first_position + index // len(mpm_channels),)
+                               + channel_key(mpm_channels[index % len(mpm_channels)])]
+    return port_map
+
+
+def schedule_ports(port_map: dict, current_position: int = None) -> list:
+    """
+    Packs the ports into as few sweeps as possible and orders the sweeps to keep the switch moves short.
+
+    Args:
+        port_map (dict): port -> list of the routes (position, mpm, slot, channel) that reach the port
+            (a single route tuple is accepted too). Routes (position, slot, channel) use the first MPM.
+        current_position (int): Current switch position, None if unknown.
+
+    Raises:
+        Exception: If two ports share the same MPM channel at the same switch position,
+            or if no route reaches some ports.
+
+    Returns:
+        list: SwitchStep of each sweep, in measurement order.
+    """
+    # position -> {(mpm, slot, channel): port}
+    positions = {}
+    for port, routes in port_map.items():
+        if isinstance(routes, tuple):
+            routes = [routes]
+        for route in routes:
+            position, key = route[0], channel_key(route[1:])
+            channels = positions.setdefault(position, {})
+            if channels.get(key, port) != port:
+                raise Exception("Ports {} and {} both use MPM{} Slot{} Ch{} at switch position {}.".format(
+                    channels[key], port, key[0], key[1], key[2], position))
+            channels[key] = port
+
+    # Greedy packing: the position reaching the most unmeasured ports first
+    unmeasured = set(port_map)
+    selected = []
+    while unmeasured:
+        def coverage(position):
+            count = sum(1 for port in positions[position].values() if port in unmeasured)
+            distance = abs(position - current_position) if current_position is not None else 0
+            return count, -distance
+
+        # None once every position was selected, or if the port map has no routes
+        position = max((position for position in positions if position not in selected), key=coverage, default=None)
+        if position is None or coverage(position)[0] == 0:
+            raise Exception("No route reaches the ports {}.".format(sorted(unmeasured)))
+
+        routes = [(port,) + key for key, port in sorted(positions[position].items()) if port in unmeasured]
+        unmeasured -= set(route[0] for route in routes)
+        selected.append(position)
+        positions[position] = {route[1:]: route[0] for route in routes}
+
+    steps = [SwitchStep(position, [(port,) + key for key, port in sorted(positions[position].items())])
+             for position in selected]
+    return order_steps(steps, current_position)
+
+
+def order_steps(steps: list, current_position: int = None) -> list:
+    """
+    Orders the sweeps for the shortest switch travel from the current position: the positions on the side of the
+    nearest end first, then the other side. From one DUT lot to the next, the switch goes back and forth.
+
+    Returns:
+        list: The SwitchStep objects, in measurement order.
+    """
+    steps = sorted(steps, key=lambda step: step.position)
+    if current_position is None or len(steps) == 0:
+        return steps
+
+    lowest = steps[0].position
+    highest = steps[-1].position
+    below = [step for step in steps if step.position < current_position]
+    above = [step for step in steps if step.position >= current_position]
+
+    if current_position - lowest < highest - current_position:
+        # Down to the lowest position first
+        below = [step for step in steps if step.position <= current_position]
+        above = [step for step in steps if step.position > current_position]
+        return below[::-1] + above
+
+    return above + below[::-1]
+
+
+class SwitchedMeasurement:
+    """
+    Measures DUT ports through an optical switch with an StsProcess.
+    Every MPM channel used by the port map must be selected in the StsProcess. Each switch position has its own
+    reference, added back from its saved reference data before the position is measured.
+    """
+
+    def __init__(self, ilsts, switch: SwitchDriver, port_map: dict):
+        """
+        Args:
+            ilsts (StsProcess): STS process, with its channels, ranges and data structures already set.
+            switch (SwitchDriver): Switch driver (see SwitchDriver, simulated_devices.SimulatedSwitch).
+            port_map (dict): port -> routes (see schedule_ports, make_port_map).
+        """
+        self.ilsts = ilsts
+        self.switch = switch
+        self.port_map = port_map
+        self.schedule = schedule_ports(port_map, switch.get_position())
+
+        # Reference data array of each switch position (same format as StsProcess._reference_data_array)
+        self.references = {}
+
+        self.switch_moves = 0
+        self.wavelength_table = None
+        self.il_data = {}
+
+    def move_to(self, position: int):
+        """ Moves the switch, unless it is already at the position """
+        if self.switch.get_position() != position:
+            self.switch.set_position(position)
+            self.switch_moves += 1
+        return None
+
+    def take_references(self):
+        """ Takes the reference of every channel at each switch position of the schedule """
+        self.references = {}
+        self.schedule = order_steps(self.schedule, self.switch.get_position())
+        for step in self.schedule:
+            self.move_to(step.position)
+            print("\nSwitch position {}".format(step.position))
+
+            self.ilsts._reference_data_array = []
+            self.ilsts.sts_reference()
+            self.references[step.position] = self.ilsts._reference_data_array
+
+        return None
+
+    def measure(self) -> dict:
+        """
+        Measures all the ports, one sweep per switch position.
+
+        Returns:
+            dict: port -> IL data. The wavelengths are in the wavelength_table attribute.
+        """
+        ilsts = self.ilsts
+        self.schedule = order_steps(self.schedule, self.switch.get_position())
+        channel_index = {(int(item.MPMnumber), int(item.SlotNumber), int(item.ChannelNumber)): index
+                         for index, item in enumerate(ilsts.merge_data)}
+
+        self.il_data = {}
+        for step in self.schedule:
+            if step.position not in self.references:
+                raise Exception("No reference for switch position {}, see take_references.".format(step.position))
+
+            self.move_to(step.position)
+            ilsts._reference_data_array = self.references[step.position]
+            ilsts.sts_reference_from_saved_file()
+            ilsts.sts_measurement()
+
+            self.wavelength_table = ilsts.wavelength_table
+            for port, mpm, slot, channel in step.routes:
+                if (mpm, slot, channel) not in channel_index:
+                    raise Exception("MPM{} Slot{} Ch{} (port {}) is not a selected channel.".format(
+                        mpm, slot, channel, port))
+                self.il_data[port] = ilsts.il_data_array[channel_index[(mpm, slot, channel)]]
+
+        return dict(sorted(self.il_data.items()))
@@ -7,31 +7,43 @@ Created on Thu Mar 17 11:33:52 2022
 @organization: santec holdings corp.
 """
 
-# Basic imports
-import os
-import numpy
-import clr
-
 # Importing instrument error strings
 from santec.error_handing_class import instrument_error_strings
-
-# Adding Instrument DLL to the reference
-ROOT = str(os.path.dirname(__file__)) + '\\DLL\\'
-# print(ROOT)    """ <-- uncomment in to check if the root was selected properly """
+from santec.dll_reference import add_dll_reference
+from santec.instrument_state import InstrumentState
+from santec.scpi_batch import run_batch, is_query
+from santec.sweep_timing import SweepTiming, DEFAULT_SAFETY_MARGIN, DEFAULT_RETURN_SPEED, MIN_BUSY_TIMEOUT, timeout_ms, \
+    move_timeout
 
 PATH1 = 'InstrumentDLL'
-ans = clr.AddReference(ROOT + PATH1)  # Add in santec.Instrument.DLL
-# print(ans) #<-- comment in to check if the DLL was added properly
 
-# Importing from Santec namespace
-from Santec import TSL, ExceptionCode, CommunicationTerminator
-from Santec.Communication import CommunicationMethod, GPIBConnectType
+# Santec namespace classes, imported from InstrumentDLL on first use (see load_dll)
+TSL = None
+ExceptionCode = None
+CommunicationTerminator = None
+CommunicationMethod = None
+GPIBConnectType = None
+
+
+def load_dll():
+    """ Adds InstrumentDLL to the references and imports the TSL classes, on first use """
+    global TSL, ExceptionCode, CommunicationTerminator, CommunicationMethod, GPIBConnectType
+
+    if TSL is None:
+        add_dll_reference(PATH1)  # Add in santec.Instrument.DLL
+
+        # Importing from Santec namespace
+        from Santec import TSL, ExceptionCode, CommunicationTerminator
+        from Santec.Communication import CommunicationMethod, GPIBConnectType
+
+    return None
 
 
 class TslDevice:
     """ TSL device class """
 
     def __init__(self, interface: str, address: str, port: int = 5000):
+        load_dll()
         self.__tsl = TSL()
         self.interface = interface
         self.address = address
@@ -51,6 +63,16 @@ class TslDevice:
 
         self.return_table = None
 
+        # Timeouts are computed from the sweep and return speeds, times the safety margin (see sweep_timing)
+        self.safety_margin = DEFAULT_SAFETY_MARGIN
+        self.return_speed = None
+
+        # Two-way sweep (see set_sweep_mode)
+        self.two_way_sweep = False
+        self.turnaround_delay = 0.0
+
+        # Last applied settings, to skip redundant commands
+        self.state = InstrumentState()
 
         if interface not in ("GPIB", "LAN", "USB"):
             raise Exception('This interface is not supported')
@@ -77,6 +99,9 @@ class TslDevice:
 
         errorcode = 0
 
+        # Nothing is known about the settings of a newly connected TSL
+        self.state.invalidate()
+
         # When GPIB communication
         if self.interface == "GPIB":
             self.__tsl.Terminator = CommunicationTerminator.CrLf
@@ -96,6 +121,8 @@ class TslDevice:
         elif self.interface == "USB":
             # USB DeviceID is defined uint32, So must be change variable type to unit32
             # this code type change with numpy array
+            import numpy
+
             ar_address = numpy.array([self.address], dtype="uint32")
             self.__tsl.DeviceID = ar_address[0]  # self.address
             self.__tsl.Terminator = CommunicationTerminator.Cr
@@ -119,15 +146,35 @@ class TslDevice:
     def QueryTSL(self, command: str):
         """ Queries a command to the instrument and returns a string """
         command = command.upper()
+        if '?' not in command:
+            self.state.invalidate()  # The command might change any setting
         status, response = self.__tsl.Echo(command, "")
         return status, response
 
     def WriteTSL(self, command: str):
         """ Writes a command to the instrument """
         command = command.upper()
+        self.state.invalidate()  # The command might change any setting
         status = self.__tsl.Write(command)
         return status
 
+    def BatchTSL(self, commands: list) -> list:
+        """
+        Sends a list of writes and queries in as few transactions as possible (';' joined commands).
+
+        Args:
+            commands (list): Commands, in the order they must be executed (ex: ['POW 5', 'POW?']).
+
+        Raises:
+            Exception: If the instrument returns an error status.
+
+        Returns:
+            list: The answer of each query, None for each write.
+        """
+        if not all(is_query(command) for command in commands):
+            self.state.invalidate()  # The commands might change any setting
+        return run_batch(commands, self.WriteTSL, self.QueryTSL)
+
     def ReadTSL(self):
         """ Reads from the instrument """
         status, response = self.__tsl.Read("")
@@ -226,15 +273,20 @@ class TslDevice:
             Exception: In case TSL is busy.
         """
         self.power = power
+
+        # Nothing to do if the TSL is already set to this power
+        if self.state.is_applied("power", power):
+            return None
+
+        self.state.invalidate("power")
         errorcode = self.__tsl.Set_APC_Power_dBm(self.power)
 
         if errorcode != 0:
             raise Exception(str(errorcode) + ": " + instrument_error_strings(errorcode))
 
-        errorcode = self.__tsl.TSL_Busy_Check(3000)
-        if errorcode != 0:
-            raise Exception(str(errorcode) + ": " + instrument_error_strings(errorcode))
+        self.tsl_busy_check()
 
+        self.state.set_applied("power", power)
         return None
 
     def set_wavelength(self, wavelength):
@@ -254,9 +306,12 @@ class TslDevice:
         if errorcode != 0:
             raise Exception(str(errorcode) + ": " + instrument_error_strings(errorcode))
 
-        errorcode = self.__tsl.TSL_Busy_Check(3000)
-        if errorcode != 0:
-            raise Exception(str(errorcode) + ": " + instrument_error_strings(errorcode))
+        # The TSL may have to cross its whole wavelength range
+        if self.spec_min_wav is not None and self.spec_max_wav is not None:
+            distance = max(wavelength - self.spec_min_wav, self.spec_max_wav - wavelength)
+            self.tsl_busy_check(move_timeout(distance, self.get_return_speed(), self.safety_margin))
+        else:
+            self.tsl_busy_check()
         return None
 
 
@@ -278,7 +333,17 @@ class TslDevice:
         self.stop_wavelength = stop_wavelength
         self.sweep_step = sweep_step
         self.sweep_speed = sweep_speed
-        self.tsl_busy_check()
+
+        # Nothing to do if the TSL is already set to these parameters (actual_step is unchanged as well)
+        sweep_parameters = (start_wavelength, stop_wavelength, sweep_step, sweep_speed)
+        if self.state.is_applied("sweep_parameters", sweep_parameters):
+            return None
+
+        self.state.invalidate("sweep_parameters")
+        self.state.invalidate("sweep_mode")  # Setting the sweep parameters for STS sets the one-way sweep mode
+        self.two_way_sweep = False
+        busy_timeout = self.get_sweep_timing(current_wavelength=self.get_wavelength()).busy_timeout
+        self.tsl_busy_check(busy_timeout)
 
         errorcode, self.actual_step = self.__tsl.Set_Sweep_Parameter_for_STS(self.start_wavelength,
                                                                              self.stop_wavelength,
@@ -289,8 +354,48 @@ class TslDevice:
         if errorcode != 0:
             raise Exception(str(errorcode) + ": " + instrument_error_strings(errorcode))
 
+        self.tsl_busy_check(busy_timeout)
+
+        self.state.set_applied("sweep_parameters", sweep_parameters)
+        return None
+
+    def set_sweep_mode(self, two_way: bool, turnaround_delay: float = 1.0):
+        """
+        Sets the continuous one-way or two-way sweep mode of the TSL-570.
+        Call it after set_sweep_parameters, which sets the one-way sweep mode.
+
+        Args:
+            two_way (bool): True to sweep back to the start wavelength after the stop wavelength,
+                with the trigger output running on both legs.
+            turnaround_delay (float): Delay between the two legs (s). It must cover reading the forward leg data
+                and re-arming the MPM and SPU for the return leg.
+
+        Raises:
+            Exception: In case the TSL is not a TSL-570 or doesn't accept the sweep mode.
+        """
+        sweep_mode = (two_way, turnaround_delay if two_way else None)
+        if self.state.is_applied("sweep_mode", sweep_mode):
+            return None
+
+        if two_way and self.get_tsl_type_flag():
+            raise Exception("The two-way sweep is only supported by the TSL-570")
+
+        self.state.invalidate("sweep_mode")
+        # 1: Continuous one-way, 3: Continuous two-way
+        commands = [":WAV:SWE:MOD {}".format(3 if two_way else 1)]
+        if two_way:
+            commands.append(":WAV:SWE:DEL {:.1f}".format(turnaround_delay))
+
+        for command in commands:
+            errorcode = self.__tsl.Write(command)
+            if errorcode != 0:
+                raise Exception(str(errorcode) + ": " + instrument_error_strings(errorcode))
+
         self.tsl_busy_check()
 
+        self.two_way_sweep = two_way
+        self.turnaround_delay = turnaround_delay if two_way else 0.0
+        self.state.set_applied("sweep_mode", sweep_mode)
         return None
 
     def soft_trigger(self):
@@ -336,15 +441,61 @@ class TslDevice:
             raise Exception(str(errorcode) + ": " + instrument_error_strings(errorcode))
         return None
 
-    def tsl_busy_check(self):
+    def get_return_speed(self) -> float:
+        """
+        Returns the speed of the TSL moving between wavelengths (nm/s):
+        the return_speed attribute if set, else the fastest sweep speed of the TSL-570, else DEFAULT_RETURN_SPEED.
+        """
+        if self.return_speed is not None:
+            return self.return_speed
+        if self.return_table:
+            return max(self.return_table)
+        return DEFAULT_RETURN_SPEED
+
+    def get_wavelength(self) -> float:
+        """
+        Returns the current wavelength of the TSL (nm).
+
+        Raises:
+            Exception: In case couldn't get the wavelength from the TSL.
+        """
+        errorcode, wavelength = self.__tsl.Get_Wavelength(0)
+
+        if errorcode != 0:
+            raise Exception(str(errorcode) + ": " + instrument_error_strings(errorcode))
+        return wavelength
+
+    def get_sweep_timing(self, averaging_time: float = 0.0, current_wavelength: float = None) -> SweepTiming:
+        """
+        Returns the timeouts of the sweep phases for the current sweep parameters.
+
+        Args:
+            averaging_time (float): MPM averaging time (ms).
+            current_wavelength (float): Current wavelength of the TSL (nm), see get_wavelength.
+        """
+        return SweepTiming(self.start_wavelength,
+                           self.stop_wavelength,
+                           self.sweep_speed,
+                           self.get_return_speed(),
+                           averaging_time,
+                           self.safety_margin,
+                           current_wavelength)
+
+    def tsl_busy_check(self, timeout: int = None):
         """
         Checks if the TSL is busy with other tasks.
-        Default timeout = 3000 ms
+
+        Args:
+            timeout (int, optional): Timeout (ms). Defaults to the command overhead times the safety margin.
+                Never below MIN_BUSY_TIMEOUT.
 
         Raises:
             Exception: In case no response from TSL after timeout.
         """
-        errorcode = self.__tsl.TSL_Busy_Check(3000)
+        if timeout is None:
+            timeout = timeout_ms(0, self.safety_margin)
+        timeout = max(timeout, MIN_BUSY_TIMEOUT)
+        errorcode = self.__tsl.TSL_Busy_Check(timeout)
         if errorcode != 0:
             raise Exception(str(errorcode) + ": " + instrument_error_strings(errorcode))
         return None
@@ -383,5 +534,6 @@ class TslDevice:
         """
         Disconnects the TSL.
         """
+        self.state.invalidate()
         self.__tsl.DisConnect()
         return None
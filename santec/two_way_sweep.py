@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+"""
+Created on Wed Oct 28 09:41:02 2026
+
+@author: chentir
+@organization: santec holdings corp.
+
+Two-way sweep helpers.
+In two-way sweep mode the TSL-570 sweeps from the start to the stop wavelength, waits for the turnaround delay,
+then sweeps back to the start wavelength with its trigger output still running. The return leg is measured as
+a sweep of its own: its MPM points are mapped to the forward leg wavelengths with the wavelength tables of both
+legs (see reverse_trigger_mapping), and its SPU samples are reversed in time, before being added to the STS process.
+"""
+
+# Basic imports
+from array import array
+
+# Two-way sweep needs the return leg triggers on the forward leg wavelengths (fraction of the step)
+STEP_TOLERANCE = 0.01
+
+
+def sweep_point_count(start_wavelength: float, stop_wavelength: float, sweep_step: float) -> int:
+    """ Returns the number of trigger points of a sweep """
+    return int(round(abs(stop_wavelength - start_wavelength) / sweep_step)) + 1
+
+
+def forward_wavelength_table(start_wavelength: float, stop_wavelength: float, sweep_step: float) -> list:
+    """ Returns the trigger wavelengths of the forward leg, in sweep order """
+    count = sweep_point_count(start_wavelength, stop_wavelength, sweep_step)
+    return [start_wavelength + i * sweep_step for i in range(count)]
+
+
+def reverse_wavelength_table(start_wavelength: float, stop_wavelength: float, sweep_step: float) -> list:
+    """ Returns the trigger wavelengths of the return leg, in sweep order (from the stop wavelength) """
+    count = sweep_point_count(start_wavelength, stop_wavelength, sweep_step)
+    return [stop_wavelength - i * sweep_step for i in range(count)]
+
+
+def is_two_way_compatible(start_wavelength: float, stop_wavelength: float, sweep_step: float) -> bool:
+    """
+    Checks that the return leg triggers fall on the forward leg wavelengths,
+    i.e. that the sweep span is a multiple of the (actual) sweep step.
+    """
+    points = abs(stop_wavelength - start_wavelength) / sweep_step
+    return abs(points - round(points)) <= STEP_TOLERANCE
+
+
+def reverse_trigger_mapping(start_wavelength: float, stop_wavelength: float, sweep_step: float) -> list:
+    """
+    Maps the return leg triggers to the forward leg wavelengths.
+
+    Returns:
+        list: Index of the return leg trigger at each forward leg wavelength (ascending wavelength).
+
+    Raises:
+        Exception: If a return leg trigger does not fall on a forward leg wavelength.
+    """
+    forward_table = forward_wavelength_table(start_wavelength, stop_wavelength, sweep_step)
+    mapping = [None] * len(forward_table)
+
+    for trigger, wavelength in enumerate(reverse_wavelength_table(start_wavelength, stop_wavelength, sweep_step)):
+        index = int(round((wavelength - start_wavelength) / sweep_step))
+        if not 0 <= index < len(forward_table) or mapping[index] is not None or \
+                abs(forward_table[index] - wavelength) > STEP_TOLERANCE * sweep_step:
+            raise Exception("The return leg trigger {} ({} nm) is not on a forward leg wavelength.".format(trigger,
+                                                                                                       wavelength))
+        mapping[index] = trigger
+
+    return mapping
+
+
+def normalize_reverse_leg(data, mapping: list = None) -> array:
+    """
+    Returns the data of the return leg in ascending wavelength.
+
+    Args:
+        data: Samples in sweep order.
+        mapping (list): Return leg trigger of each forward leg wavelength (see reverse_trigger_mapping), for the
+            MPM logging data (one point per trigger). None for the SPU trigger and monitor samples, which are
+            free-running and only reversed in time.
+
+    Returns:
+        array: Samples in ascending wavelength order.
+
+    Raises:
+        Exception: If the MPM logged another number of points than the return leg triggers.
+    """
+    if mapping is None:
+        return array('d', reversed(data))
+
+    if len(data) != len(mapping):
+        raise Exception("The return leg logged {} points instead of {}.".format(len(data), len(mapping)))
+    return array('d', [data[trigger] for trigger in mapping])
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+"""
+Created on Fri Oct 23 11:02:37 2026
+
+@author: chentir
+@organization: santec holdings corp.
+
+Starts the measurement service: connects the instruments, sets the sweep parameters and the reference once,
+then keeps them warm and runs the measurement jobs sent by the clients (see santec.measurement_service).
+
+Client example:
+    from santec.measurement_service import MeasurementClient
+
+    with MeasurementClient() as client:
+        result = client.measure(repeat=1, label="DUT1")
+        print(result["files"])
+"""
+
+# Importing high level santec package and its modules
+from santec import file_logging, STS
+from santec.measurement_service import MeasurementService
+
+# Reusing the setup steps of the main script
+from main import connect_instruments, setting_tsl_sweep_params, prompt_and_get_previous_param_data, \
+    load_or_take_reference
+
+
+def main():
+    """ Main method of the measurement service """
+
+    tsl, mpm, dev = connect_instruments()
+
+    if mpm is None:
+        raise Exception("There must be an MPM connected")
+
+    # Set the TSL properties
+    previous_param_data = prompt_and_get_previous_param_data(file_logging.file_last_scan_params)
+    setting_tsl_sweep_params(tsl, previous_param_data)
+
+    ilsts = STS.StsProcess(tsl, mpm, dev)
+    ilsts.set_selected_channels(previous_param_data)
+    ilsts.set_selected_ranges(previous_param_data)
+    ilsts.set_data_struct()
+    ilsts.set_parameters()
+
+    load_or_take_reference(ilsts, previous_param_data)
+
+    if previous_param_data is None:
+        print("Saving parameters to file " + file_logging.file_last_scan_params + "...")
+        file_logging.sts_save_param_data(tsl, ilsts, file_logging.file_last_scan_params)
+
+    try:
+        MeasurementService(ilsts).serve_forever()
+    finally:
+        tsl.Disconnect()
+        mpm.Disconnect()
+        if dev is not None:
+            dev.Disconnect()
+
+
+if __name__ == "__main__":
+    main()